@@ -0,0 +1,181 @@
+import multiprocessing
+import threading
+import time
+from collections import namedtuple
+from multiprocessing import shared_memory
+import numpy as np
+
+AccountSnapshot = namedtuple("AccountSnapshot", ["generation", "time", "balance", "equity", "margin", "margin_free",
+                                                 "exposure", "reserved", "settling"])
+
+FIELDS = ("sequence",) + AccountSnapshot._fields
+
+
+class AccountState:
+    """
+        Account figures kept in a small shared memory block so every worker process can read them without a
+        terminal call. One AccountPublisher refreshes the block; readers take no lock and retry if they raced
+        a write (the sequence number is odd while a write is in progress).
+        Margin is reserved across processes before an order is sent: reserve() takes the shared lock, checks the
+        share of free margin not yet spoken for and books the amount. After order_send, commit() moves it to
+        settling, where it stays until the publisher has read an account_info() taken after the order, and
+        cancel() gives it back.
+    """
+    shm = None
+
+    def __init__(self, name=None, lock=None, create=False):
+        """
+            :param name: Name of the shared memory block, None to pick one (create only)
+            :param lock: multiprocessing.Lock shared by every process using the block, a new one when creating
+            :param create: Create the block rather than attach to an existing one
+        """
+        size = len(FIELDS) * 8
+        self.shm = shared_memory.SharedMemory(name=name, create=create, size=size)
+        self.name = self.shm.name
+        self.lock = lock if lock is not None else multiprocessing.Lock()
+        self.values = np.ndarray((len(FIELDS),), dtype=np.float64, buffer=self.shm.buf)
+        if create:
+            self.values[:] = 0.0
+        self.index = {field: i for i, field in enumerate(FIELDS)}
+
+    def read(self):
+        """
+            :return: AccountSnapshot of the last published figures and the current reservations
+        """
+        values = self.values
+        while True:
+            sequence = values[0]
+            snapshot = values[1:].tolist()
+            if sequence % 2 == 0 and values[0] == sequence:
+                return AccountSnapshot(*snapshot)
+            time.sleep(0)
+
+    def publish(self, info, exposure, settled=0.0):
+        """
+            Writes fresh account figures.
+            :param info: account_info() result
+            :param exposure: Notional value of the open positions
+            :param settled: Committed margin the figures already reflect, released from settling
+            :return: None
+        """
+        values, index = self.values, self.index
+        with self.lock:
+            values[0] += 1
+            values[index["generation"]] += 1
+            values[index["time"]] = time.time()
+            values[index["balance"]] = info.balance
+            values[index["equity"]] = info.equity
+            values[index["margin"]] = info.margin
+            values[index["margin_free"]] = info.margin_free
+            values[index["exposure"]] = exposure
+            values[index["settling"]] = max(0.0, values[index["settling"]] - settled)
+            values[0] += 1
+
+    def settling(self):
+        return float(self.values[self.index["settling"]])
+
+    def available(self, share=0.8):
+        """
+            :param share: Share of the free margin the bot may use
+            :return: Margin still available to new orders
+        """
+        snapshot = self.read()
+        return share * snapshot.margin_free - snapshot.reserved - snapshot.settling
+
+    def __bump__(self, field, amount):
+        values = self.values
+        values[0] += 1
+        values[self.index[field]] += amount
+        values[0] += 1
+
+    def reserve(self, amount, share=0.8):
+        """
+            Books margin for an order about to be sent if enough is left.
+            :param amount: Margin the order needs
+            :param share: Share of the free margin the bot may use
+            :return: True if the margin was reserved
+        """
+        with self.lock:
+            values, index = self.values, self.index
+            if values[index["generation"]] == 0:
+                return False
+            free = share * values[index["margin_free"]] - values[index["reserved"]] - values[index["settling"]]
+            if amount > free:
+                return False
+            self.__bump__("reserved", amount)
+            return True
+
+    def commit(self, amount):
+        """
+            Marks reserved margin as used by an order that was sent.
+            :return: None
+        """
+        with self.lock:
+            self.__bump__("reserved", -amount)
+            self.__bump__("settling", amount)
+
+    def cancel(self, amount):
+        """
+            Releases reserved margin of an order that was not placed.
+            :return: None
+        """
+        with self.lock:
+            self.__bump__("reserved", -amount)
+
+    def close(self):
+        self.values = None
+        self.shm.close()
+
+    def unlink(self):
+        self.close()
+        self.shm.unlink()
+
+
+class AccountPublisher:
+    """
+        Refreshes an AccountState with one account_info() and one positions_get() per interval, however many
+        symbols are trading.
+    """
+    thread = None
+
+    def __init__(self, state, broker, interval=1.0):
+        """
+            :param state: AccountState to write
+            :param broker: Broker of the account
+            :param interval: Seconds between refreshes
+        """
+        self.state = state
+        self.broker = broker
+        self.interval = interval
+        self.stopped = threading.Event()
+
+    def poll(self):
+        # Only the commits made before account_info() was asked for are reflected in its answer.
+        settled = self.state.settling()
+        info = self.broker.account_info()
+        if info is None:
+            return
+        exposure = 0.0
+        sizes = {}
+        for position in self.broker.positions_get() or ():
+            if position.symbol not in sizes:
+                sizes[position.symbol] = self.broker.symbol_info(position.symbol).trade_contract_size
+            exposure += position.volume * sizes[position.symbol] * position.price_current
+        self.state.publish(info, exposure, settled)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[-] Account publisher: {e!r}")
+            self.stopped.wait(self.interval)
+
+    def start(self):
+        if self.thread is None:
+            self.poll()
+            self.thread = threading.Thread(target=self.run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
@@ -0,0 +1,264 @@
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from BotCodeV2.AccountState import AccountPublisher, AccountState
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.BrokerCache import CachedBroker
+from BotCodeV2.CandleStore import getCandleStore
+from BotCodeV2.HistoryStore import HistoryStore
+from BotCodeV2.Journal import RecordingBroker
+from BotCodeV2.OrderGateway import OrderGateway
+from BotCodeV2.PositionMonitor import PositionMonitor
+from BotCodeV2.SnapshotStore import SnapshotStore
+from BotCodeV2.StrategyHost import StrategyHost
+from BotCodeV2.Tracer import getTracer
+from BotCodeV2.TradingSessions import SessionSchedule
+
+
+class AsyncRuntime:
+    """
+        Hosts the strategy cycles of many symbols and one account-wide position monitor as coroutines on one
+        event loop.
+        Blocking terminal work runs on a bounded thread pool, so the number of threads no longer grows with the
+        number of symbols or open positions. Orders and SL/TP changes go through one OrderGateway, so a cycle
+        never waits on order_send either. The strategies live in a StrategyHost, which is checked for changed
+        strategy code and config every reload_interval seconds. Cycles are scheduled on absolute deadlines and staggered across
+        the interval, so they do not drift or all hit the terminal at the same moment.
+        With a SessionSchedule, a symbol whose market is closed makes no terminal calls at all: its cycle or
+        tick polling sleeps until prewarm seconds before the next open, warms the strategy's caches, and resumes
+        at the open. The position monitor skips the positions of closed markets the same way.
+    """
+
+    def __init__(self, symbols, broker=None, workers=4, interval=30, watch_interval=1, event_driven=False,
+                 poll_interval=0.5, history=None, account=None, strategies=None, reload_interval=5, sessions=None,
+                 prewarm=120, snapshots=None, snapshot_interval=5):
+        """
+            :param symbols: Symbols to trade
+            :param broker: Broker to trade through, None for the MT5 terminal
+            :param workers: Maximum number of blocking terminal calls in flight
+            :param interval: Seconds between strategy cycles of a symbol
+            :param watch_interval: Seconds between position monitor polls
+            :param event_driven: Run a symbol's cycle when its TickTrigger reports an event instead of every
+            interval seconds; the spread and volume triggers are set per symbol by the spread_trigger and
+            volume_trigger strategy params
+            :param poll_interval: Seconds between tick polls of a symbol in event mode
+            :param history: HistoryStore the candle cache warm starts from, None to fetch everything from the
+            terminal
+            :param account: AccountState the strategies read free margin from and reserve it in
+            :param strategies: Strategy config dict or JSON file path (see StrategyHost), None to run the default
+            strategy on every symbol
+            :param reload_interval: Seconds between checks for changed strategy code or config
+            :param sessions: SessionSchedule of the symbols' markets, None to run every symbol around the clock
+            :param prewarm: Seconds before a market opens to warm the caches of its symbols
+            :param snapshots: SnapshotStore the strategies restore their state from at start and snapshot it to
+            after every cycle, None to not snapshot
+            :param snapshot_interval: Seconds between snapshot passes that catch state changed between cycles
+        """
+        self.symbols = list(symbols)
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.workers = workers
+        self.interval = interval
+        self.watch_interval = watch_interval
+        self.event_driven = event_driven
+        self.poll_interval = poll_interval
+        if history is not None:
+            getCandleStore(self.broker, history=history)
+        self.executor = None
+        self.account = account
+        self.sessions = sessions
+        self.prewarm = prewarm
+        self.monitor = PositionMonitor(self.broker, sessions=sessions)
+        self.gateway = OrderGateway(self.broker)
+        self.host = StrategyHost(self.broker, monitor=self.monitor, account=account, gateway=self.gateway,
+                                 config=strategies, snapshots=snapshots)
+        self.snapshot_interval = snapshot_interval
+        self.reload_interval = reload_interval
+        self.locks = {}
+        self.lateness = {symbol: deque(maxlen=1000) for symbol in self.symbols}
+
+    async def __blocking__(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def __suspend__(self, symbol):
+        # Sleeps through a closed session of the symbol, warming its caches shortly before the open. Returns
+        # True if it slept.
+        if self.sessions is None:
+            return False
+        calendar = self.sessions.calendar(symbol)
+        now = time.time()
+        if calendar.isOpen(now):
+            return False
+        opens = calendar.nextOpen(now)
+        if opens is None:
+            opens = now + self.sessions.recheck
+        print(f"[+] {symbol}: market closed, idle until {datetime.fromtimestamp(opens):%Y-%m-%d %H:%M}")
+        await asyncio.sleep(max(0.0, opens - self.prewarm - now))
+        try:
+            await self.__blocking__(self.host.prewarm, symbol)
+        except Exception as e:
+            print(f"[-] {symbol}: prewarm {e!r}")
+        await asyncio.sleep(max(0.0, opens - time.time()))
+        return True
+
+    async def __every__(self, name, interval, offset, function, lock=None, record=False, symbol=None):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + offset
+        while True:
+            await asyncio.sleep(max(0.0, deadline - loop.time()))
+            if symbol is not None and await self.__suspend__(symbol):
+                # Keep the stagger when every symbol of a market wakes at the same open.
+                deadline = loop.time() + offset
+                continue
+            if record:
+                self.lateness[name].append(loop.time() - deadline)
+            try:
+                if lock is not None:
+                    async with lock:
+                        await self.__blocking__(function)
+                else:
+                    await self.__blocking__(function)
+            except Exception as e:
+                print(f"[-] {name}: {e!r}")
+            deadline += interval
+            # Skip the deadlines missed while the call was running instead of bursting to catch up.
+            if deadline < loop.time():
+                deadline += (loop.time() - deadline) // interval * interval + interval
+
+    async def __onEvents__(self, symbol, offset):
+        await asyncio.sleep(offset)
+        while True:
+            if await self.__suspend__(symbol):
+                continue
+            try:
+                # Looked up every time, so a swapped strategy is picked up on the next poll.
+                events = await self.__blocking__(self.host.get(symbol).trigger.poll)
+                if events:
+                    async with self.locks[symbol]:
+                        await self.__blocking__(self.host.step, symbol)
+            except Exception as e:
+                print(f"[-] {symbol}: {e!r}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def __start__(self, symbol):
+        self.locks[symbol] = asyncio.Lock()
+        await self.__blocking__(self.host.add, symbol)
+
+    async def main(self, duration=None):
+        """
+            Runs every symbol until cancelled or until duration seconds have passed.
+            :param duration: Seconds to run for, None to run forever
+            :return: None
+        """
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        self.gateway.start()
+        try:
+            await asyncio.gather(*(self.__start__(symbol) for symbol in self.symbols))
+            tasks = [asyncio.create_task(self.__every__("position monitor", self.watch_interval, 0, self.monitor.poll)),
+                     asyncio.create_task(self.__every__("strategy reload", self.reload_interval, self.reload_interval,
+                                                        self.host.checkReload))]
+            if self.host.snapshots is not None:
+                tasks.append(asyncio.create_task(self.__every__("snapshots", self.snapshot_interval,
+                                                                self.snapshot_interval, self.host.saveSnapshots)))
+            for i, symbol in enumerate(self.symbols):
+                if self.event_driven:
+                    offset = self.poll_interval * i / len(self.symbols)
+                    tasks.append(asyncio.create_task(self.__onEvents__(symbol, offset)))
+                    continue
+                offset = self.interval * i / len(self.symbols)
+                step = functools.partial(self.host.step, symbol)
+                tasks.append(asyncio.create_task(self.__every__(symbol, self.interval, offset, step,
+                                                                lock=self.locks[symbol], record=True, symbol=symbol)))
+            try:
+                await asyncio.wait_for(asyncio.gather(*tasks), timeout=duration)
+            except asyncio.TimeoutError:
+                pass
+        finally:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.gateway.stop(wait=False)
+
+    def run(self, duration=None):
+        asyncio.run(self.main(duration))
+
+    def stats(self):
+        """
+            :return: Dict of symbol to (cycles sampled, mean lateness, max lateness) over the last 1000 cycles,
+            lateness in seconds
+        """
+        return {symbol: (len(late), sum(late) / len(late) if late else 0.0, max(late, default=0.0))
+                for symbol, late in self.lateness.items()}
+
+
+def runShard(symbols, workers=4, interval=30, event_driven=False, history_root=None, trace_port=None,
+             account_name=None, account_lock=None, journal=None, strategies=None, sessions=None, snapshot_root=None):
+    """
+        Entry point of one worker process: connects to the terminal and runs its symbols on an event loop.
+    """
+    if trace_port is not None:
+        getTracer().serve(trace_port)
+    broker = CachedBroker(getDefaultBroker())
+    if journal is not None:
+        # Recorded above the cache: ReplayBroker answers without one, so it needs every call the strategies made.
+        broker = RecordingBroker(broker, journal)
+    broker.initialize()
+    history = HistoryStore(history_root, broker) if history_root is not None else None
+    account = AccountState(account_name, account_lock) if account_name is not None else None
+    sessions = SessionSchedule(sessions, broker) if sessions is not None else None
+    snapshots = SnapshotStore(snapshot_root) if snapshot_root is not None else None
+    AsyncRuntime(symbols, broker=broker, workers=workers, interval=interval, event_driven=event_driven,
+                 history=history, account=account, strategies=strategies, sessions=sessions,
+                 snapshots=snapshots).run()
+
+
+def runSharded(symbols, processes=1, workers=4, interval=30, event_driven=False, history_root=None,
+               trace_port=None, journal_dir=None, strategies=None, sessions=None, snapshot_root=None):
+    """
+        Runs the symbols on processes event loops, dealing them out round-robin. This process publishes the
+        account state the workers share.
+        :param symbols: Symbols to trade
+        :param processes: Number of worker processes; 1 runs everything in the current process
+        :param workers: Maximum blocking terminal calls in flight per process
+        :param interval: Seconds between strategy cycles of a symbol
+        :param event_driven: Run cycles on tick events instead of every interval seconds
+        :param history_root: Directory of the on-disk bar history, None to keep history in memory only
+        :param trace_port: Serve the latency tracer of process i on trace_port + i, None to not serve it
+        :param journal_dir: Directory to record the terminal I/O of process i to as shard<i>.jrnl, None to not
+        record
+        :param strategies: Strategy config dict or JSON file path (see StrategyHost), None for the default strategy
+        :param sessions: Trading session schedule file (see TradingSessions.SessionSchedule), None to trade every
+        symbol around the clock
+        :param snapshot_root: Directory of the crash-recovery snapshots the symbols restart from, None to not
+        snapshot
+        :return: None
+    """
+    broker = CachedBroker(getDefaultBroker())
+    broker.initialize()
+    account = AccountState(create=True)
+    publisher = AccountPublisher(account, broker)
+    publisher.start()
+    options = {"workers": workers, "interval": interval, "event_driven": event_driven, "history_root": history_root,
+               "account_name": account.name, "account_lock": account.lock, "strategies": strategies,
+               "sessions": sessions, "snapshot_root": snapshot_root}
+    if journal_dir is not None:
+        os.makedirs(journal_dir, exist_ok=True)
+    try:
+        if processes <= 1:
+            runShard(symbols, trace_port=trace_port, **options,
+                     journal=None if journal_dir is None else os.path.join(journal_dir, "shard0.jrnl"))
+            return
+        shards = [symbols[i::processes] for i in range(processes)]
+        children = [multiprocessing.Process(target=runShard, args=(shard,), kwargs=dict(
+                        options, trace_port=None if trace_port is None else trace_port + i,
+                        journal=None if journal_dir is None else os.path.join(journal_dir, f"shard{i}.jrnl")))
+                    for i, shard in enumerate(shards) if shard]
+        for p in children:
+            p.start()
+        for p in children:
+            p.join()
+    finally:
+        publisher.stop()
+        account.unlink()
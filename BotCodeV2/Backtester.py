@@ -0,0 +1,182 @@
+import argparse
+import contextlib
+import os
+import time
+import numpy as np
+import pandas as pd
+from BotCodeV2.Broker import Broker
+from BotCodeV2.CandleStore import RATES_DTYPE, getCandleStore
+from BotCodeV2.HistoryStore import DEFAULT_ROOT, HistoryStore
+from BotCodeV2.PositionMonitor import PositionMonitor
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+from BotCodeV2.Strategies.scalping import Scalper
+
+
+def loadRates(path):
+    """
+        Loads M1 history from a .npy file (a structured rates array as returned by copy_rates_from_pos) or a
+        .csv file with time, open, high, low, close and optionally tick_volume, spread, real_volume columns.
+        The time column may hold epoch seconds or date strings.
+        :param path: Path of the file to load
+        :return: Structured rates array sorted by time
+    """
+    if path.endswith(".npy"):
+        data = np.load(path, mmap_mode="r")
+        rates = np.zeros(len(data), dtype=RATES_DTYPE)
+        for name in RATES_DTYPE.names:
+            if name in data.dtype.names:
+                rates[name] = data[name]
+    else:
+        frame = pd.read_csv(path)
+        frame.columns = [column.strip().lower() for column in frame.columns]
+        if not pd.api.types.is_numeric_dtype(frame["time"]):
+            frame["time"] = pd.to_datetime(frame["time"]).astype("int64") // 10 ** 9
+        rates = np.zeros(len(frame), dtype=RATES_DTYPE)
+        for name in RATES_DTYPE.names:
+            if name in frame.columns:
+                rates[name] = frame[name].to_numpy()
+    return rates[np.argsort(rates["time"], kind="stable")]
+
+
+def loadHistory(symbol, root=DEFAULT_ROOT):
+    """
+        Loads the M1 bars of a symbol recorded by the live bot's HistoryStore.
+        :param symbol: Symbol name
+        :param root: Directory of the HistoryStore
+        :return: Structured rates array sorted by time
+    """
+    return HistoryStore(root).series(symbol, Broker.TIMEFRAME_M1).rates()
+
+
+def loadData(names, history=None):
+    """
+        :param names: Paths of .csv/.npy files named <symbol>.<ext>, or symbol names when history is given
+        :param history: HistoryStore directory to read the symbols from, None to read files
+        :return: Dict of symbol name to structured M1 rates array
+    """
+    if history is not None:
+        return {name: loadHistory(name, history) for name in names}
+    return {os.path.splitext(os.path.basename(path))[0]: loadRates(path) for path in names}
+
+
+class Backtester:
+    """
+        Replays M1 history through Scalper and OrderManager on a SimulatedBroker. Each M1 bar the simulated
+        clock advances one bar, pending orders and SL/TP are filled against it and the PositionMonitor runs
+        one trailing pass; every cycle bars Scalper runs one decision cycle.
+        Several parameter sets can be replayed side by side (runCandidates): each trades its own account on
+        one shared market, so the candles and block zones are computed once per bar for all of them.
+    """
+
+    def __init__(self, data, cycle=5, warmup=5000, balance=10000.0, leverage=100, specs=None, quiet=True,
+                 params=None):
+        """
+            :param data: Dict of symbol name to structured M1 rates array
+            :param cycle: Number of M1 bars between Scalper decision cycles
+            :param warmup: Number of M1 bars of history to load before the first decision (Scalper reads 1000 M5 bars)
+            :param balance: Starting account balance
+            :param leverage: Account leverage used for margin
+            :param specs: Optional dict of symbol name to SimulatedSymbol contract spec overrides
+            :param quiet: Silence the strategy's console output while replaying
+            :param params: Scalper parameter overrides, see scalping.DEFAULT_PARAMS
+        """
+        self.data = data
+        self.cycle = cycle
+        self.warmup = warmup
+        self.balance = balance
+        self.leverage = leverage
+        self.quiet = quiet
+        self.params = params
+        self.broker = SimulatedBroker(balance=balance, leverage=leverage)
+        specs = specs or {}
+        for symbol, rates in data.items():
+            self.broker.addSymbol(symbol, rates, **specs.get(symbol, {}))
+        self.monitor = PositionMonitor(self.broker)
+        self.scalpers = []
+
+    def run(self):
+        """
+            Runs the backtest to the end of the data.
+            :return: A dict with the fills, trade count, PnL, maximum drawdown and throughput
+        """
+        return self.__replay__([(self.broker, self.monitor, self.params)])[0]
+
+    def runCandidates(self, candidates):
+        """
+            Backtests several parameter sets over the same bars in one pass. Every set trades its own
+            SimulatedBroker account and PositionMonitor on the market of this backtester, so the candle
+            refreshes, the resampled time frames and the block zones of a threshold are shared. Indicator graphs
+            stay per account: when they are synced decides their warm-up, so sharing them would make a set's
+            result depend on the others. The results are those of running each set on its own.
+            :param candidates: List of Scalper parameter dicts
+            :return: List of reports as returned by run(), in the order of candidates
+        """
+        lanes = []
+        for i, params in enumerate(candidates):
+            broker = self.broker if i == 0 else SimulatedBroker(self.balance, self.leverage, market=self.broker)
+            lanes.append((broker, self.monitor if i == 0 else PositionMonitor(broker), params))
+        return self.__replay__(lanes)
+
+    def __replay__(self, lanes):
+        timeline = np.unique(np.concatenate([rates["time"] for rates in self.data.values()]))
+        warmup = min(self.warmup, len(timeline) - 1)
+        candles = getCandleStore(self.broker)
+        started = time.perf_counter()
+        with contextlib.ExitStack() as stack:
+            if self.quiet:
+                stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+            for broker, monitor, params in lanes:
+                broker.advance(int(timeline[warmup]))
+            scalpers = [[Scalper(symbol, [], [], broker=broker, live=False, monitor=monitor, params=params)
+                         for symbol in self.data] for broker, monitor, params in lanes]
+            self.scalpers = scalpers[0]
+            for bar, now in enumerate(timeline[warmup:]):
+                if bar:
+                    for broker, monitor, params in lanes:
+                        broker.advance(int(now))
+                decide = bar % self.cycle == 0
+                # Every lane reads the candles of a bar from one refresh; between decisions only a trailing pass
+                # that needs the ATR fetches them.
+                with contextlib.ExitStack() as snapshots:
+                    for symbol in self.data:
+                        snapshots.enter_context(candles.snapshot(symbol, lazy=not decide))
+                    for (broker, monitor, params), lane in zip(lanes, scalpers):
+                        monitor.poll()
+                        if decide:
+                            for scalper in lane:
+                                scalper.step()
+        elapsed = time.perf_counter() - started
+
+        bars = (len(timeline) - warmup) * len(self.data)
+        reports = []
+        for broker, monitor, params in lanes:
+            for ticket in list(broker.positions):
+                broker.Close(broker.positions[ticket]["symbol"], ticket=ticket)
+            reports.append({
+                "symbols": list(self.data),
+                "bars": bars,
+                "seconds": elapsed,
+                "bars_per_second": bars * len(lanes) / elapsed if elapsed else float("inf"),
+                "fills": broker.fills,
+                "trades": sum(1 for fill in broker.fills if fill.reason != "open"),
+                "pnl": broker.balance - self.balance,
+                "max_drawdown": broker.max_drawdown,
+            })
+        return reports
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay M1 history through the Scalper strategy.")
+    parser.add_argument("files", nargs="+", help=".csv or .npy M1 history, one file per symbol named <symbol>.<ext>")
+    parser.add_argument("--history", help="Read the symbols named in files from this HistoryStore directory")
+    parser.add_argument("--cycle", type=int, default=5, help="M1 bars between decision cycles")
+    parser.add_argument("--warmup", type=int, default=5000, help="M1 bars of history before the first decision")
+    parser.add_argument("--balance", type=float, default=10000.0)
+    args = parser.parse_args()
+
+    data = loadData(args.files, args.history)
+    report = Backtester(data, cycle=args.cycle, warmup=args.warmup, balance=args.balance).run()
+    print(f"Symbols: {', '.join(report['symbols'])}")
+    print(f"Bars: {report['bars']} in {report['seconds']:.2f}s ({report['bars_per_second']:.0f} bars/s)")
+    print(f"Fills: {len(report['fills'])}, closed trades: {report['trades']}")
+    print(f"PnL: {report['pnl']:.2f}, max drawdown: {report['max_drawdown']:.2f}")
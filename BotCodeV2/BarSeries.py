@@ -0,0 +1,56 @@
+import numpy as np
+
+FIELDS = ("time", "open", "high", "low", "close", "tick_volume", "spread", "real_volume")
+
+
+class BarSeries:
+    """
+        Candles of one series read in place from a structured rates array (a CandleStore window or any
+        copy_rates result), without copying. bars.close, bars.tick_volume, ... are column views of the array,
+        bars[i] is one candle, bars["close"] a column and bars[i:j] another BarSeries over the same memory, so
+        a BarSeries can be passed anywhere a rates array is read. Times stay Unix seconds; toDataFrame() is
+        there for exports that want pandas.
+    """
+    __slots__ = ("rates",) + FIELDS
+
+    def __init__(self, rates):
+        """
+            :param rates: Structured array of candles with the copy_rates fields, oldest first
+        """
+        self.rates = rates
+        for name in FIELDS:
+            setattr(self, name, rates[name])
+
+    def __len__(self):
+        return len(self.rates)
+
+    def __getitem__(self, key):
+        if isinstance(key, (str, int, np.integer)):
+            return self.rates[key]
+        return BarSeries(self.rates[key])
+
+    def __iter__(self):
+        return iter(self.rates)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.rates if dtype is None else self.rates.astype(dtype)
+
+    @property
+    def dtype(self):
+        return self.rates.dtype
+
+    def lastTime(self):
+        """
+            :return: Open time of the newest candle, None if there is none
+        """
+        return int(self.time[-1]) if len(self.rates) else None
+
+    def toDataFrame(self):
+        """
+            Copies the candles into a pandas DataFrame with time as datetimes.
+            :return: A DataFrame with columns time, open, high, low, close, tick_volume, spread, real_volume
+        """
+        import pandas as pd
+        frame = pd.DataFrame(self.rates, columns=list(FIELDS))
+        frame["time"] = pd.to_datetime(frame["time"], unit="s")
+        return frame
@@ -0,0 +1,393 @@
+import numpy as np
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.CandleStore import RATES_DTYPE, getCandleStore
+from BotCodeV2.Strategies.scalping import DEFAULT_PARAMS
+from BotCodeV2.Tracer import getTracer
+
+BUY = 1
+SELL = -1
+WAIT = 0
+VOTES = {BUY: "BUY", SELL: "SELL", WAIT: "WAIT"}
+
+# Bars per recursion block; short enough for the decay powers to stay well inside float64.
+BLOCK = 64
+
+
+def stackRates(rates_list, count):
+    """
+        Aligns the newest bars of many symbols into symbols x bars arrays. A symbol with fewer than count
+        bars is padded on the left with NaN, which makes all of its indicators NaN so it votes WAIT.
+        :param rates_list: Structured rates arrays, one per symbol, oldest first
+        :param count: Number of bars per symbol
+        :return: Dict of field (time, open, high, low, close, tick_volume) to a float64 array of shape
+        (symbols, count)
+    """
+    stacked = np.zeros((len(rates_list), count), dtype=RATES_DTYPE)
+    lengths = np.empty(len(rates_list), dtype=np.int64)
+    for i, rates in enumerate(rates_list):
+        n = min(len(rates), count)
+        lengths[i] = n
+        if n:
+            stacked[i, count - n:] = rates[len(rates) - n:]
+    columns = {name: stacked[name].astype(np.float64) for name in ("time", "open", "high", "low", "close", "tick_volume")}
+    padded = lengths < count
+    if padded.any():
+        missing = np.arange(count)[None, :] < (count - lengths)[:, None]
+        for values in columns.values():
+            values[missing] = np.nan
+    return columns
+
+
+def __recurse__(values, alpha, seed):
+    # y[t] = y[t-1] + alpha * (values[t] - y[t-1]) for every row at once, starting from y[-1] = seed. Each block
+    # of bars is one matrix product: y[j] = (1 - alpha)^(j + 1) * y[-1] + sum_i alpha * (1 - alpha)^(j - i) * values[i].
+    rows, n = values.shape
+    out = np.empty((rows, n))
+    if n == 0:
+        return out
+    decay = 1.0 - alpha
+    block = min(BLOCK, n)
+    lags = np.arange(block)[:, None] - np.arange(block)[None, :]
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0).T
+    carry = decay ** np.arange(1, block + 1)
+    previous = seed
+    for start in range(0, n, block):
+        m = min(block, n - start)
+        out[:, start:start + m] = values[:, start:start + m] @ weights[:m, :m] + previous[:, None] * carry[:m]
+        previous = out[:, start + m - 1]
+    return out
+
+
+def __smoothed__(values, period, first, alpha):
+    # Average seeded with the simple average of values[first:first + period], NaN before it, as TA-Lib does.
+    out = np.full(values.shape, np.nan)
+    seed_index = first + period - 1
+    if values.shape[1] <= seed_index:
+        return out
+    seed = values[:, first:seed_index + 1].mean(axis=1)
+    out[:, seed_index] = seed
+    out[:, seed_index + 1:] = __recurse__(values[:, seed_index + 1:], alpha, seed)
+    return out
+
+
+def ema(values, period, first=0):
+    """
+        :param values: Array of shape (symbols, bars)
+        :param period: Averaging period
+        :param first: Index of the first bar to average
+        :return: Exponential moving average per row, NaN while warming up
+    """
+    return __smoothed__(values, period, first, 2.0 / (period + 1))
+
+
+def wilder(values, period, first=0):
+    """
+        :return: Wilder smoothing (ATR, RSI) per row, NaN while warming up
+    """
+    return __smoothed__(values, period, first, 1.0 / period)
+
+
+def __rolling__(values, period, reduce):
+    # Reduces every window of period bars by folding shifted slices, much faster than reducing the last axis
+    # of a sliding window view when period is small.
+    out = np.full(values.shape, np.nan)
+    if values.shape[1] >= period:
+        n = values.shape[1] - period + 1
+        result = values[:, :n].copy()
+        for offset in range(1, period):
+            reduce(result, values[:, offset:offset + n], out=result)
+        out[:, period - 1:] = result
+    return out
+
+
+def sma(values, period):
+    return __rolling__(values, period, np.add) / period
+
+
+def macd(close, fastperiod=12, slowperiod=26, signalperiod=9):
+    """
+        :return: (macd, signal, hist) arrays like talib.MACD, NaN while warming up
+    """
+    # TA-Lib starts the fast average late so both averages produce their first value on the same bar.
+    line = ema(close, fastperiod, slowperiod - fastperiod) - ema(close, slowperiod)
+    signal = ema(line, signalperiod, slowperiod - 1)
+    line[np.isnan(signal)] = np.nan
+    return line, signal, line - signal
+
+
+def trueRange(high, low, close):
+    previous = np.empty(close.shape)
+    previous[:, 0] = np.nan
+    previous[:, 1:] = close[:, :-1]
+    return np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+
+
+def atr(high, low, close, timeperiod=14):
+    return wilder(trueRange(high, low, close), timeperiod, first=1)
+
+
+def natr(high, low, close, timeperiod=14):
+    average = atr(high, low, close, timeperiod)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(close != 0, average / close * 100, 0.0)
+
+
+def rsi(close, timeperiod=14):
+    change = np.full(close.shape, np.nan)
+    change[:, 1:] = np.diff(close, axis=1)
+    gain = wilder(np.maximum(change, 0.0), timeperiod, first=1)
+    loss = wilder(np.maximum(-change, 0.0), timeperiod, first=1)
+    total = gain + loss
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(total != 0, 100 * gain / total, np.where(np.isnan(total), np.nan, 0.0))
+
+
+def stochRSI(close, timeperiod=14, fastk_period=5, fastd_period=3):
+    """
+        :return: (fastk, fastd) arrays like talib.STOCHRSI with fastd_matype=0, NaN while warming up
+    """
+    values = rsi(close, timeperiod)
+    lowest = __rolling__(values, fastk_period, np.minimum)
+    span = __rolling__(values, fastk_period, np.maximum) - lowest
+    with np.errstate(divide="ignore", invalid="ignore"):
+        fastk = np.where(span != 0, (values - lowest) / span * 100, np.where(np.isnan(span), np.nan, 0.0))
+    fastd = sma(fastk, fastd_period)
+    fastk[np.isnan(fastd)] = np.nan
+    return fastk, fastd
+
+
+def aroon(high, low, timeperiod=14):
+    """
+        :return: (aroondown, aroonup) arrays like talib.AROON, NaN while warming up
+    """
+    down = np.full(high.shape, np.nan)
+    up = np.full(high.shape, np.nan)
+    n = high.shape[1] - timeperiod
+    if n > 0:
+        # Scan each window oldest to newest; >= lets the most recent bar win ties, as in TA-Lib.
+        highest, lowest = high[:, :n].copy(), low[:, :n].copy()
+        since_high = np.full(highest.shape, timeperiod)
+        since_low = np.full(lowest.shape, timeperiod)
+        for offset in range(1, timeperiod + 1):
+            high_now, low_now = high[:, offset:offset + n], low[:, offset:offset + n]
+            newer_high, newer_low = high_now >= highest, low_now <= lowest
+            np.maximum(highest, high_now, out=highest)
+            np.minimum(lowest, low_now, out=lowest)
+            np.putmask(since_high, newer_high, timeperiod - offset)
+            np.putmask(since_low, newer_low, timeperiod - offset)
+        factor = 100.0 / timeperiod
+        invalid = np.isnan(__rolling__(high + low, timeperiod + 1, np.add)[:, timeperiod:])
+        up[:, timeperiod:] = np.where(invalid, np.nan, factor * (timeperiod - since_high))
+        down[:, timeperiod:] = np.where(invalid, np.nan, factor * (timeperiod - since_low))
+    return down, up
+
+
+#### Scalper votes ####
+
+def scalperStochRSIVotes(fastd_m1, fastd_m5, fastd_m15, params=None):
+    """
+        Scalper.__stochRSICalculator__ for every symbol: points from the last three M1, M5 and M15 fastd
+        readings against the oversold and overbought bands.
+        :return: Array of BUY, SELL or WAIT per symbol
+    """
+    params = dict(DEFAULT_PARAMS, **(params or {}))
+    low, high = params["rsi_low"], params["rsi_high"]
+    points = np.zeros(len(fastd_m1))
+    for fastd, weight in ((fastd_m5, params["weight_m5"]), (fastd_m15, params["weight_m15"]),
+                          (fastd_m1, params["weight_m1"])):
+        last = fastd[:, -3:]
+        points += (np.where(last >= high, weight, 0) - np.where(last <= low, weight, 0)).sum(axis=1)
+    return np.where(points >= params["trend_cutoff"], BUY, np.where(points <= -params["trend_cutoff"], SELL, WAIT))
+
+
+def scalperVolumeTrend(tick_volume):
+    """
+        Scalper.__volumeTrend__ for every symbol: walks the last six bars oldest first, scoring a point for
+        each bar whose volume did not fall into the next one and stopping at the fourth miss.
+        :return: Boolean array, True where at least three points were scored
+    """
+    points = np.zeros(len(tick_volume), dtype=np.int64)
+    misses = np.zeros(len(tick_volume), dtype=np.int64)
+    active = np.ones(len(tick_volume), dtype=bool)
+    for i in range(-6, -1):
+        scored = tick_volume[:, i] - tick_volume[:, i + 1] <= 0
+        points += active & scored
+        missed = active & ~scored
+        active &= ~(missed & (misses > 2))
+        misses += missed & (misses <= 2)
+    return points >= 3
+
+
+def scalperMACDVotes(hist):
+    """
+        Scalper.__MACDCalculator__ for every symbol: the sign of the last five histogram bars.
+        :return: Array of BUY, SELL or WAIT per symbol
+    """
+    last = hist[:, -5:]
+    points = (last > 0).sum(axis=1) - (last < 0).sum(axis=1)
+    return np.where(points >= 3, SELL, np.where(points <= -3, BUY, WAIT))
+
+
+def scalperSignals(m1, m5, m15, params=None):
+    """
+        Evaluates the Scalper decision for every symbol at once.
+        :param m1: stackRates of M1 bars (the last 200 are used)
+        :param m5: stackRates of M5 bars (the last 100 feed StochRSI, all of them MACD, the last 6 the volume trend)
+        :param m15: stackRates of M15 bars (the last 50 are used)
+        :param params: Overrides of the Scalper DEFAULT_PARAMS
+        :return: Dict of volume_trend, stoch_rsi, macd and signal arrays; signal is the StochRSI vote where the
+        volume trend holds and WAIT elsewhere, as in Scalper.step
+    """
+    fastd_m1 = stochRSI(m1["close"][:, -200:])[1]
+    fastd_m5 = stochRSI(m5["close"][:, -100:])[1]
+    fastd_m15 = stochRSI(m15["close"][:, -50:])[1]
+    stoch_rsi = scalperStochRSIVotes(fastd_m1, fastd_m5, fastd_m15, params)
+    volume_trend = scalperVolumeTrend(m5["tick_volume"])
+    macd_votes = scalperMACDVotes(macd(m5["close"])[2])
+    return {"volume_trend": volume_trend, "stoch_rsi": stoch_rsi, "macd": macd_votes,
+            "signal": np.where(volume_trend, stoch_rsi, WAIT)}
+
+
+#### MarketManager votes ####
+
+def marketNATR(natr_values):
+    """
+        MarketManager.__NATRCalculator__ for every symbol.
+        :return: Boolean array, True where the last two NATR readings are at least 0.01
+    """
+    return (natr_values[:, -2:] >= 0.01).all(axis=1)
+
+
+def marketAroonVotes(down, up):
+    """
+        MarketManager.__Aroon__ for every symbol: counts strong up and down readings over the last 11 bars.
+        :return: Array of BUY, SELL or WAIT per symbol
+    """
+    down, up = down[:, -11:], up[:, -11:]
+    downtrend = ((down >= 70) & (up <= 30)).sum(axis=1)
+    uptrend = ((down <= 30) & (up >= 70)).sum(axis=1)
+    return np.where(uptrend >= 7, BUY, np.where(downtrend >= 7, SELL, WAIT))
+
+
+def marketStochRSIVotes(fastd):
+    """
+        MarketManager.__StochRSICalculator__ for every symbol: follows the direction of the last 11 fastd
+        readings, scoring runs in one direction and penalising reversals.
+        :return: Array of BUY, SELL or WAIT per symbol
+    """
+    last = fastd[:, -11:]
+    trend = np.zeros(len(last), dtype=np.int64)
+    points = np.zeros(len(last), dtype=np.int64)
+    for i in range(1, last.shape[1]):
+        for direction, moved in ((BUY, last[:, i] > last[:, i - 1]), (SELL, last[:, i] < last[:, i - 1])):
+            same = moved & (trend == direction)
+            turned = moved & (trend != direction)
+            points += same
+            points += np.where(turned, np.where(points == 0, 1, -1), 0)
+            trend[turned] = direction
+    newest = last[:, -1]
+    buy = (newest <= 20) & (trend == BUY) & (points >= 6)
+    sell = (newest >= 20) & (trend == SELL) & (points >= 6)
+    return np.where(buy, BUY, np.where(sell, SELL, WAIT))
+
+
+def __lastMean__(values, mask, count):
+    # Mean of the last count values of each row where mask holds, NaN for rows with none.
+    taken = mask & (np.cumsum(mask[:, ::-1], axis=1)[:, ::-1] <= count)
+    totals = np.where(taken, values, 0.0).sum(axis=1)
+    counts = taken.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(counts > 0, totals / counts, np.nan)
+
+
+def marketMACDVotes(hist, history=500):
+    """
+        MarketManager.__MACDCalculator__ for every symbol: compares the histogram with the average of its
+        last 20 positive and negative bars.
+        :return: Array of BUY, SELL or WAIT per symbol
+    """
+    hist = hist[:, -history:]
+    valid = ~np.isnan(hist)
+    uptrend_threshold = __lastMean__(hist, valid & (hist >= 0), 20)
+    downtrend_threshold = __lastMean__(hist, valid & (hist <= 0), 20)
+    newest, previous = hist[:, -1], hist[:, -4:-1]
+    sell_side = (newest < 0) & (newest <= downtrend_threshold)
+    buy_side = ~sell_side & (newest >= 0) & (newest >= uptrend_threshold)
+    sell = sell_side & (previous <= 0).all(axis=1)
+    buy = buy_side & (previous >= 0).all(axis=1) & (newest <= uptrend_threshold)
+    return np.where(sell, SELL, np.where(buy, BUY, WAIT))
+
+
+def marketSignals(m5):
+    """
+        Evaluates the MarketManager decision for every symbol at once.
+        :param m5: stackRates of M5 bars
+        :return: Dict of natr, aroon, stoch_rsi, macd and signal arrays; signal is BUY or SELL where the NATR
+        filter passes and two of the three votes agree, WAIT elsewhere
+    """
+    high, low, close = m5["high"], m5["low"], m5["close"]
+    natr_ok = marketNATR(natr(high, low, close))
+    # Aroon only looks back timeperiod bars, so the last 11 readings need just the last 25 bars.
+    votes = {"aroon": marketAroonVotes(*aroon(high[:, -25:], low[:, -25:])), "stoch_rsi": marketStochRSIVotes(stochRSI(close)[1]),
+             "macd": marketMACDVotes(macd(close)[2])}
+    stacked = np.stack(list(votes.values()))
+    buy, sell = (stacked == BUY).sum(axis=0), (stacked == SELL).sum(axis=0)
+    signal = np.where(natr_ok & (buy == 2), BUY, np.where(natr_ok & (sell == 2), SELL, WAIT))
+    return dict(votes, natr=natr_ok, signal=signal)
+
+
+class BatchEvaluator:
+    """
+        Evaluates the Scalper and MarketManager signals of a whole watchlist in one pass: the newest bars of
+        every symbol are read from the shared CandleStore, stacked into symbols x bars arrays and every
+        indicator and vote is computed across all symbols at once instead of once per symbol.
+        Indicators are computed over the window each call, like talib, rather than carried between calls.
+    """
+
+    def __init__(self, symbols, broker=None, params=None, candles=None):
+        """
+            :param symbols: Symbols to evaluate
+            :param broker: Broker to read bars through, None for the MT5 terminal
+            :param params: Overrides of the Scalper DEFAULT_PARAMS
+            :param candles: CandleStore to read bars from, None for the shared one of the broker
+        """
+        self.symbols = list(symbols)
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.candles = candles if candles is not None else getCandleStore(self.broker)
+        self.tracer = getTracer()
+
+    def __stack__(self, counts):
+        # One candle snapshot per symbol, so all of its time frames come from a single refresh.
+        rates = {time_frame: [] for time_frame in counts}
+        with self.tracer.stage("portfolio", "fetch"):
+            for symbol in self.symbols:
+                with self.candles.snapshot(symbol):
+                    for time_frame, count in counts.items():
+                        rates[time_frame].append(self.candles.get(symbol, time_frame, count))
+        with self.tracer.stage("portfolio", "stack"):
+            return {time_frame: stackRates(rates[time_frame], count) for time_frame, count in counts.items()}
+
+    def __named__(self, signals):
+        return {symbol: VOTES[int(vote)] for symbol, vote in zip(self.symbols, signals)}
+
+    def scalperSignals(self):
+        """
+            :return: Dict of symbol to "BUY", "SELL" or "WAIT" as Scalper would vote this cycle
+        """
+        broker = self.broker
+        stacked = self.__stack__({broker.TIMEFRAME_M1: 200, broker.TIMEFRAME_M5: 1000, broker.TIMEFRAME_M15: 50})
+        with self.tracer.stage("portfolio", "scalper_signals"):
+            signals = scalperSignals(stacked[broker.TIMEFRAME_M1], stacked[broker.TIMEFRAME_M5],
+                                     stacked[broker.TIMEFRAME_M15], self.params)
+        return self.__named__(signals["signal"])
+
+    def marketSignals(self, number_of_candles=500):
+        """
+            :param number_of_candles: Number of M5 bars to evaluate
+            :return: Dict of symbol to "BUY", "SELL" or "WAIT" as MarketManager would vote this cycle
+        """
+        m5 = self.__stack__({self.broker.TIMEFRAME_M5: number_of_candles})[self.broker.TIMEFRAME_M5]
+        with self.tracer.stage("portfolio", "market_signals"):
+            signals = marketSignals(m5)
+        return self.__named__(signals["signal"])
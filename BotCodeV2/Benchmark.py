@@ -0,0 +1,185 @@
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+import numpy as np
+from BotCodeV2.Backtester import loadData
+from BotCodeV2.BatchSignals import BatchEvaluator
+from BotCodeV2.BlockOrders import findBlockOrders
+from BotCodeV2.MarketManager import MarketManager
+from BotCodeV2.PositionMonitor import PositionMonitor
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+from BotCodeV2.Strategies.scalping import Scalper
+
+SCALPER_METHODS = ["__volumeTrend__", "__MACDCalculator__", "__ATRCalculator__"]
+MARKET_MANAGER_METHODS = ["__NATRCalculator__", "__Aroon__", "__StochRSICalculator__", "__MACDCalculator__"]
+
+
+def __timed__(function, timings, name):
+    started = time.perf_counter()
+    function()
+    timings.setdefault(name, []).append(time.perf_counter() - started)
+
+
+def __summary__(name, symbols, window, samples):
+    samples = np.array(samples) * 1000
+    return {
+        "benchmark": name,
+        "symbols": symbols,
+        "window": window,
+        "calls": len(samples),
+        "mean_ms": float(samples.mean()),
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+        "total_s": float(samples.sum() / 1000),
+    }
+
+
+def __broker__(symbols, bars, data=None, seed=0):
+    broker = SimulatedBroker()
+    if data:
+        recorded = list(data.values())
+        for i in range(symbols):
+            broker.addSymbol(f"REC{i}", recorded[i % len(recorded)])
+    else:
+        for i in range(symbols):
+            broker.addSyntheticSymbol(f"SYN{i}", bars, seed=seed + i)
+    return broker
+
+
+def runBenchmarks(symbol_counts=(1, 50, 500), windows=(200, 500, 1000), iterations=5, data=None, seed=0):
+    """
+        Times the strategy hot path on a SimulatedBroker. Every iteration the clock moves one M1 bar, so
+        the streaming indicators are measured in their steady state (one new bar per call).
+        Benchmarks:
+        findBlockOrders for the block zone search on a window of M5 bars,
+        scalper.<method> for each Scalper indicator on the same window,
+        market_manager.<method> for each MarketManager indicator on the same window,
+        scalper.__stochRSICalculator__ (window does not apply: it reads fixed M1, M5 and M15 series),
+        scalper.step for a full decision cycle (window does not apply),
+        batch.scalperSignals and batch.marketSignals for one BatchEvaluator pass over every symbol.
+        :param symbol_counts: Numbers of symbols to run at
+        :param windows: Numbers of M5 bars fed to the indicators
+        :param iterations: Timed calls per symbol, benchmark and window
+        :param data: Optional dict of symbol to recorded M1 rates, reused round-robin; synthetic data otherwise
+        :param seed: Base seed of the synthetic data
+        :return: List of result dicts with benchmark, symbols, window, calls, mean, p50, p99 and total
+    """
+    results = []
+    warmup = max(windows) * 5 + 1000
+    for count in symbol_counts:
+        broker = __broker__(count, warmup + (len(windows) + 2) * iterations + 1, data, seed)
+        times = broker.symbols[next(iter(broker.symbols))].times
+        position = min(warmup, len(times) - (len(windows) + 2) * iterations - 1)
+        broker.advance(int(times[position]))
+        monitor = PositionMonitor(broker)
+        scalpers = [Scalper(name, [], [], broker=broker, live=False, monitor=monitor) for name in broker.symbols]
+        managers = [MarketManager(name, broker=broker, live=False) for name in broker.symbols]
+
+        for window in windows:
+            timings = {}
+            for iteration in range(iterations):
+                position += 1
+                broker.advance(int(times[position]))
+                for scalper, manager in zip(scalpers, managers):
+                    scalper.dataFetcher(5, window)
+                    __timed__(lambda: findBlockOrders(scalper.rates, threshold=scalper.params["block_threshold"]),
+                              timings, "findBlockOrders")
+                    for method in SCALPER_METHODS:
+                        __timed__(getattr(scalper, method), timings, f"scalper.{method}")
+                    manager.dataFetcher(5, window)
+                    for method in MARKET_MANAGER_METHODS:
+                        __timed__(getattr(manager, method), timings, f"market_manager.{method}")
+            results.extend(__summary__(name, count, window, samples) for name, samples in timings.items())
+
+        timings = {}
+        for iteration in range(iterations):
+            position += 1
+            broker.advance(int(times[position]))
+            monitor.poll()
+            for scalper in scalpers:
+                __timed__(scalper.__stochRSICalculator__, timings, "scalper.__stochRSICalculator__")
+                __timed__(scalper.step, timings, "scalper.step")
+
+        evaluator = BatchEvaluator(broker.symbols, broker=broker)
+        for iteration in range(iterations):
+            position += 1
+            broker.advance(int(times[position]))
+            __timed__(evaluator.scalperSignals, timings, "batch.scalperSignals")
+            __timed__(evaluator.marketSignals, timings, "batch.marketSignals")
+        results.extend(__summary__(name, count, None, samples) for name, samples in timings.items())
+    return results
+
+
+def compareResults(results, baseline, tolerance=0.2, metric="p50_ms"):
+    """
+        Matches results to a stored baseline by benchmark, symbol count and window.
+        :param results: Current results from runBenchmarks
+        :param baseline: Results of an earlier run
+        :param tolerance: Relative slowdown allowed before a result counts as a regression
+        :param metric: Field to compare
+        :return: List of (result, baseline value, ratio, status) with status "regression", "improved" or "ok"
+    """
+    stored = {(result["benchmark"], result["symbols"], result["window"]): result for result in baseline}
+    report = []
+    for result in results:
+        before = stored.get((result["benchmark"], result["symbols"], result["window"]))
+        if before is None or before[metric] <= 0:
+            continue
+        ratio = result[metric] / before[metric]
+        if ratio > 1 + tolerance:
+            status = "regression"
+        elif ratio < 1 / (1 + tolerance):
+            status = "improved"
+        else:
+            status = "ok"
+        report.append((result, before[metric], ratio, status))
+    return report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark indicators, zone detection and decision cycles.")
+    parser.add_argument("files", nargs="*", help="Optional recorded M1 history (.csv/.npy, or symbols with --history)")
+    parser.add_argument("--history", help="Read the symbols named in files from this HistoryStore directory")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--windows", type=int, nargs="+", default=[200, 500, 1000])
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument("--baseline", help="Compare against the results stored in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    data = loadData(args.files, args.history) if args.files else None
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        results = runBenchmarks(args.symbols, args.windows, args.iterations, data, args.seed)
+    with open(args.out, "w") as f:
+        json.dump({
+            "created": datetime.now(tz=timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+            "data": "recorded" if data else "synthetic",
+            "results": results,
+        }, f, indent=2)
+    for result in results:
+        print(f"{result['benchmark']:<42} {result['symbols']:>4} symbols  window {str(result['window']):>5}  "
+              f"p50 {result['p50_ms']:.3f}ms  p99 {result['p99_ms']:.3f}ms")
+    print(f"Results in {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        report = compareResults(results, baseline, args.tolerance)
+        regressions = [entry for entry in report if entry[3] == "regression"]
+        for result, before, ratio, status in report:
+            if status != "ok":
+                print(f"[{'-' if status == 'regression' else '+'}] {result['benchmark']} {result['symbols']} symbols "
+                      f"window {result['window']}: {before:.3f}ms -> {result['p50_ms']:.3f}ms ({ratio:.2f}x)")
+        print(f"{len(regressions)} regressions out of {len(report)} compared benchmarks")
+        if regressions:
+            sys.exit(1)
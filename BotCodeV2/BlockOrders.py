@@ -0,0 +1,178 @@
+import threading
+import numpy as np
+from BotCodeV2.Broker import getDefaultBroker
+
+
+def __detect__(rates, threshold):
+    rates = np.atleast_2d(rates)
+    symbols = rates.shape[0]
+    if rates.shape[1] == 0:
+        # A fresh symbol has no candles yet; there is no average body to compare with.
+        return [(np.empty((0, 2)), np.empty((0, 2))) for _ in range(symbols)]
+    candle_length = np.abs(rates["close"] - rates["open"])
+    avg_order_length = candle_length.mean(axis=1, keepdims=True)
+    block_orders = candle_length >= threshold * avg_order_length
+    # The first candle has no previous candle to pair with.
+    block_orders[:, 0] = False
+    rows, cols = np.nonzero(block_orders)
+
+    last_close = rates["low"][rows, cols - 1]
+    blk_close = rates["high"][rows, cols]
+    is_buy = last_close < blk_close
+    buy_zones = np.column_stack((last_close, blk_close))[is_buy]
+    sell_zones = np.column_stack((rates["low"][rows, cols], last_close))[~is_buy]
+
+    bounds = np.arange(symbols + 1)
+    buy_splits = np.searchsorted(rows[is_buy], bounds)
+    sell_splits = np.searchsorted(rows[~is_buy], bounds)
+    return [(buy_zones[buy_splits[i]:buy_splits[i + 1]], sell_zones[sell_splits[i]:sell_splits[i + 1]])
+            for i in range(symbols)]
+
+
+def findBlockOrders(rates, threshold=10):
+    """
+        Finds block-order entry zones in a window of candles. A candle whose body is at least threshold times
+        the average body is a block order; it forms a buy zone (previous low, block high) when the previous low
+        is below the block high and a sell zone (block low, previous low) otherwise.
+        :param rates: Structured rates array with open, high, low and close fields
+        :param threshold: Multiple of the average candle body a block order must reach
+        :return: (buy_zones, sell_zones), each a (n, 2) array of (low, high) rows; both empty for an empty window
+    """
+    return __detect__(rates, threshold)[0]
+
+
+def findBlockOrdersBatch(rates, threshold=10):
+    """
+        Same as findBlockOrders for a whole watchlist at once.
+        :param rates: Structured rates array of shape (symbols, bars), one aligned window per symbol
+        :param threshold: Multiple of the average candle body a block order must reach
+        :return: A list with one (buy_zones, sell_zones) tuple per symbol row
+    """
+    return __detect__(rates, threshold)
+
+
+class ZoneCache:
+    """
+        The block-order zones of the latest candle window of each symbol and threshold. Every strategy reading
+        the same market shares one, so the accounts of a sweep whose parameters differ only in weights or RSI
+        bands find the zones of a window once.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def find(self, symbol, rates, threshold=10):
+        """
+            Same as findBlockOrders, answered from the cache while the window is unchanged.
+            :param symbol: Symbol the candles belong to
+            :param rates: Structured rates array with time, open, high, low and close fields
+            :param threshold: Multiple of the average candle body a block order must reach
+            :return: (buy_zones, sell_zones), each a (n, 2) array of (low, high) rows; do not modify them
+        """
+        if len(rates) == 0:
+            # An empty window has no zones and nothing to identify it by.
+            return findBlockOrders(rates, threshold)
+        # Closed candles do not change, so a window is identified by its span and its forming candle.
+        stamp = (len(rates), rates["time"][0], rates[-1].tolist())
+        key = (symbol, threshold)
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry is not None and entry[0] == stamp:
+            return entry[1]
+        zones = findBlockOrders(rates, threshold)
+        with self.lock:
+            self.entries[key] = (stamp, zones)
+        return zones
+
+
+def getZoneCache(broker=None):
+    """
+        Returns the zone cache shared by everything in this process that reads the market of broker.
+        :param broker: A Broker, or None for the default MT5 terminal
+        :return: A ZoneCache
+    """
+    broker = broker if broker is not None else getDefaultBroker()
+    if broker.market is not None:
+        broker = broker.market
+    return broker.shared("zones", ZoneCache)
+
+
+class ZoneIndex:
+    """
+        Sorted index over (low, high) price zones. Containment and nearest-zone queries are answered with
+        binary searches instead of scanning every zone.
+    """
+    zones = None
+
+    def __init__(self, zones=()):
+        if isinstance(zones, ZoneIndex):
+            zones = zones.zones
+        zones = np.asarray(zones, dtype=float).reshape(-1, 2)
+        self.zones = zones[np.argsort(zones[:, 0], kind="stable")]
+        self.lows = self.zones[:, 0]
+        # reach[i] is the highest zone top among the zones sorted up to i.
+        self.reach = np.maximum.accumulate(self.zones[:, 1]) if len(self.zones) else self.zones[:, 1]
+        self.by_high = self.zones[np.argsort(self.zones[:, 1], kind="stable")]
+        self.highs = self.by_high[:, 1]
+
+    def __len__(self):
+        return len(self.zones)
+
+    def __iter__(self):
+        return iter(map(tuple, self.zones))
+
+    def extend(self, zones):
+        """
+            Adds zones to the index.
+            :param zones: Iterable of (low, high) pairs or a (n, 2) array
+            :return: None
+        """
+        zones = np.asarray(zones, dtype=float).reshape(-1, 2)
+        self.__init__(np.vstack((self.zones, zones)))
+
+    def contains(self, price):
+        """
+            :param price: Price to look up
+            :return: True if any zone contains price
+        """
+        i = np.searchsorted(self.lows, price, side="right")
+        return bool(i > 0 and self.reach[i - 1] >= price)
+
+    def containing(self, price):
+        """
+            :param price: Price to look up
+            :return: (n, 2) array of the zones that contain price
+        """
+        candidates = self.zones[:np.searchsorted(self.lows, price, side="right")]
+        return candidates[candidates[:, 1] >= price]
+
+    def above(self, price):
+        """
+            :param price: Price to look up
+            :return: (n, 2) array of the zones whose low is at or above price, nearest first
+        """
+        return self.zones[np.searchsorted(self.lows, price, side="left"):]
+
+    def below(self, price):
+        """
+            :param price: Price to look up
+            :return: (n, 2) array of the zones whose high is at or below price, nearest first
+        """
+        return self.by_high[:np.searchsorted(self.highs, price, side="right")][::-1]
+
+    def nearestAbove(self, price):
+        """
+            :param price: Price to look up
+            :return: The (low, high) zone with the lowest low strictly above price, or None
+        """
+        i = np.searchsorted(self.lows, price, side="right")
+        return tuple(self.zones[i]) if i < len(self.zones) else None
+
+    def nearestBelow(self, price):
+        """
+            :param price: Price to look up
+            :return: The (low, high) zone with the highest high strictly below price, or None
+        """
+        i = np.searchsorted(self.highs, price, side="left")
+        return tuple(self.by_high[i - 1]) if i > 0 else None
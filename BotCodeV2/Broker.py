@@ -0,0 +1,223 @@
+import threading
+
+
+def timeFrameSeconds(time_frame):
+    """
+        :param time_frame: MT5 time frame constant
+        :return: Length of one bar in seconds
+    """
+    if time_frame & 0x8000:
+        raise ValueError("Weekly and monthly time frames have no fixed length")
+    if time_frame & 0x4000:
+        return (time_frame & 0x3fff) * 3600
+    return time_frame * 60
+
+
+class Broker:
+    """
+        Interface to the trading terminal. It mirrors the subset of the MetaTrader5 module API the bot uses
+        (function names, arguments, return shapes and constants), so strategy code reads the same against the
+        real terminal and against SimulatedBroker.
+    """
+    TIMEFRAME_M1 = 1
+    TIMEFRAME_M5 = 5
+    TIMEFRAME_M15 = 15
+    TIMEFRAME_M30 = 30
+    TIMEFRAME_H1 = 16385
+    TIMEFRAME_H4 = 16388
+    TIMEFRAME_D1 = 16408
+
+    ORDER_TYPE_BUY = 0
+    ORDER_TYPE_SELL = 1
+    ORDER_TYPE_BUY_LIMIT = 2
+    ORDER_TYPE_SELL_LIMIT = 3
+    ORDER_TYPE_BUY_STOP = 4
+    ORDER_TYPE_SELL_STOP = 5
+    ORDER_TYPE_BUY_STOP_LIMIT = 6
+    ORDER_TYPE_SELL_STOP_LIMIT = 7
+
+    POSITION_TYPE_BUY = 0
+    POSITION_TYPE_SELL = 1
+
+    TRADE_ACTION_DEAL = 1
+    TRADE_ACTION_PENDING = 5
+    TRADE_ACTION_SLTP = 6
+    TRADE_ACTION_MODIFY = 7
+    TRADE_ACTION_REMOVE = 8
+
+    ORDER_TIME_GTC = 0
+    ORDER_FILLING_FOK = 0
+    ORDER_FILLING_IOC = 1
+    ORDER_FILLING_RETURN = 2
+
+    TRADE_RETCODE_REQUOTE = 10004
+    TRADE_RETCODE_REJECT = 10006
+    TRADE_RETCODE_DONE = 10009
+    TRADE_RETCODE_TIMEOUT = 10012
+    TRADE_RETCODE_INVALID = 10013
+    TRADE_RETCODE_INVALID_VOLUME = 10014
+    TRADE_RETCODE_INVALID_PRICE = 10015
+    TRADE_RETCODE_INVALID_STOPS = 10016
+    TRADE_RETCODE_MARKET_CLOSED = 10018
+    TRADE_RETCODE_NO_MONEY = 10019
+    TRADE_RETCODE_PRICE_CHANGED = 10020
+    TRADE_RETCODE_PRICE_OFF = 10021
+    TRADE_RETCODE_TOO_MANY_REQUESTS = 10024
+    TRADE_RETCODE_NO_CHANGES = 10025
+    TRADE_RETCODE_FROZEN = 10029
+    TRADE_RETCODE_CONNECTION = 10031
+
+    # Broker whose market data this one trades on, when several accounts replay the same market side by side
+    # (see SimulatedBroker); candle stores and block zone caches are shared per market. None for its own market.
+    market = None
+
+    def initialize(self, *args, **kwargs):
+        raise NotImplementedError
+
+    def login(self, login, password=None, server=None, **kwargs):
+        raise NotImplementedError
+
+    def shutdown(self):
+        raise NotImplementedError
+
+    def last_error(self):
+        raise NotImplementedError
+
+    def account_info(self):
+        raise NotImplementedError
+
+    def symbol_info(self, symbol):
+        raise NotImplementedError
+
+    def symbol_info_tick(self, symbol):
+        raise NotImplementedError
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        raise NotImplementedError
+
+    def copy_rates_from(self, symbol, time_frame, date_from, count):
+        raise NotImplementedError
+
+    def copy_rates_range(self, symbol, time_frame, date_from, date_to):
+        raise NotImplementedError
+
+    def positions_get(self, **kwargs):
+        raise NotImplementedError
+
+    def orders_get(self, **kwargs):
+        raise NotImplementedError
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        raise NotImplementedError
+
+    def order_send(self, request):
+        raise NotImplementedError
+
+    def Close(self, symbol, **kwargs):
+        raise NotImplementedError
+
+    def invalidate(self, symbol=None, kinds=None):
+        """
+            Drops cached terminal answers (see BrokerCache.CachedBroker); a broker without a cache has none.
+        """
+        pass
+
+    def shared(self, name, factory):
+        """
+            Returns the object everything in this process that trades through this broker shares under name
+            (its CandleStore, PositionMonitor, OrderGateway, ...), creating it with factory() the first time.
+            The objects live on the broker instead of in a registry, so they are freed together with it and a
+            new broker never picks up the state of an old one.
+            :param name: Name of the shared object
+            :param factory: Function returning a new object, called without arguments
+            :return: The shared object
+        """
+        with shared_lock:
+            objects = self.__dict__.setdefault("shared_objects", {})
+            value = objects.get(name)
+            if value is None:
+                value = objects[name] = factory()
+            return value
+
+
+class MT5Broker(Broker):
+    """
+        Broker backed by the MetaTrader5 terminal. The MetaTrader5 package is only imported when the adapter
+        is created, so the rest of the bot can be imported and run on machines without a terminal.
+    """
+
+    def __init__(self):
+        import MetaTrader5
+        self.mt5 = MetaTrader5
+
+    def initialize(self, *args, **kwargs):
+        return self.mt5.initialize(*args, **kwargs)
+
+    def login(self, login, password=None, server=None, **kwargs):
+        return self.mt5.login(login, password=password, server=server, **kwargs)
+
+    def shutdown(self):
+        return self.mt5.shutdown()
+
+    def last_error(self):
+        return self.mt5.last_error()
+
+    def account_info(self):
+        return self.mt5.account_info()
+
+    def symbol_info(self, symbol):
+        return self.mt5.symbol_info(symbol)
+
+    def symbol_info_tick(self, symbol):
+        return self.mt5.symbol_info_tick(symbol)
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        return self.mt5.copy_rates_from_pos(symbol, time_frame, start_pos, count)
+
+    def copy_rates_from(self, symbol, time_frame, date_from, count):
+        return self.mt5.copy_rates_from(symbol, time_frame, date_from, count)
+
+    def copy_rates_range(self, symbol, time_frame, date_from, date_to):
+        return self.mt5.copy_rates_range(symbol, time_frame, date_from, date_to)
+
+    def positions_get(self, **kwargs):
+        return self.mt5.positions_get(**kwargs)
+
+    def orders_get(self, **kwargs):
+        return self.mt5.orders_get(**kwargs)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        return self.mt5.order_calc_margin(action, symbol, volume, price)
+
+    def order_send(self, request):
+        return self.mt5.order_send(request)
+
+    def Close(self, symbol, **kwargs):
+        return self.mt5.Close(symbol, **kwargs)
+
+
+# Bar length in minutes to MT5 time frame constant, for code that takes the time frame in minutes.
+TIME_FRAMES = {
+    1: Broker.TIMEFRAME_M1,
+    5: Broker.TIMEFRAME_M5,
+    15: Broker.TIMEFRAME_M15,
+    30: Broker.TIMEFRAME_M30,
+    60: Broker.TIMEFRAME_H1,
+    240: Broker.TIMEFRAME_H4,
+    1440: Broker.TIMEFRAME_D1,
+}
+
+# Reentrant: a factory may ask for other shared objects of the same broker.
+shared_lock = threading.RLock()
+default_broker = None
+
+
+def getDefaultBroker():
+    """
+        Returns the process-wide MT5Broker, creating it on first use.
+        :return: An MT5Broker
+    """
+    global default_broker
+    if default_broker is None:
+        default_broker = MT5Broker()
+    return default_broker
@@ -0,0 +1,136 @@
+import threading
+import time
+from BotCodeV2.Broker import Broker
+
+SPEC = "spec"
+TICK = "tick"
+MARGIN = "margin"
+ACCOUNT = "account"
+
+
+class CachedBroker(Broker):
+    """
+        Broker wrapper that answers repeated metadata queries from memory instead of a terminal round trip.
+        Each kind of answer has its own time to live:
+        spec: symbol_info contract specs, which almost never change (bid, ask and spread are filled in from
+        the cached tick, so they stay as fresh as the tick),
+        tick: symbol_info_tick, fresh for a few milliseconds and dropped at the start of every decision cycle,
+        margin: order_calc_margin keyed by side, symbol and volume,
+        account: account_info, also dropped after every order_send.
+        Everything else goes straight through to the wrapped broker. Hits and misses are counted per kind.
+    """
+
+    def __init__(self, broker, spec_ttl=3600.0, tick_ttl=0.01, margin_ttl=60.0, account_ttl=1.0, clock=None):
+        """
+            :param broker: Broker to wrap
+            :param spec_ttl: Seconds a symbol_info answer is reused
+            :param tick_ttl: Seconds a symbol_info_tick answer is reused
+            :param margin_ttl: Seconds an order_calc_margin answer is reused
+            :param account_ttl: Seconds an account_info answer is reused
+            :param clock: Function returning the current time in seconds, time.monotonic by default; a
+            simulated broker's clock for backtests
+        """
+        self.broker = broker
+        self.ttl = {SPEC: spec_ttl, TICK: tick_ttl, MARGIN: margin_ttl, ACCOUNT: account_ttl}
+        self.clock = clock if clock is not None else time.monotonic
+        self.entries = {}
+        self.hits = {kind: 0 for kind in self.ttl}
+        self.misses = {kind: 0 for kind in self.ttl}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Reached only for attributes Broker does not define, e.g. SimulatedBroker.advance.
+        return getattr(self.__dict__["broker"], name)
+
+    def __cached__(self, kind, key, fetch):
+        now = self.clock()
+        with self.lock:
+            entry = self.entries.get((kind, key))
+            if entry is not None and now - entry[0] < self.ttl[kind]:
+                self.hits[kind] += 1
+                return entry[1]
+            self.misses[kind] += 1
+        value = fetch()
+        if value is not None:
+            with self.lock:
+                self.entries[(kind, key)] = (now, value)
+        return value
+
+    def invalidate(self, symbol=None, kinds=None):
+        """
+            Drops cached answers.
+            :param symbol: Only drop the answers about this symbol (account answers are kept), None for all
+            :param kinds: Iterable of kinds (SPEC, TICK, MARGIN, ACCOUNT) to drop, None for all
+            :return: None
+        """
+        with self.lock:
+            for kind, key in list(self.entries):
+                if kinds is not None and kind not in kinds:
+                    continue
+                if symbol is not None and (kind == ACCOUNT or key[0] != symbol):
+                    continue
+                del self.entries[(kind, key)]
+
+    def stats(self):
+        """
+            :return: Dict of kind to (hits, misses)
+        """
+        with self.lock:
+            return {kind: (self.hits[kind], self.misses[kind]) for kind in self.ttl}
+
+    def symbol_info(self, symbol):
+        info = self.__cached__(SPEC, (symbol,), lambda: self.broker.symbol_info(symbol))
+        if info is None:
+            return None
+        tick = self.symbol_info_tick(symbol)
+        if tick is None:
+            return info
+        return info._replace(bid=tick.bid, ask=tick.ask,
+                             spread=int(round((tick.ask - tick.bid) / info.point)) if info.point else info.spread)
+
+    def symbol_info_tick(self, symbol):
+        return self.__cached__(TICK, (symbol,), lambda: self.broker.symbol_info_tick(symbol))
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        return self.__cached__(MARGIN, (symbol, action, volume),
+                               lambda: self.broker.order_calc_margin(action, symbol, volume, price))
+
+    def account_info(self):
+        return self.__cached__(ACCOUNT, (None,), self.broker.account_info)
+
+    def order_send(self, request):
+        result = self.broker.order_send(request)
+        self.invalidate(kinds=(ACCOUNT,))
+        return result
+
+    def Close(self, symbol, **kwargs):
+        result = self.broker.Close(symbol, **kwargs)
+        self.invalidate(kinds=(ACCOUNT,))
+        return result
+
+    def initialize(self, *args, **kwargs):
+        return self.broker.initialize(*args, **kwargs)
+
+    def login(self, login, password=None, server=None, **kwargs):
+        return self.broker.login(login, password=password, server=server, **kwargs)
+
+    def shutdown(self):
+        return self.broker.shutdown()
+
+    def last_error(self):
+        return self.broker.last_error()
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        return self.broker.copy_rates_from_pos(symbol, time_frame, start_pos, count)
+
+    def copy_rates_from(self, symbol, time_frame, date_from, count):
+        return self.broker.copy_rates_from(symbol, time_frame, date_from, count)
+
+    def copy_rates_range(self, symbol, time_frame, date_from, date_to):
+        return self.broker.copy_rates_range(symbol, time_frame, date_from, date_to)
+
+    def positions_get(self, **kwargs):
+        return self.broker.positions_get(**kwargs)
+
+    def orders_get(self, **kwargs):
+        return self.broker.orders_get(**kwargs)
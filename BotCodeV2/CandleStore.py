@@ -0,0 +1,283 @@
+import contextlib
+import threading
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from BotCodeV2.Broker import Broker, getDefaultBroker, timeFrameSeconds
+
+RATES_DTYPE = np.dtype([('time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'), ('close', '<f8'),
+                        ('tick_volume', '<u8'), ('spread', '<i4'), ('real_volume', '<u8')])
+
+TIME_FRAME_M1 = Broker.TIMEFRAME_M1
+# Time frames CandleStore derives from M1 instead of fetching.
+RESAMPLED_TIME_FRAMES = (Broker.TIMEFRAME_M5, Broker.TIMEFRAME_M15, Broker.TIMEFRAME_M30, Broker.TIMEFRAME_H1)
+
+
+def resampleRates(rates, seconds):
+    """
+        Aggregates bars into bars of a longer, evenly dividing period.
+        :param rates: Structured rates array, oldest first
+        :param seconds: Period of the output bars
+        :return: (starts, bars): index in rates of the first bar of each output bar, and the output bars
+    """
+    if len(rates) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=RATES_DTYPE)
+    group = rates["time"] // seconds
+    starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+    ends = np.r_[starts[1:], len(rates)]
+    bars = np.zeros(len(starts), dtype=RATES_DTYPE)
+    bars["time"] = group[starts] * seconds
+    bars["open"] = rates["open"][starts]
+    bars["high"] = np.maximum.reduceat(rates["high"], starts)
+    bars["low"] = np.minimum.reduceat(rates["low"], starts)
+    bars["close"] = rates["close"][ends - 1]
+    bars["tick_volume"] = np.add.reduceat(rates["tick_volume"], starts)
+    bars["spread"] = rates["spread"][ends - 1]
+    bars["real_volume"] = np.add.reduceat(rates["real_volume"], starts)
+    return starts, bars
+
+
+class CandleBuffer:
+    """
+        Preallocated buffer holding the most recent candles of one symbol and time frame, oldest first.
+        The last slot is always the newest bar, which may still be forming.
+        Candles are stored contiguously with slack room after them, so last() hands out read-only views instead
+        of copies. When the slack is used up the newest capacity candles move to a fresh array, leaving the
+        views already handed out intact; only the forming bar of a view is patched in place.
+    """
+
+    def __init__(self, capacity, slack=None):
+        """
+            :param capacity: Number of candles kept
+            :param slack: Extra slots appended into before the candles are moved, None for a quarter of capacity
+        """
+        self.capacity = capacity
+        self.slack = slack if slack is not None else max(64, capacity // 4)
+        self.rates = np.zeros(capacity + self.slack, dtype=RATES_DTYPE)
+        self.end = 0
+        self.size = 0
+
+    def lastTime(self):
+        if self.size == 0:
+            return None
+        return int(self.rates[self.end - 1]["time"])
+
+    def append(self, rates):
+        """
+            Adds candles to the buffer. A candle with the same time as the newest stored one replaces it,
+            which is how the still-forming bar gets patched.
+            :param rates: Structured array of candles in ascending time order
+            :return: None
+        """
+        if rates is None or len(rates) == 0:
+            return
+        last_time = self.lastTime()
+        if last_time is not None:
+            rates = rates[rates["time"] >= last_time]
+            if len(rates) == 0:
+                return
+            if rates[0]["time"] == last_time:
+                self.rates[self.end - 1] = rates[0]
+                rates = rates[1:]
+        rates = rates[-self.capacity:]
+        count = len(rates)
+        if count == 0:
+            return
+        if self.end + count > len(self.rates):
+            keep = min(self.size, self.capacity - count)
+            moved = np.zeros(len(self.rates), dtype=RATES_DTYPE)
+            moved[:keep] = self.rates[self.end - keep:self.end]
+            self.rates, self.end = moved, keep
+        self.rates[self.end:self.end + count] = rates
+        self.end += count
+        self.size = min(self.size + count, self.capacity)
+
+    def last(self, count):
+        """
+            Returns the newest candles stored in the buffer, oldest first.
+            :param count: Number of candles to return
+            :return: A read-only structured numpy array view of at most count candles
+        """
+        count = min(count, self.size)
+        view = self.rates[self.end - count:self.end]
+        view.flags.writeable = False
+        return view
+
+
+class CandleStore:
+    """
+        Per-symbol, per-time frame candle cache. The first request for a series pulls its history once,
+        after that only the bars newer than the last stored timestamp are fetched from the terminal.
+        With a HistoryStore attached the first request is served from disk plus the gap since the last run,
+        and closed bars are written back as they arrive.
+        With resampling on, M5, M15, M30 and H1 are fetched once to seed them and from then on derived from
+        the M1 bars, partial current bar included, so one M1 request refreshes every time frame of a symbol
+        and they can never disagree with each other.
+    """
+    buffers = None
+    lock = None
+    history = None
+
+    def __init__(self, capacity=1000, broker=None, history=None, resample=True):
+        """
+            :param capacity: Minimum number of bars kept per series
+            :param broker: Broker to fetch from, None for the MT5 terminal
+            :param history: HistoryStore to warm start from, None to fetch everything from the terminal
+            :param resample: Derive the RESAMPLED time frames from the M1 series instead of fetching them
+        """
+        self.capacity = capacity
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.history = history
+        self.resampled = RESAMPLED_TIME_FRAMES if resample else ()
+        self.buffers = {}
+        self.frozen = {}
+        self.stale = set()
+        self.lock = threading.Lock()
+
+    def __fetchAll__(self, symbol, time_frame, count):
+        if self.history is None:
+            return self.broker.copy_rates_from_pos(symbol, time_frame, 0, count)
+        fetched = self.history.sync(symbol, time_frame, count)
+        stored = self.history.series(symbol, time_frame).rates(count)
+        if fetched is None or len(fetched) == 0:
+            return stored
+        return np.concatenate((stored[stored["time"] < fetched[0]["time"]], fetched))[-count:]
+
+    def __fetchNewer__(self, symbol, time_frame, last_time):
+        # Bar times are in server time, so leave a day of slack on the upper bound.
+        date_from = datetime.fromtimestamp(last_time, tz=timezone.utc)
+        date_to = datetime.now(tz=timezone.utc) + timedelta(days=1)
+        return self.broker.copy_rates_range(symbol, time_frame, date_from, date_to)
+
+    def __seed__(self, symbol, time_frame, count):
+        buffer = CandleBuffer(max(self.capacity, count))
+        buffer.append(self.__fetchAll__(symbol, time_frame, buffer.capacity))
+        self.buffers[(symbol, time_frame)] = buffer
+        return buffer
+
+    def __update__(self, symbol, time_frame):
+        buffer = self.buffers[(symbol, time_frame)]
+        newer = self.__fetchNewer__(symbol, time_frame, buffer.lastTime())
+        buffer.append(newer)
+        if self.history is not None:
+            self.history.append(symbol, time_frame, newer)
+
+    def __derive__(self, symbol):
+        minutes = self.buffers.get((symbol, TIME_FRAME_M1))
+        if minutes is None or minutes.size == 0:
+            return
+        buffers = {time_frame: self.buffers.get((symbol, time_frame)) for time_frame in self.resampled}
+        opens = [buffer.lastTime() for buffer in buffers.values() if buffer is not None and buffer.size]
+        if not opens:
+            return
+        # Only the M1 bars since the open of the oldest current bar are needed; without gaps that is one per minute.
+        source = minutes.last(max(1, (minutes.lastTime() - min(opens)) // 60 + 1))
+        for time_frame, buffer in buffers.items():
+            if buffer is None or buffer.size == 0:
+                continue
+            last_time = buffer.lastTime()
+            if source["time"][0] > last_time:
+                # The M1 series no longer reaches back to the open of the newest bar; fetch it again.
+                del self.buffers[(symbol, time_frame)]
+                continue
+            starts, bars = resampleRates(source[source["time"] >= last_time], timeFrameSeconds(time_frame))
+            buffer.append(bars)
+            if self.history is not None:
+                self.history.append(symbol, time_frame, bars)
+
+    def get(self, symbol, time_frame, count):
+        """
+            Returns the last candles of a symbol, refreshing the cache with any newer bars first.
+            :param symbol: Symbol to fetch candles for
+            :param time_frame: MT5 time frame constant (e.g. Broker.TIMEFRAME_M5)
+            :param count: Number of candles to return
+            :return: A read-only structured numpy array with fields time, open, high, low, close, tick_volume,
+            spread, real_volume, oldest candle first. It is a view of the cache; wrap it in a BarSeries to read
+            it by column
+        """
+        with self.lock:
+            if symbol in self.stale:
+                self.stale.discard(symbol)
+                self.__freeze__(symbol)
+            key = (symbol, time_frame)
+            buffer = self.buffers.get(key)
+            if buffer is None or count > buffer.capacity or buffer.size == 0:
+                buffer = self.__seed__(symbol, time_frame, count)
+                if time_frame in self.resampled and (symbol, TIME_FRAME_M1) not in self.buffers:
+                    self.__seed__(symbol, TIME_FRAME_M1, self.capacity)
+            elif self.frozen.get(symbol):
+                pass
+            elif time_frame == TIME_FRAME_M1 or time_frame in self.resampled:
+                self.__refresh__(symbol)
+                buffer = self.buffers.get(key) or self.__seed__(symbol, time_frame, count)
+            else:
+                self.__update__(symbol, time_frame)
+            return buffer.last(count)
+
+    def __refresh__(self, symbol):
+        if (symbol, TIME_FRAME_M1) in self.buffers:
+            self.__update__(symbol, TIME_FRAME_M1)
+        else:
+            self.__seed__(symbol, TIME_FRAME_M1, self.capacity)
+        if self.resampled:
+            self.__derive__(symbol)
+
+    def __freeze__(self, symbol):
+        self.__refresh__(symbol)
+        for key in list(self.buffers):
+            if key[0] == symbol and key[1] != TIME_FRAME_M1 and key[1] not in self.resampled:
+                self.__update__(*key)
+
+    @contextlib.contextmanager
+    def snapshot(self, symbol, lazy=False):
+        """
+            Refreshes the series of a symbol (a single M1 request when every cached time frame is resampled),
+            then serves every get() for that symbol from memory until the block exits. Wrap a decision cycle in it so all its time frames come from
+            the same moment.
+            :param symbol: Symbol to refresh
+            :param lazy: Defer the refresh to the first get() in the block, so a block that reads nothing fetches nothing
+            :return: Context manager
+        """
+        with self.lock:
+            # A nested snapshot keeps reading the frozen candles; refreshing would patch the views already read.
+            if not self.frozen.get(symbol):
+                if lazy:
+                    self.stale.add(symbol)
+                else:
+                    self.__freeze__(symbol)
+            self.frozen[symbol] = self.frozen.get(symbol, 0) + 1
+        try:
+            yield self
+        finally:
+            with self.lock:
+                self.frozen[symbol] -= 1
+                if not self.frozen[symbol]:
+                    del self.frozen[symbol]
+                    self.stale.discard(symbol)
+
+    def invalidate(self, symbol=None):
+        """
+            Drops cached candles so the next request refetches the full history.
+            :param symbol: Symbol to drop, or None to drop every symbol
+            :return: None
+        """
+        with self.lock:
+            for key in list(self.buffers):
+                if symbol is None or key[0] == symbol:
+                    del self.buffers[key]
+
+
+def getCandleStore(broker=None, history=None):
+    """
+        Returns the candle store shared by everything in this process that trades through broker, or through
+        another account on the same market.
+        :param broker: A Broker, or None for the default MT5 terminal
+        :param history: HistoryStore to warm start from and write closed bars to, None to leave it unchanged
+        :return: A CandleStore
+    """
+    broker = broker if broker is not None else getDefaultBroker()
+    if broker.market is not None:
+        broker = broker.market
+    store = broker.shared("candles", lambda: CandleStore(broker=broker))
+    if history is not None:
+        store.history = history
+    return store
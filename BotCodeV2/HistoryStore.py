@@ -0,0 +1,159 @@
+import os
+from datetime import datetime, timedelta, timezone
+import numpy as np
+from BotCodeV2.Broker import getDefaultBroker, timeFrameSeconds
+from BotCodeV2.CandleStore import RATES_DTYPE
+
+DEFAULT_ROOT = os.path.join("BotCodeV2", "Data", "history")
+
+
+class ColumnSeries:
+    """
+        Closed bars of one symbol and time frame stored on disk as one append-only file per column
+        (<column>.col, raw little-endian values of the RATES_DTYPE field). Columns are read through read-only
+        memory maps, so readers get NumPy views of the file without copying it.
+    """
+
+    def __init__(self, folder):
+        """
+            :param folder: Directory holding the column files, created if missing
+        """
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+        self.maps = {}
+        sizes = []
+        for name in RATES_DTYPE.names:
+            path = self.__path__(name)
+            sizes.append(os.path.getsize(path) // RATES_DTYPE[name].itemsize if os.path.exists(path) else 0)
+        self.length = min(sizes)
+        # An append interrupted half way leaves some columns longer than others; cut them back.
+        for name, size in zip(RATES_DTYPE.names, sizes):
+            if size > self.length:
+                with open(self.__path__(name), "r+b") as f:
+                    f.truncate(self.length * RATES_DTYPE[name].itemsize)
+
+    def __path__(self, name):
+        return os.path.join(self.folder, f"{name}.col")
+
+    def __len__(self):
+        return self.length
+
+    def lastTime(self):
+        if self.length == 0:
+            return None
+        return int(self.column("time")[-1])
+
+    def append(self, rates):
+        """
+            Appends the bars newer than the last stored one.
+            :param rates: Structured array of closed bars in ascending time order
+            :return: Number of bars appended
+        """
+        if rates is None or len(rates) == 0:
+            return 0
+        last_time = self.lastTime()
+        if last_time is not None:
+            rates = rates[rates["time"] > last_time]
+        if len(rates) == 0:
+            return 0
+        # Time is written last so a reader never sees a time without the rest of its bar.
+        for name in RATES_DTYPE.names[1:] + RATES_DTYPE.names[:1]:
+            with open(self.__path__(name), "ab") as f:
+                f.write(np.ascontiguousarray(rates[name], dtype=RATES_DTYPE[name]).tobytes())
+        self.length += len(rates)
+        self.maps = {}
+        return len(rates)
+
+    def column(self, name):
+        """
+            :param name: Field of RATES_DTYPE
+            :return: Read-only view of the whole column, oldest bar first
+        """
+        view = self.maps.get(name)
+        if view is None:
+            if self.length == 0:
+                view = np.zeros(0, dtype=RATES_DTYPE[name])
+            else:
+                view = np.memmap(self.__path__(name), dtype=RATES_DTYPE[name], mode="r", shape=(self.length,))
+            self.maps[name] = view
+        return view
+
+    def columns(self):
+        return {name: self.column(name) for name in RATES_DTYPE.names}
+
+    def rates(self, count=None, first=None, until=None):
+        """
+            Assembles stored bars into a structured rates array (one copy of the selected rows).
+            :param count: Maximum number of bars, counted back from the newest one
+            :param first: Earliest bar time to include
+            :param until: Latest bar time to include
+            :return: Structured rates array, oldest first
+        """
+        times = self.column("time")
+        start = 0 if first is None else int(np.searchsorted(times, first, side="left"))
+        end = self.length if until is None else int(np.searchsorted(times, until, side="right"))
+        if count is not None:
+            start = max(start, end - count)
+        rates = np.zeros(max(0, end - start), dtype=RATES_DTYPE)
+        for name in RATES_DTYPE.names:
+            rates[name] = self.column(name)[start:end]
+        return rates
+
+
+class HistoryStore:
+    """
+        On-disk bar history laid out as <root>/<symbol>/<time frame>/<column>.col. Only closed bars are
+        stored. On launch sync() loads what is on disk and asks the terminal for the gap since the last run
+        only, instead of pulling the full history of every symbol again.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT, broker=None):
+        """
+            :param root: Directory of the store
+            :param broker: Broker to fill gaps from, None for the MT5 terminal (only needed by sync)
+        """
+        self.root = root
+        self.broker = broker
+        self.series_map = {}
+
+    def series(self, symbol, time_frame):
+        """
+            :return: The ColumnSeries of a symbol and time frame
+        """
+        key = (symbol, time_frame)
+        series = self.series_map.get(key)
+        if series is None:
+            series = ColumnSeries(os.path.join(self.root, symbol, str(time_frame)))
+            self.series_map[key] = series
+        return series
+
+    def append(self, symbol, time_frame, rates):
+        """
+            Stores freshly fetched bars, leaving out the newest one which may still be forming.
+            :param rates: Structured rates array as returned by the terminal, oldest first
+            :return: Number of bars appended
+        """
+        if rates is None or len(rates) < 2:
+            return 0
+        return self.series(symbol, time_frame).append(rates[:-1])
+
+    def sync(self, symbol, time_frame, count=1000):
+        """
+            Brings the stored history up to date with one terminal request: the last count bars when nothing
+            is stored yet, otherwise only the bars since the last stored one.
+            :param symbol: Symbol to sync
+            :param time_frame: MT5 time frame constant
+            :param count: Bars to fetch for a symbol seen for the first time
+            :return: The bars fetched from the terminal, including the still-forming one
+        """
+        broker = self.broker if self.broker is not None else getDefaultBroker()
+        last_time = self.series(symbol, time_frame).lastTime()
+        if last_time is None:
+            rates = broker.copy_rates_from_pos(symbol, time_frame, 0, count)
+        else:
+            # Bar times are in server time, so leave a day of slack on the upper bound.
+            date_from = datetime.fromtimestamp(last_time + timeFrameSeconds(time_frame), tz=timezone.utc)
+            date_to = datetime.now(tz=timezone.utc) + timedelta(days=1)
+            rates = broker.copy_rates_range(symbol, time_frame, date_from, date_to)
+        self.append(symbol, time_frame, rates)
+        return rates
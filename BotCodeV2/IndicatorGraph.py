@@ -0,0 +1,420 @@
+import threading
+from collections import deque
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.StreamingIndicators import EMA, SMA, Wilder
+
+
+#### Node functions ####
+
+def difference(a, b):
+    return a - b
+
+
+def positive(x):
+    return max(x, 0.0)
+
+
+def negative(x):
+    return max(-x, 0.0)
+
+
+def trueRange(high, low, prev_close):
+    return max(high - low, abs(high - prev_close), abs(low - prev_close))
+
+
+def relativeStrength(gain, loss):
+    return 100 * gain / (gain + loss) if gain + loss != 0 else 0.0
+
+
+def stochastic(x, lowest, highest):
+    return (x - lowest) / (highest - lowest) * 100 if highest != lowest else 0.0
+
+
+def percentOf(x, base):
+    return x / base * 100 if base != 0 else 0.0
+
+
+def lowest(window):
+    return min(window)
+
+
+def highest(window):
+    return max(window)
+
+
+def sinceHighest(window):
+    # Bars since the highest value; searching from the newest end gives ties to the most recent bar, as in TA-Lib.
+    return window[::-1].index(max(window))
+
+
+def sinceLowest(window):
+    return window[::-1].index(min(window))
+
+
+def aroonLine(since, period):
+    return 100.0 / period * (period - since)
+
+
+#### Nodes ####
+
+class Node:
+    """
+        One value per bar computed from the values of its input nodes. value is None while warming up.
+        compute(commit) must not change the node's state unless commit is True, so a forming bar can be
+        evaluated any number of times before it closes.
+    """
+    __slots__ = ("key", "inputs", "value", "changed")
+
+    def __init__(self, key, inputs):
+        self.key = key
+        self.inputs = inputs
+        self.value = None
+        self.changed = True
+
+    def compute(self, commit):
+        raise NotImplementedError
+
+
+class Field(Node):
+    """
+        A column of the bar (close, high, low, ...); set by the graph.
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, key, name):
+        super().__init__(key, ())
+        self.name = name
+
+
+class Lag(Node):
+    """
+        The input's value on the previous closed bar.
+    """
+    __slots__ = ("previous",)
+
+    def __init__(self, key, inputs):
+        super().__init__(key, inputs)
+        self.previous = None
+
+    def compute(self, commit):
+        value = self.previous
+        if commit:
+            self.previous = self.inputs[0].value
+        return value
+
+
+class Formula(Node):
+    """
+        function(*input values, *args), None while any input is None.
+    """
+    __slots__ = ("function", "args")
+
+    def __init__(self, key, inputs, function, args):
+        super().__init__(key, inputs)
+        self.function = function
+        self.args = args
+
+    def compute(self, commit):
+        values = [node.value for node in self.inputs]
+        if None in values:
+            return None
+        if self.args:
+            values.extend(self.args)
+        return self.function(*values)
+
+
+class Average(Node):
+    """
+        A StreamingIndicators average (EMA, SMA or Wilder) of the input, skipping the first delay values.
+    """
+    __slots__ = ("average", "delay", "seen")
+
+    def __init__(self, key, inputs, kind, period, delay=0):
+        super().__init__(key, inputs)
+        self.average = kind(period)
+        self.delay = delay
+        self.seen = 0
+
+    def compute(self, commit):
+        x = self.inputs[0].value
+        if x is None:
+            return None
+        if self.seen < self.delay:
+            if commit:
+                self.seen += 1
+            return None
+        return self.average.step(x, commit)
+
+
+class Window(Node):
+    """
+        The last size values of the input, current bar included, as a tuple; None until there are size of them.
+    """
+    __slots__ = ("size", "history")
+
+    def __init__(self, key, inputs, size):
+        super().__init__(key, inputs)
+        self.size = size
+        self.history = deque(maxlen=size - 1)
+
+    def compute(self, commit):
+        x = self.inputs[0].value
+        if x is None:
+            return None
+        value = tuple(self.history) + (x,) if len(self.history) == self.size - 1 else None
+        if commit:
+            self.history.append(x)
+        return value
+
+
+#### Outputs ####
+
+class Output:
+    """
+        A named indicator read from an IndicatorGraph. Behaves like a StreamingIndicator: sync(rates) brings the
+        graph up to date and last(count) returns the newest values, forming bar included.
+    """
+
+    def __init__(self, graph, nodes, history):
+        self.graph = graph
+        self.nodes = nodes
+        self.values = deque(maxlen=history)
+        self.live = None
+
+    def value(self):
+        if isinstance(self.nodes, tuple):
+            values = tuple(node.value for node in self.nodes)
+            return None if None in values else values
+        return self.nodes.value
+
+    def sync(self, rates):
+        self.graph.sync(rates)
+
+    def last(self, count):
+        with self.graph.lock:
+            values = list(self.values)
+            if self.live is not None:
+                values.append(self.live)
+        return values[-count:]
+
+
+class IndicatorGraph:
+    """
+        Streaming indicators of one symbol and time frame, declared as a graph of shared intermediate nodes.
+        Each node is keyed by its operation, parameters and inputs, so asking for MACD and STOCHRSI on the same
+        series computes the lagged close once, ATR and NATR share one true range and one Wilder average, and
+        every consumer of an output in the process (Scalper, MarketManager, PositionMonitor, OrderManager)
+        reads the same object. Outputs are asked for by name, see OUTPUTS.
+        The graph follows the same bar semantics as StreamingIndicator: sync() commits the closed bars and
+        evaluates the forming one. When the forming bar is evaluated again only the nodes downstream of the
+        bar fields that changed are recomputed.
+    """
+    last_time = None
+    first_time = None
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.outputs = {}
+        self.__clear__()
+
+    def __clear__(self):
+        self.nodes = {}
+        self.order = []
+        self.fields = []
+        self.last_time = None
+        self.first_time = None
+        self.previewed = False
+        self.computed = 0
+
+    #### Declaring nodes ####
+
+    def __node__(self, key, factory):
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = factory()
+            if isinstance(node, Field):
+                self.fields.append(node)
+            else:
+                self.order.append(node)
+        return node
+
+    def field(self, name):
+        key = ("field", name)
+        return self.__node__(key, lambda: Field(key, name))
+
+    def lag(self, node):
+        key = ("lag", node.key)
+        return self.__node__(key, lambda: Lag(key, (node,)))
+
+    def formula(self, function, *inputs, args=()):
+        key = (function.__name__, args) + tuple(node.key for node in inputs)
+        return self.__node__(key, lambda: Formula(key, inputs, function, args))
+
+    def average(self, kind, node, period, delay=0):
+        key = (kind.__name__, period, delay, node.key)
+        return self.__node__(key, lambda: Average(key, (node,), kind, period, delay))
+
+    def window(self, node, size):
+        key = ("window", size, node.key)
+        return self.__node__(key, lambda: Window(key, (node,), size))
+
+    #### Indicators ####
+
+    def rsi(self, timeperiod=14):
+        close = self.field("close")
+        change = self.formula(difference, close, self.lag(close))
+        gain = self.average(Wilder, self.formula(positive, change), timeperiod)
+        loss = self.average(Wilder, self.formula(negative, change), timeperiod)
+        return self.formula(relativeStrength, gain, loss)
+
+    def stochRSI(self, timeperiod=14, fastk_period=5, fastd_period=3):
+        rsi = self.rsi(timeperiod)
+        window = self.window(rsi, fastk_period)
+        fastk = self.formula(stochastic, rsi, self.formula(lowest, window), self.formula(highest, window))
+        return fastk, self.average(SMA, fastk, fastd_period)
+
+    def macd(self, fastperiod=12, slowperiod=26, signalperiod=9):
+        close = self.field("close")
+        # TA-Lib starts the fast average late so both averages produce their first value on the same bar.
+        line = self.formula(difference, self.average(EMA, close, fastperiod, delay=slowperiod - fastperiod),
+                            self.average(EMA, close, slowperiod))
+        signal = self.average(EMA, line, signalperiod)
+        return line, signal, self.formula(difference, line, signal)
+
+    def atr(self, timeperiod=14):
+        true_range = self.formula(trueRange, self.field("high"), self.field("low"), self.lag(self.field("close")))
+        return self.average(Wilder, true_range, timeperiod)
+
+    def natr(self, timeperiod=14):
+        return self.formula(percentOf, self.atr(timeperiod), self.field("close"))
+
+    def aroon(self, timeperiod=14):
+        since_low = self.formula(sinceLowest, self.window(self.field("low"), timeperiod + 1))
+        since_high = self.formula(sinceHighest, self.window(self.field("high"), timeperiod + 1))
+        return (self.formula(aroonLine, since_low, args=(timeperiod,)),
+                self.formula(aroonLine, since_high, args=(timeperiod,)))
+
+    def output(self, name, history=100, **params):
+        """
+            Returns a named indicator of this series, declaring its nodes the first time.
+            :param name: Key of OUTPUTS: "macd" (macd, signal, hist), "stochrsi" (fastk, fastd), "atr", "natr",
+            "rsi" or "aroon" (aroondown, aroonup)
+            :param history: Number of closed-bar values to keep
+            :param params: Indicator parameters, e.g. timeperiod=14
+            :return: An Output, the same object for the same name and parameters
+        """
+        key = (name,) + tuple(sorted(params.items()))
+        with self.lock:
+            output = self.outputs.get(key)
+            if output is None:
+                output = self.outputs[key] = Output(self, getattr(self, OUTPUTS[name])(**params), history)
+                # Nodes that missed the bars already processed would be out of step; rebuild on the next sync.
+                if self.last_time is not None:
+                    self.last_time = None
+            elif history > output.values.maxlen:
+                output.values = deque(output.values, maxlen=history)
+            return output
+
+    #### Updating ####
+
+    def __reset__(self):
+        self.__clear__()
+        for key, output in self.outputs.items():
+            output.nodes = getattr(self, OUTPUTS[key[0]])(**dict(key[1:]))
+            output.values.clear()
+            output.live = None
+
+    def update(self, bar, closed=True):
+        """
+            Feeds one bar through the graph.
+            :param bar: A candle exposing the fields the nodes read (a row of a rates array or a dict)
+            :param closed: True when the bar has closed, False when it is still forming
+            :return: None
+        """
+        fresh = closed or not self.previewed
+        for node in self.fields:
+            x = float(bar[node.name])
+            node.changed = fresh or x != node.value
+            node.value = x
+        if fresh:
+            for node in self.order:
+                node.changed = True
+                node.value = node.compute(closed)
+            self.computed += len(self.order)
+        else:
+            for node in self.order:
+                node.changed = False
+                for source in node.inputs:
+                    if source.changed:
+                        node.changed = True
+                        node.value = node.compute(False)
+                        self.computed += 1
+                        break
+        for output in self.outputs.values():
+            value = output.value()
+            if closed:
+                if value is not None:
+                    output.values.append(value)
+                output.live = None
+            else:
+                output.live = value
+        if closed:
+            self.last_time = bar["time"]
+        self.previewed = not closed
+
+    def sync(self, rates):
+        """
+            Brings every output up to date with a window of candles whose last candle is the forming bar.
+            Only the candles newer than the last committed bar are processed. The graph is rebuilt from the
+            window if the window does not overlap the committed bars or reaches further back than the bars the
+            graph was built from, so the longest window any consumer passes sets the warm-up.
+            :param rates: Structured array of candles or a BarSeries, oldest first
+            :return: None
+        """
+        if len(rates) == 0:
+            return
+        with self.lock:
+            first = rates[0]["time"]
+            if self.last_time is None or first > self.last_time or first < self.first_time:
+                self.__reset__()
+                self.first_time = first
+                start = 0
+            else:
+                times = rates["time"]
+                start = len(rates) - 1
+                while start > 0 and times[start - 1] > self.last_time:
+                    start -= 1
+            count = len(rates)
+            for i in range(start, count):
+                self.update(rates[i], closed=i < count - 1)
+
+
+# Output name to the IndicatorGraph method declaring it.
+OUTPUTS = {
+    "macd": "macd",
+    "stochrsi": "stochRSI",
+    "rsi": "rsi",
+    "atr": "atr",
+    "natr": "natr",
+    "aroon": "aroon",
+}
+
+indicator_graphs_lock = threading.Lock()
+
+
+def getIndicatorGraph(symbol, time_frame, broker=None):
+    """
+        Returns the indicator graph shared by everything in this process that reads the symbol's time frame
+        through broker.
+        :param symbol: Symbol
+        :param time_frame: MT5 time frame constant
+        :param broker: A Broker, or None for the default MT5 terminal
+        :return: An IndicatorGraph
+    """
+    broker = broker if broker is not None else getDefaultBroker()
+    graphs = broker.shared("indicator_graphs", dict)
+    with indicator_graphs_lock:
+        graph = graphs.get((symbol, time_frame))
+        if graph is None:
+            graph = graphs[(symbol, time_frame)] = IndicatorGraph()
+        return graph
@@ -0,0 +1,315 @@
+import argparse
+import contextlib
+import os
+import pickle
+import struct
+import threading
+import time
+from collections import deque, namedtuple
+import numpy as np
+from BotCodeV2.Broker import Broker
+
+MAGIC = b"BOTJRNL1"
+# Record header: payload length, method id, start offset from the journal start, call duration (seconds).
+HEADER = struct.Struct("<IBdd")
+METHODS = ("initialize", "login", "shutdown", "last_error", "account_info", "symbol_info", "symbol_info_tick",
+           "copy_rates_from_pos", "copy_rates_from", "copy_rates_range", "positions_get", "orders_get",
+           "order_calc_margin", "order_send", "Close")
+METHOD_IDS = {name: i for i, name in enumerate(METHODS)}
+
+JournalRecord = namedtuple("JournalRecord", ["method", "start", "duration", "args", "kwargs", "result"])
+
+
+def __portable__(value):
+    # Terminal results are namedtuples of the MetaTrader5 package; store them as plain tuples so a journal
+    # can be read where that package is not installed.
+    if isinstance(value, tuple) and hasattr(value, "_fields"):
+        return ("__namedtuple__", type(value).__name__, tuple(value._fields), tuple(__portable__(v) for v in value))
+    if isinstance(value, (list, tuple)):
+        return type(value)(__portable__(v) for v in value)
+    return value
+
+
+namedtuple_types = {}
+
+
+def __restore__(value):
+    if isinstance(value, tuple) and len(value) == 4 and value[0] == "__namedtuple__":
+        kind = namedtuple_types.get((value[1], value[2]))
+        if kind is None:
+            kind = namedtuple_types[(value[1], value[2])] = namedtuple(value[1], value[2])
+        return kind(*(__restore__(v) for v in value[3]))
+    if isinstance(value, (list, tuple)):
+        return type(value)(__restore__(v) for v in value)
+    return value
+
+
+def readJournal(path):
+    """
+        Reads a journal written by RecordingBroker. A record cut short by a crash ends the journal.
+        :param path: Journal file
+        :return: Iterator of JournalRecord in the order the calls finished
+    """
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a journal")
+        while True:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return
+            length, method, start, duration = HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return
+            args, kwargs, result = pickle.loads(payload)
+            yield JournalRecord(METHODS[method], start, duration, __restore__(args), kwargs, __restore__(result))
+
+
+class RecordingBroker(Broker):
+    """
+        Broker wrapper that appends every terminal call (arguments, answer, start time and duration) to a
+        binary journal: a fixed header per record followed by a pickled payload, written through a buffered
+        file. ReplayBroker plays a journal back. Wrap it around the CachedBroker rather than under it, so the
+        journal holds every answer the strategies read and not only the cache misses.
+    """
+
+    def __init__(self, broker, path):
+        """
+            :param broker: Broker to record
+            :param path: Journal file; appended to if it exists
+        """
+        self.broker = broker
+        self.path = path
+        fresh = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab", buffering=1 << 16)
+        if fresh:
+            self.file.write(MAGIC)
+        self.origin = time.time()
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self.__dict__["broker"], name)
+
+    def __call__(self, method, *args, **kwargs):
+        started = time.time()
+        result = getattr(self.broker, method)(*args, **kwargs)
+        duration = time.time() - started
+        payload = pickle.dumps((__portable__(args), kwargs, __portable__(result)), protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            self.file.write(HEADER.pack(len(payload), METHOD_IDS[method], started - self.origin, duration))
+            self.file.write(payload)
+        return result
+
+    def flush(self):
+        with self.lock:
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+    def invalidate(self, symbol=None, kinds=None):
+        # Cache bookkeeping of the wrapped broker; it never reaches the terminal, so it is not journaled.
+        return self.broker.invalidate(symbol=symbol, kinds=kinds)
+
+    def initialize(self, *args, **kwargs):
+        return self("initialize", *args, **kwargs)
+
+    def login(self, login, password=None, server=None, **kwargs):
+        # Credentials are kept out of the journal.
+        return self.broker.login(login, password=password, server=server, **kwargs)
+
+    def shutdown(self):
+        result = self("shutdown")
+        self.flush()
+        return result
+
+    def last_error(self):
+        return self("last_error")
+
+    def account_info(self):
+        return self("account_info")
+
+    def symbol_info(self, symbol):
+        return self("symbol_info", symbol)
+
+    def symbol_info_tick(self, symbol):
+        return self("symbol_info_tick", symbol)
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        return self("copy_rates_from_pos", symbol, time_frame, start_pos, count)
+
+    def copy_rates_from(self, symbol, time_frame, date_from, count):
+        return self("copy_rates_from", symbol, time_frame, date_from, count)
+
+    def copy_rates_range(self, symbol, time_frame, date_from, date_to):
+        return self("copy_rates_range", symbol, time_frame, date_from, date_to)
+
+    def positions_get(self, **kwargs):
+        return self("positions_get", **kwargs)
+
+    def orders_get(self, **kwargs):
+        return self("orders_get", **kwargs)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        return self("order_calc_margin", action, symbol, volume, price)
+
+    def order_send(self, request):
+        return self("order_send", request)
+
+    def Close(self, symbol, **kwargs):
+        return self("Close", symbol, **kwargs)
+
+
+def __key__(method, args, kwargs):
+    # Answers are matched on what identifies the query, not on arguments that depend on the wall clock
+    # (copy_rates_range bounds) or on earlier answers.
+    if method in ("symbol_info", "symbol_info_tick", "Close"):
+        return method, args[0] if args else kwargs.get("symbol")
+    if method in ("copy_rates_from_pos", "copy_rates_from", "copy_rates_range"):
+        return method, args[0], args[1]
+    if method == "order_calc_margin":
+        return method, args[1]
+    if method == "order_send":
+        return method, args[0].get("symbol")
+    if method in ("positions_get", "orders_get"):
+        return (method,) + tuple(sorted(kwargs.items()))
+    return (method,)
+
+
+class ReplayBroker(Broker):
+    """
+        Broker that answers from a journal recorded by RecordingBroker instead of a terminal, so a live
+        session can be run again offline through Scalper, MarketManager and OrderManager. Each call returns
+        the next recorded answer to the same query (same method and symbol, time frame or filter). With a
+        speed the answers are paced like the recording (1.0 is original timing, 2.0 twice as fast); without
+        one the journal is replayed as fast as possible. Running out of answers raises EOFError.
+    """
+
+    def __init__(self, path, speed=None):
+        """
+            :param path: Journal file
+            :param speed: Replay speed relative to the recording, None for full speed
+        """
+        self.path = path
+        self.speed = speed
+        self.answers = {}
+        self.calls = 0
+        for record in readJournal(path):
+            key = __key__(record.method, record.args, record.kwargs)
+            self.answers.setdefault(key, deque()).append(record)
+        self.origin = None
+        self.lock = threading.Lock()
+
+    def __call__(self, method, *args, **kwargs):
+        key = __key__(method, args, kwargs)
+        with self.lock:
+            answers = self.answers.get(key)
+            if not answers:
+                raise EOFError(f"Journal {self.path} has no more answers for {key}")
+            record = answers.popleft()
+            self.calls += 1
+            if self.origin is None:
+                self.origin = time.perf_counter() - (record.start / self.speed if self.speed else 0.0)
+        if self.speed:
+            delay = self.origin + (record.start + record.duration) / self.speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return record.result
+
+    def remaining(self):
+        with self.lock:
+            return sum(len(answers) for answers in self.answers.values())
+
+    def initialize(self, *args, **kwargs):
+        # Journals recorded above the cache hold the initialize calls of every OrderManager; older ones do not.
+        if self.answers.get(("initialize",)):
+            return self("initialize")
+        return True
+
+    def login(self, login, password=None, server=None, **kwargs):
+        return True
+
+    def shutdown(self):
+        return True
+
+    def last_error(self):
+        return self("last_error")
+
+    def account_info(self):
+        return self("account_info")
+
+    def symbol_info(self, symbol):
+        return self("symbol_info", symbol)
+
+    def symbol_info_tick(self, symbol):
+        return self("symbol_info_tick", symbol)
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        return self("copy_rates_from_pos", symbol, time_frame, start_pos, count)
+
+    def copy_rates_from(self, symbol, time_frame, date_from, count):
+        return self("copy_rates_from", symbol, time_frame, date_from, count)
+
+    def copy_rates_range(self, symbol, time_frame, date_from, date_to):
+        return self("copy_rates_range", symbol, time_frame, date_from, date_to)
+
+    def positions_get(self, **kwargs):
+        return self("positions_get", **kwargs)
+
+    def orders_get(self, **kwargs):
+        return self("orders_get", **kwargs)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        return self("order_calc_margin", action, symbol, volume, price)
+
+    def order_send(self, request):
+        return self("order_send", request)
+
+    def Close(self, symbol, **kwargs):
+        return self("Close", symbol, **kwargs)
+
+
+def summarizeJournal(path):
+    """
+        :param path: Journal file
+        :return: Dict of method to call count and p50, p99 and max duration in milliseconds
+    """
+    durations = {}
+    for record in readJournal(path):
+        durations.setdefault(record.method, []).append(record.duration)
+    summary = {}
+    for method, values in durations.items():
+        values = np.array(values) * 1000
+        summary[method] = {"calls": len(values), "p50_ms": float(np.percentile(values, 50)),
+                           "p99_ms": float(np.percentile(values, 99)), "max_ms": float(values.max())}
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Inspect or replay a terminal journal.")
+    parser.add_argument("command", choices=["summary", "replay"])
+    parser.add_argument("journal")
+    parser.add_argument("--symbols", nargs="+", default=[], help="Symbols to run Scalper for when replaying")
+    parser.add_argument("--speed", type=float, default=None, help="1.0 for original timing, omit for full speed")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        for method, stats in summarizeJournal(args.journal).items():
+            print(f"{method:<20} {stats['calls']:>7} calls  p50 {stats['p50_ms']:.3f}ms  p99 {stats['p99_ms']:.3f}ms  "
+                  f"max {stats['max_ms']:.3f}ms")
+    else:
+        from BotCodeV2.PositionMonitor import PositionMonitor
+        from BotCodeV2.Strategies.scalping import Scalper
+        broker = ReplayBroker(args.journal, speed=args.speed)
+        monitor = PositionMonitor(broker)
+        started = time.perf_counter()
+        cycles = 0
+        with contextlib.suppress(EOFError):
+            scalpers = [Scalper(symbol, [], [], broker=broker, live=False, monitor=monitor) for symbol in args.symbols]
+            while scalpers:
+                for scalper in scalpers:
+                    scalper.step()
+                    cycles += 1
+        print(f"Replayed {broker.calls} calls, {cycles} cycles in {time.perf_counter() - started:.2f}s, "
+              f"{broker.remaining()} answers left")
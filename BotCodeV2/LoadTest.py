@@ -0,0 +1,75 @@
+import argparse
+import contextlib
+import os
+import time
+import numpy as np
+from BotCodeV2.BrokerCache import CachedBroker
+from BotCodeV2.PositionMonitor import PositionMonitor
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+from BotCodeV2.Strategies.scalping import Scalper
+from BotCodeV2.Tracer import getTracer
+
+
+def runLoadTest(symbols, cycles=20, latency=0.0, warmup=5000, seed=0, cache=False):
+    """
+        Runs Scalper decision cycles for many symbols against a SimulatedBroker fed with synthetic prices and
+        measures how long each cycle takes end to end (data fetch, indicators, zones, order placement).
+        :param symbols: Number of symbols to run
+        :param cycles: Number of decision cycles per symbol
+        :param latency: Simulated terminal round trip per API call in seconds
+        :param warmup: Number of M1 bars of history before the first cycle
+        :param seed: Base random seed for the synthetic feeds
+        :param cache: Put a CachedBroker in front of the simulated terminal
+        :return: A dict with the cycle latency percentiles and the throughput in symbol-cycles per second
+    """
+    broker = SimulatedBroker(latency=latency)
+    bars = warmup + cycles * 5
+    for i in range(symbols):
+        broker.addSyntheticSymbol(f"SYN{i}", bars, seed=seed + i)
+    if cache:
+        simulated = broker
+        broker = CachedBroker(simulated, clock=lambda: simulated.now)
+    times = broker.symbols["SYN0"].times
+
+    latencies = []
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        broker.advance(int(times[warmup]))
+        monitor = PositionMonitor(broker)
+        scalpers = [Scalper(name, [], [], broker=broker, live=False, monitor=monitor) for name in broker.symbols]
+        started = time.perf_counter()
+        for cycle in range(cycles):
+            broker.advance(int(times[warmup + cycle * 5]))
+            monitor.poll()
+            for scalper in scalpers:
+                cycle_start = time.perf_counter()
+                scalper.step()
+                latencies.append(time.perf_counter() - cycle_start)
+        elapsed = time.perf_counter() - started
+
+    latencies = np.array(latencies) * 1000
+    return {
+        "symbols": symbols,
+        "cycles": len(latencies),
+        "latency": latency,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+        "max_ms": float(latencies.max()),
+        "cycles_per_second": len(latencies) / elapsed,
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Measure Scalper cycle latency against the simulated broker.")
+    parser.add_argument("--symbols", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--cycles", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated seconds per terminal call")
+    parser.add_argument("--cache", action="store_true", help="Cache symbol specs, ticks, margin and account info")
+    parser.add_argument("--trace", help="Write per-stage latency histograms of the last run to this JSON file")
+    args = parser.parse_args()
+
+    for count in args.symbols:
+        result = runLoadTest(count, cycles=args.cycles, latency=args.latency, cache=args.cache)
+        print(f"{result['symbols']:>4} symbols: p50 {result['p50_ms']:.2f}ms, p99 {result['p99_ms']:.2f}ms, "
+              f"max {result['max_ms']:.2f}ms, {result['cycles_per_second']:.0f} cycles/s")
+    if args.trace:
+        getTracer().dump(args.trace)
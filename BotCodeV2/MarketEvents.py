@@ -0,0 +1,96 @@
+from collections import namedtuple
+from BotCodeV2.Broker import getDefaultBroker, timeFrameSeconds
+
+MarketEvent = namedtuple("MarketEvent", ["kind", "symbol", "time", "detail"])
+
+BAR_CLOSE = "BAR_CLOSE"
+ZONE_ENTER = "ZONE_ENTER"
+ZONE_EXIT = "ZONE_EXIT"
+SPREAD_ABOVE = "SPREAD_ABOVE"
+SPREAD_BELOW = "SPREAD_BELOW"
+VOLUME = "VOLUME"
+
+
+class TickTrigger:
+    """
+        Turns the tick stream of a symbol into the few events a strategy has to react to, so its cycle runs when
+        something relevant happened instead of on a fixed timer. Each poll costs one symbol_info_tick() call and
+        ticks already seen (same time_msc) are dropped. Polls only see the latest tick, so volume is read from
+        the forming M1 bar instead of counted. Events:
+        BAR_CLOSE when a tick opens a new bar of one of the watched time frames (detail: the time frame),
+        ZONE_ENTER / ZONE_EXIT when the bid moves into or out of a zone (detail: the zone name),
+        SPREAD_ABOVE / SPREAD_BELOW when the spread crosses spread_threshold points,
+        VOLUME when the tick volume of the forming M1 bar reaches volume_threshold (once per bar; until then
+        every new tick costs one copy_rates_from_pos() call).
+    """
+
+    def __init__(self, symbol, broker=None, time_frames=None, zones=None, spread_threshold=None,
+                 volume_threshold=None):
+        """
+            :param symbol: Symbol to watch
+            :param broker: Broker to poll, None for the MT5 terminal
+            :param time_frames: Time frames whose bar closes are reported, M1 and M5 by default
+            :param zones: Callable returning (name, ZoneIndex) pairs to watch, read on every tick so zones that
+            are rebuilt by the strategy are picked up
+            :param spread_threshold: Spread in points to report crossings of, None to ignore the spread
+            :param volume_threshold: Tick volume of an M1 bar to report, None to ignore the volume
+        """
+        self.symbol = symbol
+        self.broker = broker if broker is not None else getDefaultBroker()
+        if time_frames is None:
+            time_frames = (self.broker.TIMEFRAME_M1, self.broker.TIMEFRAME_M5)
+        self.periods = {time_frame: timeFrameSeconds(time_frame) for time_frame in time_frames}
+        self.zones = zones
+        self.spread_threshold = spread_threshold
+        self.volume_threshold = volume_threshold
+        self.point = None
+        self.last_msc = None
+        self.bars = {}
+        self.inside = {}
+        self.wide_spread = None
+        self.minute = None
+
+    def poll(self):
+        """
+            Reads the latest tick and reports what changed since the previous one. The first tick only records
+            the starting state, apart from the zones the price already is in.
+            :return: List of MarketEvent, empty when nothing relevant happened
+        """
+        tick = self.broker.symbol_info_tick(self.symbol)
+        if tick is None or tick.time_msc == self.last_msc:
+            return []
+        self.last_msc = tick.time_msc
+        events = []
+
+        for time_frame, period in self.periods.items():
+            bar = tick.time // period
+            if self.bars.get(time_frame) not in (None, bar):
+                events.append(MarketEvent(BAR_CLOSE, self.symbol, tick.time, time_frame))
+            self.bars[time_frame] = bar
+
+        if self.zones is not None:
+            for name, zones in self.zones():
+                inside = zones.contains(tick.bid)
+                if inside != self.inside.get(name, False):
+                    events.append(MarketEvent(ZONE_ENTER if inside else ZONE_EXIT, self.symbol, tick.time, name))
+                self.inside[name] = inside
+
+        if self.spread_threshold is not None:
+            if self.point is None:
+                self.point = self.broker.symbol_info(self.symbol).point
+            wide = (tick.ask - tick.bid) / self.point >= self.spread_threshold
+            if self.wide_spread is not None and wide != self.wide_spread:
+                events.append(MarketEvent(SPREAD_ABOVE if wide else SPREAD_BELOW, self.symbol, tick.time,
+                                          self.spread_threshold))
+            self.wide_spread = wide
+
+        minute = tick.time // 60
+        if self.volume_threshold is not None and minute != self.minute:
+            bar = self.broker.copy_rates_from_pos(self.symbol, self.broker.TIMEFRAME_M1, 0, 1)
+            # Until the terminal has the bar of this tick, the last bar is the previous minute's.
+            if bar is not None and len(bar) and bar["time"][-1] // 60 == minute:
+                volume = int(bar["tick_volume"][-1])
+                if volume >= self.volume_threshold:
+                    self.minute = minute
+                    events.append(MarketEvent(VOLUME, self.symbol, tick.time, volume))
+        return events
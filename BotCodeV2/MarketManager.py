@@ -1,58 +1,76 @@
 import threading
-import MetaTrader5 as mt5
-from talib import abstract
-import pandas as pd
-from BotCodeV2.Strategies.scalping import Scalper
+import time
+import numpy as np
+from BotCodeV2.Broker import TIME_FRAMES, getDefaultBroker
+from BotCodeV2.BarSeries import BarSeries
+from BotCodeV2.CandleStore import getCandleStore
+from BotCodeV2.IndicatorGraph import getIndicatorGraph
+from BotCodeV2.BlockOrders import ZoneIndex, findBlockOrders
+from BotCodeV2.StrategyHost import DEFAULT_STRATEGY, getStrategy
+from BotCodeV2.TradingSessions import SessionSchedule
 
 class MarketManager:
     symbol = None
     ohlc_data = None
-    buy_entry_regions = []
-    sell_entry_regions = []
+    rates = None
+    buy_entry_regions = None
+    sell_entry_regions = None
     strategy = None
+    sessions = None
+    candles = None
+    broker = None
 
-    def __init__(self, symbol):
-        mt5.initialize()
+    def __init__(self, symbol, broker=None, live=True, strategy=DEFAULT_STRATEGY, sessions=None):
+        """
+            :param symbol: Symbol to manage
+            :param broker: Broker to trade through, None for the MT5 terminal
+            :param live: False to only set up the indicators without starting the strategy thread
+            :param strategy: Registered name of the strategy to run (see StrategyHost.STRATEGIES)
+            :param sessions: SessionSchedule of the symbol's market, None to ask the terminal
+        """
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.broker.initialize()
         self.symbol = symbol
-        self.strategy = Scalper
-        self.manageMarket()
+        self.buy_entry_regions = ZoneIndex()
+        self.sell_entry_regions = ZoneIndex()
+        self.candles = getCandleStore(self.broker)
+        # One graph per series, so the four votes share their true range, RSI and averages with each other
+        # and with the strategy trading the symbol.
+        indicators = getIndicatorGraph(symbol, self.broker.TIMEFRAME_M5, self.broker)
+        self.natr = indicators.output("natr")
+        self.aroon = indicators.output("aroon")
+        self.stoch_rsi = indicators.output("stochrsi")
+        self.macd = indicators.output("macd", history=500)
+        self.strategy = getStrategy(strategy)
+        self.sessions = sessions if sessions is not None else SessionSchedule(broker=self.broker)
+        if live:
+            self.manageMarket()
 
     def __checkMarketOpen__(self):
-        symbol_info = mt5.symbol_info(self.symbol).__asdict()
-        pass
+        return self.sessions.isOpen(self.symbol, time.time())
 
     def __findBlockOrders__(self):
-        self.ohlc_data = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M5, 0, 6), columns=['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume'])
-        self.ohlc_data["candle_length"] = abs(self.ohlc_data["close"] - self.ohlc_data["open"])
-        #print(self.ohlc_data.columns)
-        avg_order_length = self.ohlc_data["candle_length"].mean()
-        block_orders = self.ohlc_data.index[self.ohlc_data["candle_length"] >= 2 * avg_order_length].tolist()
-        for x in block_orders:
-            last_close = self.ohlc_data.iloc[x-1]["low"]
-            blk_close = self.ohlc_data.iloc[x]["high"]
-            if last_close < blk_close:
-                self.buy_entry_regions.append((last_close, blk_close))
-            else:
-                self.sell_entry_regions.append((self.ohlc_data.iloc[x]["low"], self.ohlc_data.iloc[x-1]["low"]))
+        self.rates = self.candles.get(self.symbol, self.broker.TIMEFRAME_M5, 6)
+        self.ohlc_data = BarSeries(self.rates)
+        buy_zones, sell_zones = findBlockOrders(self.rates, threshold=2)
+        self.buy_entry_regions.extend(buy_zones)
+        self.sell_entry_regions.extend(sell_zones)
 
     def __NATRCalculator__(self):
-        natr = abstract.NATR(self.ohlc_data)
-        natr.dropna(inplace=True)
-        if natr.iloc[-1] >= 0.01 and natr.iloc[-2] >= 0.01:
+        self.natr.sync(self.rates)
+        natr = self.natr.last(2)
+        if natr[-1] >= 0.01 and natr[-2] >= 0.01:
             return True
         else:
             return False
 
     def __Aroon__(self):
-        aroondf = abstract.AROON(self.ohlc_data, timeperiod=14)
-        aroondf.columns = ["aroondown", "aroonup"]
-        aroondf.dropna(inplace=True)
-        aroon_last11 = aroondf[-1:-12:-1]
+        self.aroon.sync(self.rates)
         uptrend, downtrend = 0, 0
-        for i in range(-1, -12, -1):
-            if aroon_last11.iloc[i]["aroondown"] >= 70 and aroon_last11.iloc[i]["aroonup"] <= 30:
+        for aroondown, aroonup in self.aroon.last(11):
+            if aroondown >= 70 and aroonup <= 30:
                 downtrend += 1
-            elif aroon_last11.iloc[i]["aroondown"] <= 30 and aroon_last11.iloc[i]["aroonup"] >= 70:
+            elif aroondown <= 30 and aroonup >= 70:
                 uptrend += 1
         if uptrend >= 7:
             return "BUY"
@@ -62,13 +80,11 @@ class MarketManager:
             return "WAIT"
 
     def __StochRSICalculator__(self):
-        ret_df = abstract.STOCHRSI(self.ohlc_data, period=14, fastk_period=5, fastd_period=3, fastd_matype=0)
-        ret_df.columns = ["STOCHRSI_k", "STOCHRSI_d"]
-        ret_df.dropna(inplace=True)
-        rsi_last11 = ret_df[-1:-12:-1]
+        self.stoch_rsi.sync(self.rates)
+        rsi_last11 = [fastd for fastk, fastd in self.stoch_rsi.last(11)]
         rsi_trend = None
         trend_points = 0
-        for i in range(-12, -11, -1):
+        for i in range(1, len(rsi_last11)):
             if rsi_last11[i] > rsi_last11[i-1]:
                 if rsi_trend == "INC":
                     trend_points += 1
@@ -88,30 +104,29 @@ class MarketManager:
                     else:
                         trend_points -= 1
 
-        if rsi_last11.iloc[-1]["STOCHRSI_d"] <= 20 and rsi_trend == "INC" and trend_points >= 6:
+        if rsi_last11[-1] <= 20 and rsi_trend == "INC" and trend_points >= 6:
             return "BUY"
-        elif rsi_last11.iloc[-1]["STOCHRSI_d"] >= 20 and rsi_trend == "DEC" and trend_points >= 6:
+        elif rsi_last11[-1] >= 20 and rsi_trend == "DEC" and trend_points >= 6:
             return "SELL"
         else:
             return "WAIT"
 
     def __MACDCalculator__(self):
-        macd = abstract.MACD(self.ohlc_data)
-        macd.columns = ["macd", "macdsignal", "macdhist"]
-        macd.dropna(inplace=True)
+        self.macd.sync(self.rates)
+        macdhist = np.array([hist for macd, signal, hist in self.macd.last(500)])
 
         ##Identify trends
-        uptrend_threshold = macd["macdhist"][macd["macdhist"] >= 0][-1:-21:-1].mean()
-        downtrend_threshold = macd["macdhist"][macd["macdhist"] <= 0][-1:-21:-1].mean()
+        uptrend_threshold = macdhist[macdhist >= 0][-20:].mean()
+        downtrend_threshold = macdhist[macdhist <= 0][-20:].mean()
 
-        if macd["macdhist"].iloc[-1] < 0 and macd["macdhist"].iloc[-1] <= downtrend_threshold:
+        if macdhist[-1] < 0 and macdhist[-1] <= downtrend_threshold:
             for i in range(-2, -5, -1):
-                if not (macd["macdhist"].iloc[i] <= 0 and macd["macdhist"].iloc[-1] <= downtrend_threshold):
+                if not (macdhist[i] <= 0 and macdhist[-1] <= downtrend_threshold):
                     return "WAIT"
             return "SELL"
-        elif macd["macdhist"].iloc[-1] >= 0 and macd["macdhist"].iloc[-1] >= uptrend_threshold:
+        elif macdhist[-1] >= 0 and macdhist[-1] >= uptrend_threshold:
             for i in range(-2, -5, -1):
-                if not (macd["macdhist"].iloc[i] >= 0 and macd["macdhist"].iloc[-1] <= uptrend_threshold):
+                if not (macdhist[i] >= 0 and macdhist[-1] <= uptrend_threshold):
                     return "WAIT"
             return "BUY"
         else:
@@ -122,23 +137,15 @@ class MarketManager:
             This is a function that fetches past 500 candlesticks data at an x-minute time frame
             :param time_frame: Time in minutes to fetch data for.
             :param number_of_candles: Number of candles to fetch data for
-            :return: A pandas data frame containing the data of last 1000 candlesticks
-            Dataframe columns: time, open, high, low, close, tick_volume, spread, real_volume
+            :return: None; the candles are left in self.ohlc_data as a BarSeries
+            Columns: time, open, high, low, close, tick_volume, spread, real_volume
         """
-        if time_frame == 5:
-            time_frame = mt5.TIMEFRAME_M5
-        elif time_frame == 15:
-            time_frame = mt5.TIMEFRAME_M15
-        elif time_frame == 30:
-            time_frame = mt5.TIMEFRAME_M30
-        elif time_frame == 60:
-            time_frame = mt5.TIMEFRAME_H1
-        else:
+        time_frame = TIME_FRAMES.get(time_frame)
+        if time_frame is None:
             return
-        rates = mt5.copy_rates_from_pos(self.symbol, time_frame, 0, number_of_candles)
-        rates_df = pd.DataFrame(rates)
-        rates_df["time"] = pd.to_datetime(rates_df["time"], unit="s")
-        self.ohlc_data =  rates_df
+        rates = self.candles.get(self.symbol, time_frame, number_of_candles)
+        self.rates = rates
+        self.ohlc_data = BarSeries(rates)
 
     def manageMarket(self):
         '''while True:
@@ -168,6 +175,6 @@ class MarketManager:
 
         '''
         self.__findBlockOrders__()
-        new_thread = threading.Thread(target=self.strategy, args=(self.symbol, self.buy_entry_regions, self.sell_entry_regions))
+        new_thread = threading.Thread(target=self.strategy, args=(self.symbol, self.buy_entry_regions, self.sell_entry_regions), kwargs={"broker": self.broker})
         new_thread.start()
 
@@ -0,0 +1,207 @@
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from BotCodeV2.Backtester import Backtester, loadData
+from BotCodeV2.Strategies.scalping import DEFAULT_PARAMS
+
+# Default search space around the values Scalper ships with.
+SEARCH_SPACE = {
+    "block_threshold": [6, 8, 10, 12, 15],
+    "rsi_low": [15, 20, 25],
+    "rsi_high": [75, 80, 85],
+    "weight_m1": [2, 5, 8],
+    "weight_m5": [5, 10, 15],
+    "weight_m15": [0, 2, 5],
+    "trend_cutoff": [5, 7, 10],
+    "sl_atr": [1.5, 2.0, 3.0],
+    "tp_atr": [1.0, 1.5, 2.5],
+}
+
+worker_data = None
+
+
+def gridCandidates(space):
+    """
+        :param space: Dict of parameter name to list of values
+        :return: Every combination of the values as a list of parameter dicts
+    """
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def randomCandidates(space, samples, seed=0):
+    """
+        :param space: Dict of parameter name to list of values
+        :param samples: Number of distinct combinations to draw (fewer if the grid is smaller)
+        :param seed: Random seed
+        :return: List of parameter dicts, the shipped defaults first
+    """
+    rng = random.Random(seed)
+    total = 1
+    for values in space.values():
+        total *= len(values)
+    defaults = {name: DEFAULT_PARAMS[name] for name in space if DEFAULT_PARAMS[name] in space[name]}
+    candidates = [defaults] if len(defaults) == len(space) else []
+    seen = {tuple(sorted(candidate.items())) for candidate in candidates}
+    while len(candidates) < min(samples, total):
+        candidate = {name: rng.choice(values) for name, values in space.items()}
+        key = tuple(sorted(candidate.items()))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(candidate)
+    return candidates
+
+
+def __attach__(paths):
+    # Memory-mapped, read-only: every worker reads the same page-cache pages instead of a pickled copy.
+    global worker_data
+    worker_data = {symbol: np.load(path, mmap_mode="r") for symbol, path in paths.items()}
+
+
+def __evaluate__(job):
+    first_index, symbol, candidates, start, end, warmup, cycle = job
+    rates = worker_data[symbol]
+    first = int(np.searchsorted(rates["time"], start, side="left"))
+    last = int(np.searchsorted(rates["time"], end, side="left"))
+    lead = min(warmup, first)
+    if last - first < 1:
+        return [(first_index + i, symbol, None) for i in range(len(candidates))]
+    reports = Backtester({symbol: rates[first - lead:last]}, cycle=cycle, warmup=lead).runCandidates(candidates)
+    return [(first_index + i, symbol, {"pnl": report["pnl"], "trades": report["trades"],
+                                       "max_drawdown": report["max_drawdown"]})
+            for i, report in enumerate(reports)]
+
+
+class Optimizer:
+    """
+        Sweeps Scalper parameters over historical M1 data on a process pool. The bar arrays are written once to
+        .npy files and memory-mapped read-only by every worker, so they are neither pickled nor copied per job.
+        Each job backtests a batch of parameter sets side by side on one symbol over one time window, so the
+        candles, indicators and block zones are computed once per batch (see Backtester.runCandidates); results
+        are summed per parameter set and ranked by PnL.
+    """
+
+    def __init__(self, data, processes=None, warmup=5000, cycle=5, batch=None):
+        """
+            :param data: Dict of symbol name to structured M1 rates array
+            :param processes: Worker processes, None for one per CPU
+            :param warmup: M1 bars of history loaded before each window
+            :param cycle: M1 bars between Scalper decision cycles
+            :param batch: Parameter sets per job, None to size the batches so every process gets about four jobs
+        """
+        self.data = data
+        self.processes = processes or os.cpu_count()
+        self.batch = batch
+        self.warmup = warmup
+        self.cycle = cycle
+        self.timeline = np.unique(np.concatenate([rates["time"] for rates in data.values()]))
+
+    def __sweep__(self, executor, candidates, start, end):
+        batch = self.batch or -(-len(candidates) * len(self.data) // (self.processes * 4))
+        jobs = [(first, symbol, candidates[first:first + batch], start, end, self.warmup, self.cycle)
+                for first in range(0, len(candidates), batch) for symbol in self.data]
+        results = [{"params": params, "pnl": 0.0, "trades": 0, "max_drawdown": 0.0, "symbols": {}}
+                   for params in candidates]
+        for reports in executor.map(__evaluate__, jobs):
+            for index, symbol, report in reports:
+                if report is None:
+                    continue
+                result = results[index]
+                result["symbols"][symbol] = report
+                result["pnl"] += report["pnl"]
+                result["trades"] += report["trades"]
+                result["max_drawdown"] = max(result["max_drawdown"], report["max_drawdown"])
+        results.sort(key=lambda result: result["pnl"], reverse=True)
+        return results
+
+    def __executor__(self, folder):
+        paths = {}
+        for i, (symbol, rates) in enumerate(self.data.items()):
+            paths[symbol] = os.path.join(folder, f"{i}.npy")
+            np.save(paths[symbol], rates)
+        return ProcessPoolExecutor(max_workers=self.processes, initializer=__attach__, initargs=(paths,))
+
+    def sweep(self, candidates):
+        """
+            Backtests every candidate over the whole history after the warmup.
+            :param candidates: List of parameter dicts, see gridCandidates and randomCandidates
+            :return: Results ranked by PnL, each a dict with params, pnl, trades, max_drawdown and per-symbol reports
+        """
+        start = int(self.timeline[min(self.warmup, len(self.timeline) - 1)])
+        end = int(self.timeline[-1]) + 1
+        with tempfile.TemporaryDirectory() as folder, self.__executor__(folder) as executor:
+            return self.__sweep__(executor, candidates, start, end)
+
+    def walkForward(self, candidates, folds=4, train=0.75):
+        """
+            Splits the history after the warmup into folds consecutive windows. In each window the candidates
+            are ranked on the first train share of the bars and the best one is scored on the rest.
+            :param candidates: List of parameter dicts
+            :param folds: Number of windows
+            :param train: Share of each window used for ranking
+            :return: List of per-fold dicts with the window times, the best params and their train and test results
+        """
+        times = self.timeline[min(self.warmup, len(self.timeline) - 1):]
+        bounds = np.linspace(0, len(times), folds + 1).astype(int)
+        report = []
+        with tempfile.TemporaryDirectory() as folder, self.__executor__(folder) as executor:
+            for fold in range(folds):
+                first, last = bounds[fold], bounds[fold + 1]
+                split = first + int((last - first) * train)
+                start = int(times[first])
+                middle = int(times[split]) if split < len(times) else int(times[-1]) + 1
+                end = int(times[last]) if last < len(times) else int(times[-1]) + 1
+                ranked = self.__sweep__(executor, candidates, start, middle)
+                tested = self.__sweep__(executor, [ranked[0]["params"]], middle, end)[0]
+                report.append({"fold": fold, "train": [start, middle], "test": [middle, end],
+                               "params": ranked[0]["params"], "train_result": ranked[0], "test_result": tested})
+        return report
+
+
+def saveResults(path, results):
+    """
+        Writes results to a JSON file.
+        :param path: Output file
+        :param results: Ranked sweep results or a walk-forward report
+        :return: None
+    """
+    with open(path, "w") as f:
+        json.dump(results, f, indent=2, default=float)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Sweep Scalper parameters over M1 history.")
+    parser.add_argument("files", nargs="+", help=".csv or .npy M1 history, one file per symbol named <symbol>.<ext>")
+    parser.add_argument("--history", help="Read the symbols named in files from this HistoryStore directory")
+    parser.add_argument("--grid", action="store_true", help="Run the full grid instead of random samples")
+    parser.add_argument("--samples", type=int, default=200, help="Random parameter sets to try")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--warmup", type=int, default=5000)
+    parser.add_argument("--batch", type=int, default=None, help="Parameter sets replayed side by side per job")
+    parser.add_argument("--folds", type=int, default=0, help="Walk-forward windows, 0 for a single sweep")
+    parser.add_argument("--out", default="optimizer_results.json")
+    args = parser.parse_args()
+
+    data = loadData(args.files, args.history)
+    candidates = gridCandidates(SEARCH_SPACE) if args.grid else randomCandidates(SEARCH_SPACE, args.samples, args.seed)
+    optimizer = Optimizer(data, processes=args.processes, warmup=args.warmup, batch=args.batch)
+    started = time.perf_counter()
+    if args.folds:
+        results = optimizer.walkForward(candidates, folds=args.folds)
+        for fold in results:
+            print(f"Fold {fold['fold']}: train PnL {fold['train_result']['pnl']:.2f}, "
+                  f"test PnL {fold['test_result']['pnl']:.2f}, params {fold['params']}")
+    else:
+        results = optimizer.sweep(candidates)
+        for result in results[:10]:
+            print(f"PnL {result['pnl']:.2f}, trades {result['trades']}, "
+                  f"max drawdown {result['max_drawdown']:.2f}, params {result['params']}")
+    saveResults(args.out, results)
+    print(f"{len(candidates)} parameter sets in {time.perf_counter() - started:.1f}s, results in {args.out}")
@@ -0,0 +1,238 @@
+import heapq
+import itertools
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.Tracer import getTracer
+
+
+class QueuedRequest:
+    """
+        A trade request waiting in an OrderGateway, with every future that expects its result.
+    """
+    __slots__ = ("request", "futures", "key", "attempts", "queued")
+
+    def __init__(self, request, future, key):
+        self.request = request
+        self.futures = [future]
+        self.key = key
+        self.attempts = 0
+        self.queued = time.perf_counter()
+
+
+class OrderGateway:
+    """
+        Sends the trade requests of one account from a background thread, so the strategy never waits on an
+        order_send round trip: submit() queues the request and returns a concurrent.futures.Future of the
+        order_send result.
+        The queue is bounded; when it is full the returned future fails with queue.Full. Requests leave the
+        queue no faster than the account rate limit (a token bucket). Requotes, moved or missing prices,
+        throttling, timeouts and lost connections are retried with exponential backoff, market orders at a
+        fresh price. An SL/TP change (TRADE_ACTION_SLTP) or pending order change (TRADE_ACTION_MODIFY) that is
+        still queued when a newer one for the same ticket arrives is replaced by it, and both futures get the
+        result of the newer request.
+    """
+    thread = None
+
+    def __init__(self, broker=None, max_queue=256, rate=5.0, burst=10, retries=3, backoff=0.25, max_backoff=5.0):
+        """
+            :param broker: Broker of the account, None for the MT5 terminal
+            :param max_queue: Maximum number of queued requests
+            :param rate: Requests per second the account may send
+            :param burst: Requests that may be sent back to back before the rate applies
+            :param retries: Times a request is resent after a retryable answer
+            :param backoff: Seconds before the first retry, doubled on every further one
+            :param max_backoff: Longest wait between retries, in seconds
+        """
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.max_queue = max_queue
+        self.rate = rate
+        self.burst = burst
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retryable = {self.broker.TRADE_RETCODE_REQUOTE, self.broker.TRADE_RETCODE_PRICE_CHANGED,
+                          self.broker.TRADE_RETCODE_PRICE_OFF, self.broker.TRADE_RETCODE_TOO_MANY_REQUESTS,
+                          self.broker.TRADE_RETCODE_TIMEOUT, self.broker.TRADE_RETCODE_CONNECTION}
+        self.tracer = getTracer()
+        self.queue = deque()
+        self.delayed = []
+        self.modifications = {}
+        self.order = itertools.count()
+        self.tokens = float(burst)
+        self.refilled = time.monotonic()
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.counts = {"submitted": 0, "sent": 0, "retried": 0, "coalesced": 0, "rejected": 0, "failed": 0}
+
+    def __key__(self, request):
+        action = request.get("action")
+        if action == self.broker.TRADE_ACTION_SLTP:
+            return "position", request.get("position")
+        if action == self.broker.TRADE_ACTION_MODIFY:
+            return "order", request.get("order")
+        return None
+
+    def submit(self, request):
+        """
+            Queues a trade request without waiting for it to be sent.
+            :param request: order_send request dict
+            :return: Future of the order_send result
+        """
+        future = Future()
+        key = self.__key__(request)
+        with self.condition:
+            self.counts["submitted"] += 1
+            entry = self.modifications.get(key) if key is not None else None
+            if entry is not None:
+                entry.request = request
+                entry.futures.append(future)
+                self.counts["coalesced"] += 1
+                return future
+            if len(self.queue) + len(self.delayed) >= self.max_queue:
+                self.counts["rejected"] += 1
+                future.set_exception(queue.Full(f"Order queue is full ({self.max_queue} requests)"))
+                return future
+            entry = QueuedRequest(request, future, key)
+            if key is not None:
+                self.modifications[key] = entry
+            self.queue.append(entry)
+            self.condition.notify()
+        return future
+
+    def pending(self):
+        """
+            :return: Number of requests queued or waiting for a retry
+        """
+        with self.condition:
+            return len(self.queue) + len(self.delayed)
+
+    def stats(self):
+        with self.condition:
+            return dict(self.counts)
+
+    def __refill__(self, now):
+        self.tokens = min(float(self.burst), self.tokens + (now - self.refilled) * self.rate)
+        self.refilled = now
+
+    def __take__(self):
+        # Waits for a request that is due and a rate limit token; returns None once stopped and drained.
+        with self.condition:
+            while True:
+                now = time.monotonic()
+                while self.delayed and self.delayed[0][0] <= now:
+                    self.queue.append(heapq.heappop(self.delayed)[2])
+                if self.queue:
+                    self.__refill__(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        entry = self.queue.popleft()
+                        if entry.key is not None:
+                            self.modifications.pop(entry.key, None)
+                        return entry
+                    timeout = (1 - self.tokens) / self.rate
+                elif self.stopped and not self.delayed:
+                    return None
+                else:
+                    timeout = self.delayed[0][0] - now if self.delayed else None
+                self.condition.wait(timeout)
+
+    def __reprice__(self, request):
+        # A market order is resent at the current price; anything else is resent unchanged.
+        if request.get("action") != self.broker.TRADE_ACTION_DEAL or "price" not in request:
+            return request
+        tick = self.broker.symbol_info_tick(request["symbol"])
+        if tick is None:
+            return request
+        price = tick.ask if request.get("type") == self.broker.ORDER_TYPE_BUY else tick.bid
+        return dict(request, price=price)
+
+    def __send__(self, entry):
+        symbol = entry.request.get("symbol", "gateway")
+        if entry.attempts == 0:
+            self.tracer.record(symbol, "order_queue", time.perf_counter() - entry.queued)
+        try:
+            with self.tracer.stage(symbol, "order_send"):
+                result = self.broker.order_send(entry.request)
+        except Exception as e:
+            print(f"[-] Order gateway: {entry.request} raised {e!r}")
+            self.__resolve__(entry, exception=e)
+            return
+        with self.condition:
+            self.counts["sent"] += 1
+        retcode = result.retcode if result is not None else None
+        if (result is None or retcode in self.retryable) and entry.attempts < self.retries:
+            entry.attempts += 1
+            delay = min(self.max_backoff, self.backoff * 2 ** (entry.attempts - 1))
+            entry.request = self.__reprice__(entry.request)
+            with self.condition:
+                self.counts["retried"] += 1
+                if entry.key is not None:
+                    newer = self.modifications.get(entry.key)
+                    if newer is not None:
+                        # A newer change for the same ticket is already queued; it answers for this one too.
+                        newer.futures.extend(entry.futures)
+                        self.counts["coalesced"] += 1
+                        return
+                    self.modifications[entry.key] = entry
+                heapq.heappush(self.delayed, (time.monotonic() + delay, next(self.order), entry))
+                self.condition.notify()
+            return
+        if retcode not in (self.broker.TRADE_RETCODE_DONE, self.broker.TRADE_RETCODE_NO_CHANGES):
+            print(f"[-] Order gateway: {entry.request} failed with retcode {retcode}")
+            with self.condition:
+                self.counts["failed"] += 1
+        self.__resolve__(entry, result=result)
+
+    def __resolve__(self, entry, result=None, exception=None):
+        for future in entry.futures:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(result)
+
+    def run(self):
+        while True:
+            entry = self.__take__()
+            if entry is None:
+                return
+            self.__send__(entry)
+
+    def start(self):
+        """
+            Starts the sending thread unless it is already running.
+            :return: None
+        """
+        with self.condition:
+            if self.thread is None:
+                self.stopped = False
+                self.thread = threading.Thread(target=self.run, daemon=True)
+                self.thread.start()
+
+    def stop(self, wait=True):
+        """
+            Stops the sending thread once the queued requests, retries included, have been sent.
+            :param wait: Block until the thread has finished
+            :return: None
+        """
+        with self.condition:
+            self.stopped = True
+            thread, self.thread = self.thread, None
+            self.condition.notify()
+        if wait and thread is not None:
+            thread.join()
+
+
+def getOrderGateway(broker=None):
+    """
+        Returns the running order gateway shared by everything in this process that trades through broker.
+        :param broker: A Broker, or None for the default MT5 terminal
+        :return: An OrderGateway
+    """
+    broker = broker if broker is not None else getDefaultBroker()
+    gateway = broker.shared("gateway", lambda: OrderGateway(broker))
+    gateway.start()
+    return gateway
@@ -1,27 +1,56 @@
-import MetaTrader5 as mt5
-import pandas as pd
 import time
-from talib import abstract
+from BotCodeV2.Broker import TIME_FRAMES, getDefaultBroker
+from BotCodeV2.BarSeries import BarSeries
+from BotCodeV2.CandleStore import getCandleStore
+from BotCodeV2.IndicatorGraph import getIndicatorGraph
+from BotCodeV2.Tracer import getTracer
+from BotCodeV2.TrailingEngine import getTrailingEngine
 
 class OrderManager:
     symbol = None
     order_type = None
     order_id = None
+    candles = None
+    atr = None
+    future = None
 
-    def __init__(self, symbol, order_type, stop_loss, take_profit, volume=0.01):
-        mt5.initialize()
+    def __init__(self, symbol, order_type, stop_loss, take_profit, volume=0.01, broker=None, live=True, gateway=None,
+                 ticket=None):
+        """
+            Opens a market order and, when live, keeps trailing its SL/TP until the position closes.
+            :param broker: Broker to trade through, None for the MT5 terminal
+            :param live: False to only place the order; the caller then drives trailing through checkPosition()
+            :param gateway: OrderGateway to queue the requests in instead of sending them inline; order_id is
+            then set once future has resolved
+            :param ticket: Ticket of a position that is already open, to take over managing it (after a restart)
+            instead of placing a new order; stop_loss and take_profit are then ignored
+        """
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.gateway = gateway
+        self.broker.initialize()
         self.symbol = symbol
+        self.candles = getCandleStore(self.broker)
+        self.atr = getIndicatorGraph(symbol, self.broker.TIMEFRAME_M5, self.broker).output("atr")
         self.order_type = order_type
         self.volume = volume
+        self.tracer = getTracer()
 
-        if self.order_type == "BUY":
+        if ticket is not None:
+            self.order_id = ticket
+            if live and self.order_type == "BUY":
+                self.marketWatchBuy()
+            elif live:
+                self.marketWatchSell()
+        elif self.order_type == "BUY":
             print("Buy order placed")
             self.placeMarketBuyOrder(stop_loss, take_profit, lot_size=self.volume)
-            self.marketWatchBuy()
+            if live:
+                self.marketWatchBuy()
         elif self.order_type == "SELL":
             print("Sell order placed")
             self.placeMarketSellOrder(stop_loss, take_profit, lot_size=self.volume)
-            self.marketWatchSell()
+            if live:
+                self.marketWatchSell()
 
     #### Place Market Orders ####
     def placeMarketBuyOrder(self, stop_loss, take_profit, lot_size=0.01):
@@ -35,20 +64,18 @@ class OrderManager:
             :return: None
         """
         request = {
-            "action": mt5.TRADE_ACTION_DEAL,
+            "action": self.broker.TRADE_ACTION_DEAL,
             "symbol": self.symbol,
             "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY,
-            "price": mt5.symbol_info_tick(self.symbol).ask,
+            "type": self.broker.ORDER_TYPE_BUY,
+            "price": self.broker.symbol_info_tick(self.symbol).ask,
             "tp": take_profit,
             "sl": stop_loss,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
+            "type_time": self.broker.ORDER_TIME_GTC,
+            "type_filling": self.broker.ORDER_FILLING_IOC,
             "Deviation": 30
         }
-        buy_order = mt5.order_send(request)._asdict()
-        print(buy_order)
-        self.order_id = buy_order["order"]
+        self.__place__(request)
 
     def placeMarketSellOrder(self, stop_loss, take_profit, lot_size=0.01):
         """
@@ -60,20 +87,37 @@ class OrderManager:
             :return: None
         """
         request = {
-            "action": mt5.TRADE_ACTION_DEAL,
+            "action": self.broker.TRADE_ACTION_DEAL,
             "symbol": self.symbol,
             "volume": lot_size,
-            "type": mt5.ORDER_TYPE_SELL,
-            "price": mt5.symbol_info_tick(self.symbol).bid,
+            "type": self.broker.ORDER_TYPE_SELL,
+            "price": self.broker.symbol_info_tick(self.symbol).bid,
             "sl": stop_loss,
             "tp": take_profit,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC,
+            "type_time": self.broker.ORDER_TIME_GTC,
+            "type_filling": self.broker.ORDER_FILLING_IOC,
             "deviation": 30
         }
-        sell_order = mt5.order_send(request)._asdict()
-        print(sell_order)
-        self.order_id = sell_order["order"]
+        self.__place__(request)
+
+    def __place__(self, request):
+        if self.gateway is not None:
+            self.future = self.gateway.submit(request)
+            self.future.add_done_callback(self.__placed__)
+            return
+        with self.tracer.stage(self.symbol, "order_send"):
+            order = self.broker.order_send(request)._asdict()
+        print(order)
+        self.order_id = order["order"]
+
+    def __placed__(self, future):
+        if future.exception() is not None:
+            print(f"[-] {self.symbol} {self.order_type} order not placed: {future.exception()!r}")
+            return
+        result = future.result()
+        print(result)
+        if result is not None:
+            self.order_id = result.order
 
     #### Close Open Orders ####
 
@@ -82,165 +126,141 @@ class OrderManager:
             This function closes a currently open buy order
             :return: None
         """
-        mt5.Close(symbol=self.symbol, comment=f"Closed buy order for {self.symbol}", ticket=self.order_id)
+        self.broker.Close(symbol=self.symbol, comment=f"Closed buy order for {self.symbol}", ticket=self.order_id)
 
     def closeSellOrder(self):
         """
             This function closes a currently open sell order
             :return: None
         """
-        mt5.Close(symbol=self.symbol, comment=f"Closed sell order for {self.symbol}", ticket=self.order_id)
+        self.broker.Close(symbol=self.symbol, comment=f"Closed sell order for {self.symbol}", ticket=self.order_id)
 
     def openPendingBuyStopLimit(self, buy_stop_limit_price, stop_loss_percent=5, take_profit_percent=3,
                                 lot_size=0.01):
         request = {
-            "action": mt5.TRADE_ACTION_PENDING,
+            "action": self.broker.TRADE_ACTION_PENDING,
             "symbol": self.symbol,
             "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY_STOP_LIMIT,
+            "type": self.broker.ORDER_TYPE_BUY_STOP_LIMIT,
             "price": buy_stop_limit_price,
             "sl": buy_stop_limit_price * (1 - stop_loss_percent / 100),
             "tp": buy_stop_limit_price * (1 + take_profit_percent / 100),
             "deviation": 30,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
+            "type_time": self.broker.ORDER_TIME_GTC,
+            "type_filling": self.broker.ORDER_FILLING_IOC
         }
-        order = mt5.send_order(request)
+        order = self.broker.send_order(request)
         print(order)
         self.order_id = order["order"]
 
     def openPendingSellStopLimit(self, sell_stop_limit_price, stop_loss_percent=5, take_profit_percent=3,
                                  lot_size=0.01):
         request = {
-            "action": mt5.TRADE_ACTION_PENDING,
+            "action": self.broker.TRADE_ACTION_PENDING,
             "symbol": self.symbol,
             "volume": lot_size,
-            "type": mt5.ORDER_TYPE_SELL_STOP_LIMIT,
+            "type": self.broker.ORDER_TYPE_SELL_STOP_LIMIT,
             "price": sell_stop_limit_price,
             "sl": sell_stop_limit_price * (1 + stop_loss_percent / 100),
             "tp": sell_stop_limit_price * (1 - take_profit_percent / 100),
             "deviation": 30,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
+            "type_time": self.broker.ORDER_TIME_GTC,
+            "type_filling": self.broker.ORDER_FILLING_IOC
         }
-        order = mt5.send_order(request)
+        order = self.broker.send_order(request)
         print(order)
         self.order_id = order["order"]
 
     #### Remove Pending Orders ####
     def removePendingOrder(self):
-        pending_orders = mt5.orders_get(ticket=self.order_id)
+        pending_orders = self.broker.orders_get(ticket=self.order_id)
         if pending_orders is not None:
             request = {
-                "action": mt5.TRADE_ACTION_REMOVE,
+                "action": self.broker.TRADE_ACTION_REMOVE,
                 "order": self.order_id
             }
-            mt5.order_send(request)
+            self.broker.order_send(request)
 
     def modifyBuyStopLossTakeProfit(self, new_sl, new_tp):
-        position = mt5.positions_get(ticket=self.order_id)[0]
+        position = self.broker.positions_get(ticket=self.order_id)[0]
         if position is not None:
-            request = {
-                "action": mt5.TRADE_ACTION_SLTP,
-                "position": self.order_id,
-                "sl": new_sl,
-                "tp": new_tp
-            }
-            req = mt5.order_send(request)
-            print(req)
+            self.setStopLossTakeProfit(new_sl, new_tp)
 
     def modifySellStopLossTakeProfit(self, new_sl, new_tp):
-        position = mt5.positions_get(ticket=self.order_id)[0]
+        position = self.broker.positions_get(ticket=self.order_id)[0]
         if position is not None:
-            request = {
-                "action": mt5.TRADE_ACTION_SLTP,
-                "position": self.order_id,
-                "sl": new_sl,
-                "tp": new_tp
-            }
-            req = mt5.order_send(request)
-            print(req)
+            self.setStopLossTakeProfit(new_sl, new_tp)
+
+    def setStopLossTakeProfit(self, new_sl, new_tp):
+        """
+            Sends an SL/TP change for the position without looking it up first.
+            :return: None
+        """
+        request = {
+            "action": self.broker.TRADE_ACTION_SLTP,
+            "position": self.order_id,
+            "sl": new_sl,
+            "tp": new_tp
+        }
+        self.__modify__(request)
+
+    def __modify__(self, request):
+        if self.gateway is not None:
+            # Queued; a newer SL/TP for the same position replaces this one if it has not been sent yet.
+            self.gateway.submit(request)
+            return
+        req = self.broker.order_send(request)
+        print(req)
 
     def dataFetcher(self, time_frame=1, number_of_candles=500):
         """
             This is a function that fetches past 500 candlesticks data at an x-minute time frame
             :param time_frame: Time in minutes to fetch data for.
             :param number_of_candles: Number of candles to fetch data for
-            :return: A pandas data frame containing the data of last 1000 candlesticks
-            Dataframe columns: time, open, high, low, close, tick_volume, spread, real_volume
-        """
-        if time_frame == 5:
-            time = mt5.TIMEFRAME_M5
-        elif time_frame == 15:
-            time = mt5.TIMEFRAME_M15
-        elif time_frame == 30:
-            time = mt5.TIMEFRAME_M30
-        elif time_frame == 1:
-            time = mt5.TIMEFRAME_M1
-        else:
+            :return: A BarSeries of the candles, oldest first
+            Columns: time, open, high, low, close, tick_volume, spread, real_volume
+        """
+        time_frame = TIME_FRAMES.get(time_frame)
+        if time_frame is None:
             return
-        rates = mt5.copy_rates_from_pos(self.symbol, time, 0, number_of_candles)
-        rates_df = pd.DataFrame(rates)
-        rates_df["time"] = pd.to_datetime(rates_df["time"], unit="s")
-        return rates_df
+        return BarSeries(self.candles.get(self.symbol, time_frame, number_of_candles))
 
     def __ATRCalculator__(self):
-        ohlc = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M5, 0, 100))
-        atr = abstract.ATR(ohlc)
-        atr.dropna(inplace=True)
-        return atr[-1:-11:-1].mean()
-
-    def __getMargin__(self):
-        order_type = mt5.ORDER_TYPE_BUY if self.order_type=="BUY" else mt5.ORDER_TYPE_SELL
-        margin = mt5.order_calc_margin(order_type, self.symbol, self.volume, mt5.symbol_info_tick(self.symbol).ask)
-        return margin
-    
-    def __SlTpCalculator__(self, order, atr, order_type):
-        # 10 points = 1 pip
-        # 10000 pips = 1 USD
-        points = mt5.symbol_info(self.symbol).point
-        margin = self.__getMargin__()
-        tick = mt5.symbol_info_tick(self.symbol)
-        pip = points * 10
-        if order_type == "BUY":
-            sl = order.price_open + margin + (1.5 * atr)
-            tp = order.tp + (atr * 2)
-        else:
-            tp = order.tp - (atr * 2)
-            sl = order.price_open - margin - (1.5 * atr)
-        return sl, tp
+        self.atr.sync(self.candles.get(self.symbol, self.broker.TIMEFRAME_M5, 100))
+        atr = self.atr.last(10)
+        return sum(atr) / len(atr)
+
+    def trail(self, position, atr):
+        """
+            Runs one trailing decision for a position snapshot, moving SL/TP once enough profit is locked in.
+            The rule lives in TrailingEngine, which PositionMonitor runs over every position at once.
+            :param position: The position as returned by positions_get
+            :param atr: Current M5 ATR of the symbol
+            :return: None
+        """
+        getTrailingEngine(self.broker).trail([(position, self)], lambda symbol: atr)
+
+    def checkPosition(self):
+        """
+            Fetches the position and runs one trailing pass over it.
+            :return: False once the position has been closed, True otherwise
+        """
+        try:
+            position = self.broker.positions_get(ticket=self.order_id)[0]
+        except IndexError:
+            return False
+        if position != ():
+            self.trail(position, self.__ATRCalculator__())
+        return True
 
     def marketWatchBuy(self):
-        while True:
-            try:
-                position = mt5.positions_get(ticket=self.order_id)[0]
-                if position != ():
-                    tp = position.tp
-                    sl = position.sl
-                    current_price = position.price_current
-                    profit = position.profit
-                    atr = self.__ATRCalculator__()
-                    if profit >= 0.8 * (tp - current_price):
-                        sl, tp = self.__SlTpCalculator__(position, atr, "BUY")
-                        self.modifyBuyStopLossTakeProfit(sl, tp)
-                time.sleep(1)
-            except IndexError:
-                break
+        if self.future is not None and self.future.exception() is not None:
+            return
+        while self.checkPosition():
+            time.sleep(1)
 
     def marketWatchSell(self):
-        while True:
-            try:
-                position = mt5.positions_get(ticket=self.order_id)[0]
-                if position != ():
-                    tp = position.tp
-                    sl = position.sl
-                    current_price = position.price_current
-                    profit = position.profit
-                    atr = self.__ATRCalculator__()
-                    if profit >= 0.6 * (current_price - tp):
-                        print("changing profits!")
-                        sl, tp = self.__SlTpCalculator__(position, atr, "BUY")
-                        self.modifyBuyStopLossTakeProfit(sl, tp)
-                time.sleep(1)
-            except IndexError:
-                break
+        if self.future is not None and self.future.exception() is not None:
+            return
+        while self.checkPosition():
+            time.sleep(1)
@@ -0,0 +1,103 @@
+from BotCodeV2.Broker import getDefaultBroker
+
+
+class OrderReconciler:
+    """
+        Brings the live pending orders of a symbol in line with a desired set of pending order requests.
+        Orders that already match are left alone, orders of the same type and volume that only moved are
+        changed in place with TRADE_ACTION_MODIFY, and only the rest is removed or added. The number of
+        order_send round trips therefore follows what changed rather than the number of zones.
+        With an OrderGateway the changes are queued instead of sent inline.
+    """
+
+    def __init__(self, symbol, broker=None, tolerance=5, gateway=None):
+        """
+            :param symbol: Symbol whose pending orders are managed
+            :param broker: Broker to trade through, None for the MT5 terminal
+            :param tolerance: Price, SL and TP differences up to this many points count as unchanged
+            :param gateway: OrderGateway to queue the changes in, None to send them inline
+        """
+        self.symbol = symbol
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.tolerance = tolerance
+        self.gateway = gateway
+
+    def __same__(self, order, request, tolerance):
+        return (abs(order.price_open - request["price"]) <= tolerance
+                and abs(order.sl - request.get("sl", 0.0)) <= tolerance
+                and abs(order.tp - request.get("tp", 0.0)) <= tolerance)
+
+    def plan(self, desired, orders):
+        """
+            Works out the changes needed without sending anything.
+            :param desired: List of TRADE_ACTION_PENDING request dicts
+            :param orders: Live pending orders as returned by orders_get
+            :return: (adds, modifies, removes): requests to send as new orders, (order, request) pairs to
+            modify and orders to remove
+        """
+        tolerance = self.tolerance * self.broker.symbol_info(self.symbol).point if desired or orders else 0.0
+        groups = {}
+        for request in desired:
+            groups.setdefault((request["type"], request["volume"]), ([], []))[0].append(request)
+        removes = []
+        for order in orders:
+            group = groups.get((order.type, order.volume_current))
+            if group is None:
+                removes.append(order)
+            else:
+                group[1].append(order)
+
+        adds, modifies = [], []
+        for requests, live in groups.values():
+            requests.sort(key=lambda request: request["price"])
+            live.sort(key=lambda order: order.price_open)
+            # Keep the orders that already match a request; both lists are sorted so one sweep pairs them.
+            unmatched_requests, unmatched_live = [], []
+            i = j = 0
+            while i < len(requests) and j < len(live):
+                if self.__same__(live[j], requests[i], tolerance):
+                    i += 1
+                    j += 1
+                elif live[j].price_open < requests[i]["price"]:
+                    unmatched_live.append(live[j])
+                    j += 1
+                else:
+                    unmatched_requests.append(requests[i])
+                    i += 1
+            unmatched_requests.extend(requests[i:])
+            unmatched_live.extend(live[j:])
+            # Move the leftover orders onto the leftover requests, then add or remove the difference.
+            paired = min(len(unmatched_requests), len(unmatched_live))
+            modifies.extend(zip(unmatched_live[:paired], unmatched_requests[:paired]))
+            adds.extend(unmatched_requests[paired:])
+            removes.extend(unmatched_live[paired:])
+        return adds, modifies, removes
+
+    def __send__(self, request):
+        if self.gateway is not None:
+            self.gateway.submit(request)
+        else:
+            self.broker.order_send(request)
+
+    def reconcile(self, desired):
+        """
+            Sends the adds, modifies and removes needed to turn the live pending orders into desired.
+            :param desired: List of TRADE_ACTION_PENDING request dicts for this symbol
+            :return: (added, modified, removed) counts
+        """
+        orders = self.broker.orders_get(symbol=self.symbol) or ()
+        adds, modifies, removes = self.plan(desired, orders)
+        for order in removes:
+            self.__send__({"action": self.broker.TRADE_ACTION_REMOVE, "order": order.ticket})
+        for order, request in modifies:
+            self.__send__({
+                "action": self.broker.TRADE_ACTION_MODIFY,
+                "order": order.ticket,
+                "price": request["price"],
+                "sl": request.get("sl", 0.0),
+                "tp": request.get("tp", 0.0),
+                "type_time": request.get("type_time", self.broker.ORDER_TIME_GTC)
+            })
+        for request in adds:
+            self.__send__(request)
+        return len(adds), len(modifies), len(removes)
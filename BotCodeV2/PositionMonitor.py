@@ -0,0 +1,127 @@
+import threading
+import time
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.CandleStore import getCandleStore
+from BotCodeV2.IndicatorGraph import getIndicatorGraph
+from BotCodeV2.TrailingEngine import getTrailingEngine
+
+
+class PositionMonitor:
+    """
+        Watches every open position of an account with a single positions_get() call per poll. The result is
+        diffed against the tickets of the registered OrderManagers: closed tickets are dropped, and only the
+        positions whose price moved since the last poll get a trailing pass. The moved positions are trailed
+        together in one TrailingEngine pass, which asks for ATR once per symbol and only for symbols with a
+        position that triggered.
+    """
+    broker = None
+    thread = None
+    sessions = None
+
+    def __init__(self, broker=None, sessions=None):
+        """
+            :param broker: Broker of the account, None for the MT5 terminal
+            :param sessions: SessionSchedule; positions of symbols whose market is closed are not polled or
+            trailed. None to poll every position
+        """
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.sessions = sessions
+        self.trailing = getTrailingEngine(self.broker)
+        self.candles = getCandleStore(self.broker)
+        self.managers = {}
+        self.last_prices = {}
+        self.lock = threading.Lock()
+
+    def register(self, manager):
+        """
+            Starts trailing the position opened by an OrderManager.
+            :param manager: An OrderManager whose order has been placed
+            :return: None
+        """
+        if manager.order_id:
+            with self.lock:
+                self.managers[manager.order_id] = manager
+
+    def tickets(self):
+        with self.lock:
+            return list(self.managers)
+
+    def managed(self, symbol=None):
+        """
+            :param symbol: Symbol to list the managers of, None for every symbol
+            :return: List of the registered OrderManagers
+        """
+        with self.lock:
+            return [manager for manager in self.managers.values() if symbol is None or manager.symbol == symbol]
+
+    def __atr__(self, symbol):
+        atr = getIndicatorGraph(symbol, self.broker.TIMEFRAME_M5, self.broker).output("atr")
+        atr.sync(self.candles.get(symbol, self.broker.TIMEFRAME_M5, 100))
+        values = atr.last(10)
+        return sum(values) / len(values)
+
+    def poll(self):
+        """
+            Runs one monitoring pass over the account.
+            :return: Number of positions that got a trailing pass
+        """
+        with self.lock:
+            managers = dict(self.managers)
+        if self.sessions is not None:
+            now = time.time()
+            managers = {ticket: manager for ticket, manager in managers.items()
+                        if self.sessions.isOpen(manager.symbol, now)}
+        if not managers:
+            return 0
+        positions = {position.ticket: position for position in self.broker.positions_get() or ()}
+
+        closed = [ticket for ticket in managers if ticket not in positions]
+        with self.lock:
+            for ticket in closed:
+                self.managers.pop(ticket, None)
+                self.last_prices.pop(ticket, None)
+        if closed:
+            self.trailing.forget(closed)
+
+        moved = []
+        for ticket, manager in managers.items():
+            position = positions.get(ticket)
+            if position is None or self.last_prices.get(ticket) == position.price_current:
+                continue
+            self.last_prices[ticket] = position.price_current
+            moved.append((position, manager))
+        self.trailing.trail(moved, self.__atr__)
+        return len(moved)
+
+    def run(self, interval=1):
+        """
+            Polls the account forever.
+            :param interval: Seconds between polls
+            :return: None
+        """
+        while True:
+            try:
+                self.poll()
+            except Exception as e:
+                print(f"[-] Position monitor: {e!r}")
+            time.sleep(interval)
+
+    def start(self, interval=1):
+        """
+            Runs the monitor on a background thread unless it is already running.
+            :return: None
+        """
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, args=(interval,), daemon=True)
+                self.thread.start()
+
+
+def getPositionMonitor(broker=None):
+    """
+        Returns the position monitor shared by everything in this process that trades through broker.
+        :param broker: A Broker, or None for the default MT5 terminal
+        :return: A PositionMonitor
+    """
+    broker = broker if broker is not None else getDefaultBroker()
+    return broker.shared("monitor", lambda: PositionMonitor(broker))
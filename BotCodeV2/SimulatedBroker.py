@@ -0,0 +1,582 @@
+import time
+from collections import namedtuple
+from datetime import datetime
+import numpy as np
+from BotCodeV2.Broker import Broker, timeFrameSeconds
+from BotCodeV2.CandleStore import RATES_DTYPE, resampleRates
+
+Tick = namedtuple("Tick", ["time", "bid", "ask", "last", "volume", "time_msc"])
+SymbolInfo = namedtuple("SymbolInfo", ["name", "bid", "ask", "point", "digits", "spread", "volume_min", "volume_step",
+                                       "volume_max", "trade_contract_size", "trade_stops_level", "trade_freeze_level"])
+AccountInfo = namedtuple("AccountInfo", ["login", "balance", "equity", "profit", "margin", "margin_free", "leverage",
+                                         "currency"])
+TradePosition = namedtuple("TradePosition", ["ticket", "time", "type", "volume", "price_open", "sl", "tp",
+                                             "price_current", "swap", "profit", "symbol", "comment"])
+TradeOrder = namedtuple("TradeOrder", ["ticket", "time_setup", "type", "volume_current", "price_open", "sl", "tp",
+                                       "price_current", "symbol", "comment"])
+OrderSendResult = namedtuple("OrderSendResult", ["retcode", "deal", "order", "volume", "price", "bid", "ask",
+                                                 "comment", "request_id"])
+Fill = namedtuple("Fill", ["time", "ticket", "symbol", "type", "volume", "price", "profit", "reason"])
+
+
+def syntheticRates(bars, seed=0, start=1700000000, price=1.1, volatility=0.0002, spread=10):
+    """
+        Generates a deterministic random-walk M1 series with occasional large candles, so block-order zones
+        and indicator signals show up like they do on real data.
+        :param bars: Number of M1 bars
+        :param seed: Random seed
+        :param start: Time of the first bar in epoch seconds
+        :param price: Starting price
+        :param volatility: Standard deviation of the close-to-close change
+        :param spread: Spread in points
+        :return: Structured rates array
+    """
+    rng = np.random.default_rng(seed)
+    changes = rng.normal(0, volatility, bars)
+    jumps = rng.random(bars) < 0.002
+    changes[jumps] *= 50
+    close = price + np.cumsum(changes)
+    rates = np.zeros(bars, dtype=RATES_DTYPE)
+    rates["time"] = start // 60 * 60 + np.arange(bars) * 60
+    rates["open"] = np.r_[price, close[:-1]]
+    rates["close"] = close
+    rates["high"] = np.maximum(rates["open"], close) + rng.random(bars) * volatility
+    rates["low"] = np.minimum(rates["open"], close) - rng.random(bars) * volatility
+    rates["tick_volume"] = rng.integers(50, 500, bars)
+    rates["spread"] = spread
+    return rates
+
+
+class SimulatedSymbol:
+    """
+        One symbol replayed from its M1 history. Higher time frames are aggregated from the M1 bars, with the
+        bar of the current period built only from the M1 bars seen so far.
+    """
+
+    def __init__(self, name, rates, point=0.00001, digits=5, volume_min=0.01, volume_step=0.01, volume_max=100.0,
+                 contract_size=100000.0, stops_level=0, freeze_level=0):
+        self.name = name
+        self.rates = np.asarray(rates).astype(RATES_DTYPE, copy=False)
+        # Contiguous, so searchsorted does not copy the whole column on every call.
+        self.times = np.ascontiguousarray(self.rates["time"])
+        self.position = -1
+        self.point = point
+        self.digits = digits
+        self.volume_min = volume_min
+        self.volume_step = volume_step
+        self.volume_max = volume_max
+        self.contract_size = contract_size
+        self.stops_level = stops_level
+        self.freeze_level = freeze_level
+        self.frames = {}
+        self.bid_price = 0.0
+        self.spread_price = 0.0
+
+    def seek(self, now):
+        """
+            Moves onto the last bar open at or before now.
+            :param now: Time in epoch seconds
+            :return: Number of bars moved, negative when moving back
+        """
+        times = self.times
+        position = self.position
+        # Replays step one bar at a time, so the next bar is tried before searching.
+        if position + 1 < len(times) and times[position + 1] == now:
+            position += 1
+        elif (position + 1 < len(times) and times[position + 1] < now) or (position >= 0 and times[position] > now):
+            position = int(np.searchsorted(times, now, side="right")) - 1
+        moved = position - self.position
+        if moved:
+            self.position = position
+            if position >= 0:
+                self.bid_price = float(self.rates["close"][position])
+                self.spread_price = int(self.rates["spread"][position]) * self.point
+        return moved
+
+    def bar(self):
+        return self.rates[self.position]
+
+    def bid(self):
+        return self.bid_price
+
+    def ask(self):
+        return self.bid_price + self.spread_price
+
+    def __frame__(self, seconds):
+        frame = self.frames.get(seconds)
+        if frame is None:
+            starts, full = resampleRates(self.rates, seconds)
+            frame = self.frames[seconds] = (starts, full, np.ascontiguousarray(full["time"]))
+        return frame
+
+    def bars(self, time_frame, first=None, count=None, until=None):
+        """
+            Returns bars of a time frame visible at the current position.
+            :param time_frame: MT5 time frame constant
+            :param first: Earliest bar time to include
+            :param count: Maximum number of bars, counted back from the newest one
+            :param until: Latest bar time to include
+            :return: Structured rates array, oldest first
+        """
+        if self.position < 0:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        if time_frame == 1:
+            last = self.position
+            if until is not None:
+                last = min(last, np.searchsorted(self.times, until, side="right") - 1)
+            start = 0 if first is None else np.searchsorted(self.times, first, side="left")
+            if count is not None:
+                start = max(start, last + 1 - count)
+            return self.rates[start:last + 1].copy()
+
+        starts, full, times = self.__frame__(timeFrameSeconds(time_frame))
+        current = np.searchsorted(starts, self.position, side="right") - 1
+        last = current
+        if until is not None:
+            last = min(last, np.searchsorted(times, until, side="right") - 1)
+        start = 0 if first is None else np.searchsorted(times, first, side="left")
+        if count is not None:
+            start = max(start, last + 1 - count)
+        if last < start:
+            return np.zeros(0, dtype=RATES_DTYPE)
+        bars = full[start:last + 1].copy()
+        if last == current:
+            window = self.rates[starts[current]:self.position + 1]
+            bars[-1]["high"] = window["high"].max()
+            bars[-1]["low"] = window["low"].min()
+            bars[-1]["close"] = window["close"][-1]
+            bars[-1]["tick_volume"] = window["tick_volume"].sum()
+            bars[-1]["spread"] = window["spread"][-1]
+            bars[-1]["real_volume"] = window["real_volume"].sum()
+        return bars
+
+
+class SimulatedBroker(Broker):
+    """
+        Deterministic in-process Broker that replays M1 history, so Scalper and OrderManager run unchanged
+        without a terminal. Every API call can be delayed by a fixed latency to model the terminal round trip
+        in benchmarks. Market orders fill at
+        the current bid/ask; stop and limit orders, stop losses and take profits fill when a later bar trades
+        through their price (at the bar open when it gaps past it).
+    """
+    def __init__(self, balance=10000.0, leverage=100, latency=0.0, market=None):
+        """
+            :param balance: Starting account balance
+            :param leverage: Account leverage used for margin
+            :param latency: Seconds every API call blocks for, to model the terminal round trip
+            :param market: SimulatedBroker whose symbols this account trades, so several accounts replay one
+            market side by side (see Backtester.runCandidates); None for a market of its own
+        """
+        self.latency = latency
+        self.balance = balance
+        self.leverage = leverage
+        self.market = market
+        self.symbols = market.symbols if market is not None else {}
+        # Bar of each symbol this account last filled against; the symbols themselves may be moved by another
+        # account on the same market.
+        self.cursors = {}
+        self.positions = {}
+        self.orders = {}
+        # Per symbol: the extreme SL/TP and pending order prices of each side (see __levels__), and the summed
+        # volume and volume * open price of each side for marking equity.
+        self.stop_levels = {}
+        self.order_levels = {}
+        self.exposure = {}
+        self.fills = []
+        self.now = 0
+        self.next_ticket = 1
+        self.peak_equity = balance
+        self.max_drawdown = 0.0
+
+    #### Simulation control ####
+
+    def addSymbol(self, name, rates, **spec):
+        """
+            Registers a symbol to replay.
+            :param name: Symbol name
+            :param rates: Structured M1 rates array, oldest first
+            :param spec: Contract spec overrides (point, digits, volume_min, contract_size, ...)
+            :return: None
+        """
+        self.symbols[name] = SimulatedSymbol(name, rates, **spec)
+
+    def addSyntheticSymbol(self, name, bars, seed=0, start=1700000000, price=1.1, volatility=0.0002, spread=10,
+                           **spec):
+        """
+            Registers a symbol fed by a deterministic synthetic random walk.
+            :param name: Symbol name
+            :param bars: Number of M1 bars to generate
+            :param seed: Random seed; the same seed always produces the same bars
+            :param start: Time of the first bar in epoch seconds
+            :param price: Starting price
+            :param volatility: Standard deviation of the close-to-close change
+            :param spread: Spread in points
+            :param spec: Contract spec overrides
+            :return: None
+        """
+        self.addSymbol(name, syntheticRates(bars, seed, start, price, volatility, spread), **spec)
+
+    def advance(self, now):
+        """
+            Moves the clock to now. Symbols with a bar at that time step onto it and their pending orders,
+            stop losses and take profits are checked against the bar's range. Jumping over several bars at
+            once (e.g. to skip a warm-up period) does not check the skipped bars.
+            :param now: Bar open time in epoch seconds
+            :return: None
+        """
+        self.now = now
+        for name, symbol in self.symbols.items():
+            symbol.seek(now)
+            moved = symbol.position - self.cursors.get(name, -1)
+            if moved:
+                self.cursors[name] = symbol.position
+                if moved <= 1:
+                    self.__fillOrders__(symbol)
+                    self.__fillStops__(symbol)
+        self.__markEquity__()
+
+    def __changed__(self, name):
+        self.stop_levels.pop(name, None)
+        self.order_levels.pop(name, None)
+
+    def __levels__(self, name):
+        # A bar that reaches none of these prices cannot fill any order or hit any SL/TP of the symbol, so it
+        # is passed over without looking at them one by one.
+        stops = self.stop_levels.get(name)
+        if stops is None:
+            buy_sl, buy_tp, sell_sl, sell_tp = -np.inf, np.inf, np.inf, -np.inf
+            for position in self.positions.values():
+                if position["symbol"] != name:
+                    continue
+                sl, tp = position["sl"], position["tp"]
+                if position["type"] == self.POSITION_TYPE_BUY:
+                    buy_sl = max(buy_sl, sl) if sl else buy_sl
+                    buy_tp = min(buy_tp, tp) if tp else buy_tp
+                else:
+                    sell_sl = min(sell_sl, sl) if sl else sell_sl
+                    sell_tp = max(sell_tp, tp) if tp else sell_tp
+            stops = self.stop_levels[name] = (buy_sl, buy_tp, sell_sl, sell_tp)
+        orders = self.order_levels.get(name)
+        if orders is None:
+            buy_stop, buy_limit, sell_stop, sell_limit = np.inf, -np.inf, -np.inf, np.inf
+            for order in self.orders.values():
+                if order["symbol"] != name:
+                    continue
+                price, order_type = order["price_open"], order["type"]
+                if order_type == self.ORDER_TYPE_BUY_STOP:
+                    buy_stop = min(buy_stop, price)
+                elif order_type == self.ORDER_TYPE_BUY_LIMIT:
+                    buy_limit = max(buy_limit, price)
+                elif order_type == self.ORDER_TYPE_SELL_STOP:
+                    sell_stop = max(sell_stop, price)
+                elif order_type == self.ORDER_TYPE_SELL_LIMIT:
+                    sell_limit = min(sell_limit, price)
+            orders = self.order_levels[name] = (buy_stop, buy_limit, sell_stop, sell_limit)
+        return stops, orders
+
+    def __newTicket__(self):
+        ticket = self.next_ticket
+        self.next_ticket += 1
+        return ticket
+
+    def __open__(self, symbol, position_type, volume, price, sl, tp, ticket=None, comment=""):
+        ticket = ticket if ticket is not None else self.__newTicket__()
+        self.positions[ticket] = {"ticket": ticket, "time": self.now, "type": position_type, "volume": volume,
+                                  "price_open": price, "sl": sl, "tp": tp, "symbol": symbol.name, "comment": comment}
+        self.__expose__(symbol.name, position_type, volume, price, 1)
+        self.__changed__(symbol.name)
+        self.fills.append(Fill(self.now, ticket, symbol.name, position_type, volume, price, 0.0, "open"))
+        return ticket
+
+    def __close__(self, ticket, price, reason):
+        position = self.positions.pop(ticket)
+        symbol = self.symbols[position["symbol"]]
+        self.__expose__(symbol.name, position["type"], position["volume"], position["price_open"], -1)
+        self.__changed__(symbol.name)
+        profit = self.__profit__(position, symbol, price)
+        self.balance += profit
+        close_type = self.ORDER_TYPE_SELL if position["type"] == self.POSITION_TYPE_BUY else self.ORDER_TYPE_BUY
+        self.fills.append(Fill(self.now, ticket, symbol.name, close_type, position["volume"], price, profit, reason))
+        return profit
+
+    def __expose__(self, name, position_type, volume, price, sign):
+        exposure = self.exposure.setdefault(name, [0.0, 0.0, 0.0, 0.0, 0])
+        side = 0 if position_type == self.POSITION_TYPE_BUY else 2
+        exposure[side] += sign * volume
+        exposure[side + 1] += sign * volume * price
+        exposure[4] += sign
+        if not exposure[4]:
+            del self.exposure[name]
+
+    def __profit__(self, position, symbol, price):
+        direction = 1 if position["type"] == self.POSITION_TYPE_BUY else -1
+        return direction * (price - position["price_open"]) * position["volume"] * symbol.contract_size
+
+    def __fillOrders__(self, symbol):
+        buy_stop, buy_limit, sell_stop, sell_limit = self.__levels__(symbol.name)[1]
+        high = symbol.rates["high"][symbol.position]
+        low = symbol.rates["low"][symbol.position]
+        spread = symbol.spread_price
+        if not (high + spread >= buy_stop or low + spread <= buy_limit or low <= sell_stop or high >= sell_limit):
+            return
+        bar = symbol.bar()
+        for ticket in [t for t, o in self.orders.items() if o["symbol"] == symbol.name]:
+            order = self.orders[ticket]
+            price, order_type = order["price_open"], order["type"]
+            fill = None
+            if order_type == self.ORDER_TYPE_BUY_STOP and bar["high"] + spread >= price:
+                fill = max(price, bar["open"] + spread)
+            elif order_type == self.ORDER_TYPE_BUY_LIMIT and bar["low"] + spread <= price:
+                fill = min(price, bar["open"] + spread)
+            elif order_type == self.ORDER_TYPE_SELL_STOP and bar["low"] <= price:
+                fill = min(price, bar["open"])
+            elif order_type == self.ORDER_TYPE_SELL_LIMIT and bar["high"] >= price:
+                fill = max(price, bar["open"])
+            if fill is not None:
+                del self.orders[ticket]
+                self.__changed__(symbol.name)
+                position_type = self.POSITION_TYPE_BUY if order_type in (self.ORDER_TYPE_BUY_STOP, self.ORDER_TYPE_BUY_LIMIT) else self.POSITION_TYPE_SELL
+                self.__open__(symbol, position_type, order["volume"], float(fill), order["sl"], order["tp"],
+                              ticket=ticket, comment=order["comment"])
+
+    def __fillStops__(self, symbol):
+        buy_sl, buy_tp, sell_sl, sell_tp = self.__levels__(symbol.name)[0]
+        high = symbol.rates["high"][symbol.position]
+        low = symbol.rates["low"][symbol.position]
+        spread = symbol.spread_price
+        if not (low <= buy_sl or high >= buy_tp or high + spread >= sell_sl or low + spread <= sell_tp):
+            return
+        bar = symbol.bar()
+        for ticket in [t for t, p in self.positions.items() if p["symbol"] == symbol.name]:
+            position = self.positions[ticket]
+            sl, tp = position["sl"], position["tp"]
+            # When both levels fall inside one bar the stop loss is assumed to trade first.
+            if position["type"] == self.POSITION_TYPE_BUY:
+                if sl and bar["low"] <= sl:
+                    self.__close__(ticket, float(min(sl, bar["open"])), "sl")
+                elif tp and bar["high"] >= tp:
+                    self.__close__(ticket, float(max(tp, bar["open"])), "tp")
+            else:
+                if sl and bar["high"] + spread >= sl:
+                    self.__close__(ticket, float(max(sl, bar["open"] + spread)), "sl")
+                elif tp and bar["low"] + spread <= tp:
+                    self.__close__(ticket, float(min(tp, bar["open"] + spread)), "tp")
+
+    def __markEquity__(self):
+        equity = self.balance
+        for name, (buy_volume, buy_cost, sell_volume, sell_cost, count) in self.exposure.items():
+            symbol = self.symbols[name]
+            value = symbol.bid() * buy_volume - buy_cost + sell_cost - symbol.ask() * sell_volume
+            equity += value * symbol.contract_size
+        self.peak_equity = max(self.peak_equity, equity)
+        self.max_drawdown = max(self.max_drawdown, self.peak_equity - equity)
+        return equity
+
+    def __margin__(self, symbol, volume, price):
+        return volume * symbol.contract_size * price / self.leverage
+
+    def __wait__(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    #### Broker API ####
+
+    def initialize(self, *args, **kwargs):
+        return True
+
+    def login(self, login, password=None, server=None, **kwargs):
+        return True
+
+    def shutdown(self):
+        return None
+
+    def last_error(self):
+        return (1, "Success")
+
+    @staticmethod
+    def __timestamp__(date):
+        return int(date.timestamp()) if isinstance(date, datetime) else int(date)
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        self.__wait__()
+        bars = self.symbols[symbol].bars(time_frame, count=count + start_pos)
+        return bars[:len(bars) - start_pos] if start_pos else bars
+
+    def copy_rates_from(self, symbol, time_frame, date_from, count):
+        self.__wait__()
+        return self.symbols[symbol].bars(time_frame, count=count, until=self.__timestamp__(date_from))
+
+    def copy_rates_range(self, symbol, time_frame, date_from, date_to):
+        self.__wait__()
+        return self.symbols[symbol].bars(time_frame, first=self.__timestamp__(date_from),
+                                         until=self.__timestamp__(date_to))
+
+    def symbol_info_tick(self, symbol):
+        self.__wait__()
+        symbol = self.symbols[symbol]
+        bid = symbol.bid()
+        return Tick(self.now, bid, symbol.ask(), bid, 0, self.now * 1000)
+
+    def symbol_info(self, symbol):
+        self.__wait__()
+        symbol = self.symbols[symbol]
+        return SymbolInfo(symbol.name, symbol.bid(), symbol.ask(), symbol.point, symbol.digits,
+                          int(symbol.bar()["spread"]), symbol.volume_min, symbol.volume_step, symbol.volume_max,
+                          symbol.contract_size, symbol.stops_level, symbol.freeze_level)
+
+    def account_info(self):
+        self.__wait__()
+        margin = sum(self.__margin__(self.symbols[p["symbol"]], p["volume"], p["price_open"])
+                     for p in self.positions.values())
+        equity = self.__markEquity__()
+        return AccountInfo(1, self.balance, equity, equity - self.balance, margin, equity - margin, self.leverage,
+                           "USD")
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        self.__wait__()
+        return self.__margin__(self.symbols[symbol], volume, price)
+
+    def positions_get(self, symbol=None, ticket=None, **kwargs):
+        self.__wait__()
+        positions = []
+        quotes = {}
+        for position in self.positions.values():
+            if (ticket is None or position["ticket"] == ticket) and (symbol is None or position["symbol"] == symbol):
+                name = position["symbol"]
+                quote = quotes.get(name)
+                if quote is None:
+                    owner = self.symbols[name]
+                    quote = quotes[name] = (owner.bid(), owner.ask(), owner.contract_size)
+                bid, ask, contract_size = quote
+                if position["type"] == self.POSITION_TYPE_BUY:
+                    price, profit = bid, bid - position["price_open"]
+                else:
+                    price, profit = ask, position["price_open"] - ask
+                positions.append(TradePosition(position["ticket"], position["time"], position["type"],
+                                               position["volume"], position["price_open"], position["sl"],
+                                               position["tp"], price, 0.0,
+                                               profit * position["volume"] * contract_size, name,
+                                               position["comment"]))
+        return tuple(positions)
+
+    def orders_get(self, symbol=None, ticket=None, **kwargs):
+        self.__wait__()
+        orders = []
+        for order in self.orders.values():
+            if (ticket is None or order["ticket"] == ticket) and (symbol is None or order["symbol"] == symbol):
+                owner = self.symbols[order["symbol"]]
+                orders.append(TradeOrder(order["ticket"], order["time"], order["type"], order["volume"],
+                                         order["price_open"], order["sl"], order["tp"], owner.bid(),
+                                         order["symbol"], order["comment"]))
+        return tuple(orders)
+
+    def __result__(self, retcode, order=0, volume=0.0, price=0.0, symbol=None, comment=""):
+        bid = symbol.bid() if symbol is not None else 0.0
+        ask = symbol.ask() if symbol is not None else 0.0
+        return OrderSendResult(retcode, order if retcode == self.TRADE_RETCODE_DONE else 0, order, volume, price, bid,
+                               ask, comment, 0)
+
+    def __validStops__(self, symbol, position_type, price, sl, tp):
+        distance = symbol.stops_level * symbol.point
+        if position_type == self.POSITION_TYPE_BUY:
+            return (not sl or sl <= price - distance) and (not tp or tp >= price + distance)
+        return (not sl or sl >= price + distance) and (not tp or tp <= price - distance)
+
+    def __frozen__(self, symbol, position, price):
+        # A position whose SL or TP is within the freeze level of the price cannot be modified.
+        distance = symbol.freeze_level * symbol.point
+        if not distance:
+            return False
+        if position["type"] == self.POSITION_TYPE_BUY:
+            sl_gap, tp_gap = price - position["sl"], position["tp"] - price
+        else:
+            sl_gap, tp_gap = position["sl"] - price, price - position["tp"]
+        return bool((position["sl"] and sl_gap <= distance) or (position["tp"] and tp_gap <= distance))
+
+    def order_send(self, request):
+        self.__wait__()
+        action = request.get("action")
+        symbol = self.symbols.get(request.get("symbol"))
+        if action == self.TRADE_ACTION_DEAL:
+            if symbol is None:
+                return self.__result__(self.TRADE_RETCODE_INVALID)
+            volume = request.get("volume", 0.0)
+            if "position" in request:
+                ticket = request["position"]
+                if ticket not in self.positions:
+                    return self.__result__(self.TRADE_RETCODE_INVALID, symbol=symbol)
+                price = symbol.bid() if self.positions[ticket]["type"] == self.POSITION_TYPE_BUY else symbol.ask()
+                self.__close__(ticket, price, "close")
+                return self.__result__(self.TRADE_RETCODE_DONE, ticket, volume, price, symbol)
+            if volume < symbol.volume_min:
+                return self.__result__(self.TRADE_RETCODE_INVALID_VOLUME, symbol=symbol)
+            position_type = self.POSITION_TYPE_BUY if request["type"] == self.ORDER_TYPE_BUY else self.POSITION_TYPE_SELL
+            price = symbol.ask() if position_type == self.POSITION_TYPE_BUY else symbol.bid()
+            sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+            if not self.__validStops__(symbol, position_type, price, sl, tp):
+                return self.__result__(self.TRADE_RETCODE_INVALID_STOPS, symbol=symbol)
+            ticket = self.__open__(symbol, position_type, volume, price, sl, tp, comment=request.get("comment", ""))
+            return self.__result__(self.TRADE_RETCODE_DONE, ticket, volume, price, symbol)
+
+        if action == self.TRADE_ACTION_PENDING:
+            if symbol is None:
+                return self.__result__(self.TRADE_RETCODE_INVALID)
+            if request.get("type") not in (self.ORDER_TYPE_BUY_LIMIT, self.ORDER_TYPE_SELL_LIMIT,
+                                           self.ORDER_TYPE_BUY_STOP, self.ORDER_TYPE_SELL_STOP):
+                return self.__result__(self.TRADE_RETCODE_INVALID, symbol=symbol)
+            ticket = self.__newTicket__()
+            self.orders[ticket] = {"ticket": ticket, "time": self.now, "type": request["type"],
+                                   "volume": request.get("volume", 0.0), "price_open": request["price"],
+                                   "sl": request.get("sl", 0.0), "tp": request.get("tp", 0.0),
+                                   "symbol": symbol.name, "comment": request.get("comment", "")}
+            self.__changed__(symbol.name)
+            return self.__result__(self.TRADE_RETCODE_DONE, ticket, request.get("volume", 0.0), request["price"], symbol)
+
+        if action == self.TRADE_ACTION_SLTP:
+            position = self.positions.get(request.get("position"))
+            if position is None:
+                return self.__result__(self.TRADE_RETCODE_INVALID)
+            symbol = self.symbols[position["symbol"]]
+            sl, tp = request.get("sl", 0.0), request.get("tp", 0.0)
+            price = symbol.bid() if position["type"] == self.POSITION_TYPE_BUY else symbol.ask()
+            if sl == position["sl"] and tp == position["tp"]:
+                return self.__result__(self.TRADE_RETCODE_NO_CHANGES, symbol=symbol)
+            if self.__frozen__(symbol, position, price):
+                return self.__result__(self.TRADE_RETCODE_FROZEN, symbol=symbol)
+            if not self.__validStops__(symbol, position["type"], price, sl, tp):
+                return self.__result__(self.TRADE_RETCODE_INVALID_STOPS, symbol=symbol)
+            position["sl"], position["tp"] = sl, tp
+            self.__changed__(symbol.name)
+            return self.__result__(self.TRADE_RETCODE_DONE, position["ticket"], position["volume"], price, symbol)
+
+        if action == self.TRADE_ACTION_MODIFY:
+            order = self.orders.get(request.get("order"))
+            if order is None:
+                return self.__result__(self.TRADE_RETCODE_INVALID)
+            order["price_open"] = request.get("price", order["price_open"])
+            order["sl"] = request.get("sl", order["sl"])
+            order["tp"] = request.get("tp", order["tp"])
+            self.__changed__(order["symbol"])
+            return self.__result__(self.TRADE_RETCODE_DONE, order["ticket"], order["volume"], order["price_open"],
+                                   self.symbols[order["symbol"]])
+
+        if action == self.TRADE_ACTION_REMOVE:
+            order = self.orders.pop(request.get("order"), None)
+            if order is None:
+                return self.__result__(self.TRADE_RETCODE_INVALID)
+            self.__changed__(order["symbol"])
+            return self.__result__(self.TRADE_RETCODE_DONE, order["ticket"], symbol=self.symbols[order["symbol"]])
+
+        return self.__result__(self.TRADE_RETCODE_INVALID)
+
+    def Close(self, symbol, ticket=None, comment=None, **kwargs):
+        self.__wait__()
+        tickets = [ticket] if ticket is not None else [t for t, p in self.positions.items() if p["symbol"] == symbol]
+        closed = False
+        for ticket in tickets:
+            if ticket in self.positions:
+                owner = self.symbols[self.positions[ticket]["symbol"]]
+                position_type = self.positions[ticket]["type"]
+                self.__close__(ticket, owner.bid() if position_type == self.POSITION_TYPE_BUY else owner.ask(), "close")
+                closed = True
+        return closed
@@ -0,0 +1,82 @@
+import os
+import pickle
+import threading
+import time
+
+DEFAULT_SNAPSHOT_ROOT = os.path.join("BotCodeV2", "Data", "snapshots")
+
+SNAPSHOT_VERSION = 1
+
+
+class SnapshotStore:
+    """
+        Crash-recovery snapshots of each symbol's engine state, one file per symbol (<symbol>.snap).
+        A snapshot is written to a temporary file, flushed to disk and renamed over the previous one, so a crash
+        at any point leaves either the old or the new snapshot, never a torn one. Saving a state identical to
+        the last one written is a no-op, so snapshotting after every cycle costs a pickle and a comparison.
+    """
+
+    def __init__(self, root=DEFAULT_SNAPSHOT_ROOT, durable=True):
+        """
+            :param root: Directory of the snapshot files, created if missing
+            :param durable: fsync every snapshot before it replaces the previous one
+        """
+        self.root = root
+        self.durable = durable
+        os.makedirs(root, exist_ok=True)
+        self.written = {}
+        self.lock = threading.Lock()
+
+    def __path__(self, symbol):
+        return os.path.join(self.root, f"{symbol}.snap")
+
+    def save(self, symbol, state):
+        """
+            Writes a symbol's state unless it is unchanged since the last save.
+            :param symbol: Symbol the state belongs to
+            :param state: Picklable dict
+            :return: True if a snapshot was written
+        """
+        payload = pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL)
+        with self.lock:
+            if self.written.get(symbol) == payload:
+                return False
+            path = self.__path__(symbol)
+            temporary = f"{path}.{os.getpid()}.tmp"
+            with open(temporary, "wb") as f:
+                f.write(pickle.dumps({"version": SNAPSHOT_VERSION, "symbol": symbol, "time": time.time(),
+                                      "state": payload}, protocol=pickle.HIGHEST_PROTOCOL))
+                if self.durable:
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temporary, path)
+            self.written[symbol] = payload
+            return True
+
+    def load(self, symbol):
+        """
+            :param symbol: Symbol to restore
+            :return: (state, saved_time) of the last snapshot, None if there is none or it cannot be read
+        """
+        path = self.__path__(symbol)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "rb") as f:
+                snapshot = pickle.load(f)
+            if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("symbol") != symbol:
+                print(f"[-] Ignoring snapshot {path}: written by another version or for another symbol")
+                return None
+            state = pickle.loads(snapshot["state"])
+        except Exception as e:
+            print(f"[-] Reading snapshot {path}: {e!r}")
+            return None
+        with self.lock:
+            self.written[symbol] = snapshot["state"]
+        return state, snapshot["time"]
+
+    def remove(self, symbol):
+        with self.lock:
+            self.written.pop(symbol, None)
+            if os.path.exists(self.__path__(symbol)):
+                os.remove(self.__path__(symbol))
@@ -1,38 +1,167 @@
-import MetaTrader5 as mt5
-import pandas as pd
-from talib import abstract
 import time
+from BotCodeV2.Broker import TIME_FRAMES, getDefaultBroker
+from BotCodeV2.BrokerCache import TICK
+from BotCodeV2.OrderGateway import getOrderGateway
 from BotCodeV2.OrderManager import OrderManager
-import threading
+from BotCodeV2.PositionMonitor import getPositionMonitor
+from BotCodeV2.BarSeries import BarSeries
+from BotCodeV2.CandleStore import getCandleStore
+from BotCodeV2.IndicatorGraph import getIndicatorGraph
+from BotCodeV2.BlockOrders import ZoneIndex, getZoneCache
+from BotCodeV2.OrderReconciler import OrderReconciler
+from BotCodeV2.MarketEvents import TickTrigger
+from BotCodeV2.Tracer import getTracer, traced
+
+# Tunable constants of the strategy; Optimizer sweeps them.
+DEFAULT_PARAMS = {
+    "block_threshold": 10,      # block order candle size, in average candle sizes
+    "rsi_low": 20,              # StochRSI oversold band
+    "rsi_high": 80,             # StochRSI overbought band
+    "weight_m1": 5,             # StochRSI trend points of an M1 reading
+    "weight_m5": 10,            # StochRSI trend points of an M5 reading
+    "weight_m15": 2,            # StochRSI trend points of an M15 reading
+    "trend_cutoff": 7,          # trend points needed for a BUY or SELL signal
+    "sl_atr": 2.0,              # stop loss distance in ATRs
+    "tp_atr": 1.5,              # take profit distance in ATRs
+    "spread_trigger": None,     # event mode: spread in points whose crossings run a cycle, None for none
+    "volume_trigger": None,     # event mode: M1 tick volume that runs a cycle once per bar, None for none
+}
+
 
 class Scalper:
+    # State a StrategyHost carries over to the new instance when the strategy is swapped or reloaded. Indicator
+    # state lives in the shared IndicatorGraphs and survives on its own.
+    STATE = ("buyEntryRegions", "sellEntryRegions", "open_orders", "buy_order_open", "sell_order_open",
+             "pending_orders", "trigger")
 
-    def __init__(self, symbol, buyEntryRegion, sellEntryRegion):
+    def __init__(self, symbol, buyEntryRegion, sellEntryRegion, broker=None, live=True, monitor=None,
+                 event_driven=False, params=None, account=None, gateway=None):
+        """
+            :param symbol: Symbol to trade
+            :param buyEntryRegion: Initial buy zones as (low, high) pairs
+            :param sellEntryRegion: Initial sell zones as (low, high) pairs
+            :param broker: Broker to trade through, None for the MT5 terminal
+            :param live: True to start the 30 second loop and the position monitor thread, False to be driven
+            externally through step() (as the backtester and AsyncRuntime do)
+            :param monitor: PositionMonitor that trails the opened orders, None for the shared one of the broker
+            :param event_driven: When live, run a cycle on tick events (bar closes, zone crossings) instead of
+            every 30 seconds
+            :param params: Overrides of DEFAULT_PARAMS
+            :param account: AccountState shared between processes to read free margin from and reserve it in,
+            None to ask the terminal on every check
+            :param gateway: OrderGateway that sends the orders in the background; when None a live Scalper uses the
+            shared gateway of the broker and one driven through step() sends inline
+        """
         self.symbol = symbol
-        self.ohlc = mt5.copy_rates_from_pos(symbol, mt5.TIMEFRAME_M1, 0, 500)
-        self.ohlc = pd.DataFrame(self.ohlc)
-        self.buyEntryRegions = buyEntryRegion
-        self.sellEntryRegions = sellEntryRegion
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.live = live
+        self.tracer = getTracer()
+        self.account = account
+        self.gateway = gateway if gateway is not None or not live else getOrderGateway(self.broker)
+        self.params = dict(DEFAULT_PARAMS, **(params or {}))
+        self.candles = getCandleStore(self.broker)
+        self.zone_cache = getZoneCache(self.broker)
+        self.monitor = monitor if monitor is not None else getPositionMonitor(self.broker)
+        self.pending_orders = OrderReconciler(symbol, broker=self.broker, gateway=self.gateway)
+        self.rates = self.candles.get(symbol, self.broker.TIMEFRAME_M1, 500)
+        self.ohlc = BarSeries(self.rates)
+        m5 = getIndicatorGraph(symbol, self.broker.TIMEFRAME_M5, self.broker)
+        self.macd = m5.output("macd")
+        self.atr = m5.output("atr")
+        self.stoch_rsi = {time_frame: getIndicatorGraph(symbol, time_frame, self.broker).output("stochrsi")
+                          for time_frame in (self.broker.TIMEFRAME_M1, self.broker.TIMEFRAME_M5, self.broker.TIMEFRAME_M15)}
+        self.buyEntryRegions = ZoneIndex(buyEntryRegion)
+        self.sellEntryRegions = ZoneIndex(sellEntryRegion)
         self.open_orders = 0
         self.buy_order_open = False
         self.sell_order_open = False
-        self.run()
+        self.trigger = TickTrigger(symbol, broker=self.broker, zones=self.__zones__,
+                                   spread_threshold=self.params["spread_trigger"],
+                                   volume_threshold=self.params["volume_trigger"])
+        if self.live:
+            self.monitor.start()
+            if event_driven:
+                self.runOnEvents()
+            else:
+                self.run()
+
+    def exportState(self):
+        return {name: getattr(self, name) for name in self.STATE}
+
+    def importState(self, state):
+        """
+            Takes over the state of an earlier instance for the same symbol.
+            :param state: Dict returned by exportState(), unknown names are ignored
+            :return: None
+        """
+        for name, value in state.items():
+            if name in self.STATE:
+                setattr(self, name, value)
+        self.trigger.zones = self.__zones__
+        self.trigger.spread_threshold = self.params["spread_trigger"]
+        self.trigger.volume_threshold = self.params["volume_trigger"]
+
+    def prewarm(self):
+        """
+            Fetches the candle windows and indicators a cycle reads, so the first cycle after a market opens
+            starts from warm caches.
+            :return: None
+        """
+        with self.candles.snapshot(self.symbol):
+            self.candles.get(self.symbol, self.broker.TIMEFRAME_M5, 1000)
+            rates = self.candles.get(self.symbol, self.broker.TIMEFRAME_M5, 500)
+            self.macd.sync(rates)
+            self.atr.sync(rates)
+            for time_frame, count in ((self.broker.TIMEFRAME_M1, 200), (self.broker.TIMEFRAME_M5, 100),
+                                      (self.broker.TIMEFRAME_M15, 50)):
+                self.stoch_rsi[time_frame].sync(self.candles.get(self.symbol, time_frame, count))
+        self.broker.symbol_info(self.symbol)
+
+    def snapshot(self):
+        """
+            :return: Picklable dict of the state a restarted engine needs: the block zones, the open order flags
+            and the tickets being trailed. See restore()
+        """
+        return {"buyEntryRegions": self.buyEntryRegions.zones, "sellEntryRegions": self.sellEntryRegions.zones,
+                "open_orders": self.open_orders, "buy_order_open": self.buy_order_open,
+                "sell_order_open": self.sell_order_open,
+                "orders": sorted((manager.order_id, manager.order_type, manager.volume)
+                                 for manager in self.monitor.managed(self.symbol) if manager.order_id)}
+
+    def restore(self, snapshot):
+        """
+            Picks up from a snapshot taken before a restart and reconciles it with the terminal: tickets that
+            are still open are trailed again, closed ones are dropped, the open order flags follow the open
+            positions, and the pending orders are brought back in line with the restored zones.
+            :param snapshot: Dict returned by snapshot()
+            :return: Number of positions taken over
+        """
+        self.buyEntryRegions = ZoneIndex(snapshot["buyEntryRegions"])
+        self.sellEntryRegions = ZoneIndex(snapshot["sellEntryRegions"])
+        self.open_orders = snapshot["open_orders"]
+        positions = {position.ticket: position for position in self.broker.positions_get(symbol=self.symbol) or ()}
+        restored = 0
+        for ticket, order_type, volume in snapshot["orders"]:
+            if ticket not in positions:
+                print(f"[+] {self.symbol}: position {ticket} closed while stopped")
+                continue
+            self.monitor.register(OrderManager(self.symbol, order_type, None, None, volume=volume, broker=self.broker,
+                                               live=False, gateway=self.gateway, ticket=ticket))
+            restored += 1
+        self.buy_order_open = any(p.type == self.broker.POSITION_TYPE_BUY for p in positions.values())
+        self.sell_order_open = any(p.type == self.broker.POSITION_TYPE_SELL for p in positions.values())
+        self.__placePendingOrders__()
+        return restored
 
     def __findBlockOrders__(self):
         print("Finding Block order regions")
-        self.buyEntryRegions = []
-        self.sellEntryRegions = []
-        self.ohlc = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M5, 0, 1000), columns=['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume'])
-        self.ohlc["candle_length"] = abs(self.ohlc["close"] - self.ohlc["open"])
-        avg_order_length = self.ohlc["candle_length"].mean()
-        block_orders = self.ohlc.index[self.ohlc["candle_length"] >= 10 * avg_order_length].tolist()
-        for x in block_orders:
-            last_close = self.ohlc.iloc[x-1]["low"]
-            blk_close = self.ohlc.iloc[x]["high"]
-            if last_close < blk_close:
-                self.buyEntryRegions.append((last_close, blk_close))
-            else:
-                self.sellEntryRegions.append((self.ohlc.iloc[x]["low"], self.ohlc.iloc[x-1]["low"]))
+        with self.tracer.stage(self.symbol, "fetch"):
+            self.rates = self.candles.get(self.symbol, self.broker.TIMEFRAME_M5, 1000)
+        self.ohlc = BarSeries(self.rates)
+        with self.tracer.stage(self.symbol, "zones"):
+            buy_zones, sell_zones = self.zone_cache.find(self.symbol, self.rates, self.params["block_threshold"])
+            self.buyEntryRegions = ZoneIndex(buy_zones)
+            self.sellEntryRegions = ZoneIndex(sell_zones)
 
     def __setBuyEntryRegion__(self, buy_regions):
         self.buyEntryRegions.extend(buy_regions)
@@ -45,157 +174,131 @@ class Scalper:
             This is a function that fetches past 500 candlesticks data at an x-minute time frame
             :param time_frame: Time in minutes to fetch data for.
             :param number_of_candles: Number of candles to fetch data for
-            :return: A pandas data frame containing the data of last 1000 candlesticks
-            Dataframe columns: time, open, high, low, close, tick_volume, spread, real_volume
+            :return: None; the candles are left in self.ohlc as a BarSeries
+            Columns: time, open, high, low, close, tick_volume, spread, real_volume
         """
-        if time_frame == 5:
-            time_frame = mt5.TIMEFRAME_M5
-        elif time_frame == 15:
-            time_frame = mt5.TIMEFRAME_M15
-        elif time_frame == 30:
-            time_frame = mt5.TIMEFRAME_M30
-        elif time_frame == 60:
-            time_frame = mt5.TIMEFRAME_H1
-        else:
+        time_frame = TIME_FRAMES.get(time_frame)
+        if time_frame is None:
             return
-        rates = mt5.copy_rates_from_pos(self.symbol, time_frame, 0, number_of_candles)
-        rates_df = pd.DataFrame(rates, columns=['time', 'open', 'high', 'low', 'close', 'tick_volume', 'spread', 'real_volume'])
-        rates_df["time"] = pd.to_datetime(rates_df["time"], unit="s")
-        self.ohlc = rates_df
+        with self.tracer.stage(self.symbol, "fetch"):
+            rates = self.candles.get(self.symbol, time_frame, number_of_candles)
+        self.rates = rates
+        self.ohlc = BarSeries(rates)
 
     def __checkBlockRegion__(self):
-        latest_price = self.ohlc.iloc[-1]["open"]
-        for x in self.buyEntryRegions:
-            if x[0] <= latest_price <= x[1]:
-                return "BUY"
-        for x in self.sellEntryRegions:
-            if x[0] <= latest_price <= x[1]:
-                return "SELL"
+        latest_price = self.ohlc.open[-1]
+        if self.buyEntryRegions.contains(latest_price):
+            return "BUY"
+        if self.sellEntryRegions.contains(latest_price):
+            return "SELL"
         return None
 
     #### Open Pending Orders ####
 
-    def openPendingBuyStop(self, buy_stop_price, stop_loss_percent=5, take_profit_percent=3, lot_size=0.01):
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
+    def __pendingRequest__(self, order_type, price, stop_loss_percent=5, take_profit_percent=3, lot_size=0.01):
+        if order_type in (self.broker.ORDER_TYPE_BUY_STOP, self.broker.ORDER_TYPE_BUY_LIMIT):
+            sl = price * (1 - stop_loss_percent / 100)
+            tp = price * (1 + take_profit_percent / 100)
+        else:
+            sl = price * (1 + stop_loss_percent / 100)
+            tp = price * (1 - take_profit_percent / 100)
+        return {
+            "action": self.broker.TRADE_ACTION_PENDING,
             "symbol": self.symbol,
             "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY_STOP,
-            "price": buy_stop_price,
-            "sl": buy_stop_price * (1 - stop_loss_percent / 100),
-            "tp": buy_stop_price * (1 + take_profit_percent / 100),
+            "type": order_type,
+            "price": price,
+            "sl": sl,
+            "tp": tp,
             "deviation": 30,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
+            "type_time": self.broker.ORDER_TIME_GTC,
+            "type_filling": self.broker.ORDER_FILLING_IOC
         }
-        order = mt5.order_send(request)
+
+    def openPendingBuyStop(self, buy_stop_price, stop_loss_percent=5, take_profit_percent=3, lot_size=0.01):
+        request = self.__pendingRequest__(self.broker.ORDER_TYPE_BUY_STOP, buy_stop_price, stop_loss_percent,
+                                          take_profit_percent, lot_size)
+        order = self.broker.order_send(request)
 
     def openPendingBuyLimit(self, buy_limit_price, stop_loss_percent=5, take_profit_percent=3, lot_size=0.01):
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": self.symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_BUY_LIMIT,
-            "price": buy_limit_price,
-            "sl": buy_limit_price * (1 - stop_loss_percent / 100),
-            "tp": buy_limit_price * (1 + take_profit_percent / 100),
-            "deviation": 30,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
-        }
-        order = mt5.order_send(request)
+        request = self.__pendingRequest__(self.broker.ORDER_TYPE_BUY_LIMIT, buy_limit_price, stop_loss_percent,
+                                          take_profit_percent, lot_size)
+        order = self.broker.order_send(request)
 
     def openPendingSellStop(self, sell_stop_price, stop_loss_percent=5, take_profit_percent=3, lot_size=0.01):
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": self.symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_SELL_STOP,
-            "price": sell_stop_price,
-            "sl": sell_stop_price * (1 + stop_loss_percent / 100),
-            "tp": sell_stop_price * (1 - take_profit_percent / 100),
-            "deviation": 30,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
-        }
-        order = mt5.order_send(request)
+        request = self.__pendingRequest__(self.broker.ORDER_TYPE_SELL_STOP, sell_stop_price, stop_loss_percent,
+                                          take_profit_percent, lot_size)
+        order = self.broker.order_send(request)
 
     def openPendingSellLimit(self, sell_limit_price, stop_loss_percent=5, take_profit_percent=3, lot_size=0.01):
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": self.symbol,
-            "volume": lot_size,
-            "type": mt5.ORDER_TYPE_SELL_LIMIT,
-            "price": sell_limit_price,
-            "sl": sell_limit_price * (1 + stop_loss_percent / 100),
-            "tp": sell_limit_price * (1 - take_profit_percent / 100),
-            "deviation": 30,
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_IOC
-        }
-        order = mt5.order_send(request)
+        request = self.__pendingRequest__(self.broker.ORDER_TYPE_SELL_LIMIT, sell_limit_price, stop_loss_percent,
+                                          take_profit_percent, lot_size)
+        order = self.broker.order_send(request)
+
+    def __desiredPendingOrders__(self, cur_price):
+        desired = [self.__pendingRequest__(self.broker.ORDER_TYPE_BUY_STOP, low)
+                   for low, high in self.buyEntryRegions.above(cur_price)]
+        desired += [self.__pendingRequest__(self.broker.ORDER_TYPE_BUY_LIMIT, low)
+                    for low, high in self.buyEntryRegions.below(cur_price)]
+        desired += [self.__pendingRequest__(self.broker.ORDER_TYPE_SELL_LIMIT, high)
+                    for low, high in self.sellEntryRegions.above(cur_price)]
+        desired += [self.__pendingRequest__(self.broker.ORDER_TYPE_SELL_STOP, high)
+                    for low, high in self.sellEntryRegions.below(cur_price)]
+        return desired
 
+    @traced("pending_orders")
     def __placePendingOrders__(self):
-        orders = mt5.orders_get(symbol=self.symbol)
-        for order in orders:
-            req = {
-                "order": order.ticket,
-                "action": mt5.TRADE_ACTION_REMOVE
-            }
-            mt5.order_send(req)
-        cur_price = mt5.symbol_info_tick(self.symbol).ask
-        for price in self.buyEntryRegions:
-            if cur_price <= price[0]:
-                self.openPendingBuyStop(price[0])
-            elif cur_price >= price[1]:
-                self.openPendingBuyLimit(price[0])
-        for price in self.sellEntryRegions:
-            if cur_price <= price[0]:
-                self.openPendingSellLimit(price[1])
-            elif cur_price >= price[1]:
-                self.openPendingSellStop(price[1])
+        cur_price = self.broker.symbol_info_tick(self.symbol).ask
+        self.pending_orders.reconcile(self.__desiredPendingOrders__(cur_price))
 
+    def __stochRSIFastD__(self, time_frame, number_of_candles):
+        stoch_rsi = self.stoch_rsi[time_frame]
+        stoch_rsi.sync(self.candles.get(self.symbol, time_frame, number_of_candles))
+        return [fastd for fastk, fastd in stoch_rsi.last(3)]
+
+    @traced("stochrsi")
     def __stochRSICalculator__(self):
-        min_data_1 = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M1, 0, 200))
-        min_data_5 = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M5, 0, 100))
-        min_data_15 = pd.DataFrame(mt5.copy_rates_from_pos(self.symbol, mt5.TIMEFRAME_M15, 0, 50))
-        rsi_1 = abstract.STOCHRSI(min_data_1)
-        rsi_5 = abstract.STOCHRSI(min_data_5)
-        rsi_15 = abstract.STOCHRSI(min_data_15)
+        rsi_1 = self.__stochRSIFastD__(self.broker.TIMEFRAME_M1, 200)
+        rsi_5 = self.__stochRSIFastD__(self.broker.TIMEFRAME_M5, 100)
+        rsi_15 = self.__stochRSIFastD__(self.broker.TIMEFRAME_M15, 50)
 
+        params = self.params
+        low, high = params["rsi_low"], params["rsi_high"]
         trend_points = 0
 
         for i in range(1, 4):
-            if rsi_5.iloc[-1 * i]["fastd"] <= 20:
-                trend_points -= 10
-            elif rsi_5.iloc[-1 * i]["fastd"] >= 80:
-                trend_points += 10
-
-            if rsi_15.iloc[-1 * i]["fastd"] <= 20:
-                trend_points -= 2
-            elif rsi_15.iloc[-1 * i]["fastd"] >= 80:
-                trend_points += 2
-
-            if rsi_1.iloc[-1 * i]["fastd"] <= 20:
-                trend_points -= 5
-            elif rsi_1.iloc[-1 * i]["fastd"] >= 80:
-                trend_points += 5
-
-        if trend_points >= 7:
+            if rsi_5[-1 * i] <= low:
+                trend_points -= params["weight_m5"]
+            elif rsi_5[-1 * i] >= high:
+                trend_points += params["weight_m5"]
+
+            if rsi_15[-1 * i] <= low:
+                trend_points -= params["weight_m15"]
+            elif rsi_15[-1 * i] >= high:
+                trend_points += params["weight_m15"]
+
+            if rsi_1[-1 * i] <= low:
+                trend_points -= params["weight_m1"]
+            elif rsi_1[-1 * i] >= high:
+                trend_points += params["weight_m1"]
+
+        if trend_points >= params["trend_cutoff"]:
             return "BUY"
 
-        if trend_points <= -7:
+        if trend_points <= -params["trend_cutoff"]:
             return "SELL"
 
         else:
             return "WAIT"
 
+    @traced("volume_trend")
     def __volumeTrend__(self):
-        data = self.ohlc[-1:-7:-1]
+        volume = self.ohlc.tick_volume[-1:-7:-1]
         points = 0
         catch = 0
         for x in range(-1, -6, -1):
-            if data.iloc[x]["tick_volume"] - data.iloc[x-1]["tick_volume"] <= 0:
+            # Compared rather than subtracted: tick_volume is unsigned.
+            if volume[x] <= volume[x-1]:
                 points += 1
             elif catch <= 2:
                 catch += 1
@@ -205,13 +308,11 @@ class Scalper:
             return True
         return False
 
+    @traced("macd")
     def __MACDCalculator__(self):
-        macd = abstract.MACD(self.ohlc)
-        macd.columns = ["macd", "signal", "hist"]
-        macd.dropna(inplace=True)
+        self.macd.sync(self.rates)
         trend_points = 0
-        for i in range(1, 6):
-            hist = macd.iloc[-1 * i]["hist"]
+        for macd, signal, hist in self.macd.last(5):
             if hist < 0:
                 trend_points -= 1
             elif hist > 0:
@@ -224,88 +325,145 @@ class Scalper:
 
     def __getMargin__(self, order_type, volume):
         if order_type == "BUY":
-            order = mt5.ORDER_TYPE_BUY
-            price = mt5.symbol_info(self.symbol).ask
+            order = self.broker.ORDER_TYPE_BUY
+            price = self.broker.symbol_info(self.symbol).ask
         else:
-            order = mt5.ORDER_TYPE_SELL
-            price = mt5.symbol_info(self.symbol).bid
+            order = self.broker.ORDER_TYPE_SELL
+            price = self.broker.symbol_info(self.symbol).bid
 
-        margin = mt5.order_calc_margin(order, self.symbol, volume, price)
+        margin = self.broker.order_calc_margin(order, self.symbol, volume, price)
         return margin
 
+    @traced("atr")
     def __ATRCalculator__(self):
-        atr = abstract.ATR(self.ohlc)
-        atr.dropna(inplace=True)
-        return atr[-1:-11:-1].mean()
+        self.atr.sync(self.rates)
+        atr = self.atr.last(10)
+        return sum(atr) / len(atr)
 
 
-    @staticmethod
-    def __getAccountFreeMargin__():
-        return 0.8 * mt5.account_info().margin_free
+    def __getAccountFreeMargin__(self):
+        if self.account is not None:
+            return self.account.available()
+        return 0.8 * self.broker.account_info().margin_free
+
+    def __reserveMargin__(self, margin):
+        if self.account is None:
+            return margin <= self.__getAccountFreeMargin__()
+        return self.account.reserve(margin)
 
     def __SlTpCalculator__(self, atr, order_type, volume):
         # 10 points = 1 pip
         # 10000 pips = 1 USD
-        buy_price = mt5.symbol_info_tick(self.symbol).ask
-        sell_price = mt5.symbol_info_tick(self.symbol).bid
-        points = mt5.symbol_info(self.symbol).point
+        buy_price = self.broker.symbol_info_tick(self.symbol).ask
+        sell_price = self.broker.symbol_info_tick(self.symbol).bid
+        points = self.broker.symbol_info(self.symbol).point
         pip = points * 10
         if order_type == "BUY":
-            sl = buy_price - (atr * 2)
-            tp = sell_price + (atr * 1.5)
+            sl = buy_price - (atr * self.params["sl_atr"])
+            tp = sell_price + (atr * self.params["tp_atr"])
         else:
-            tp = buy_price - (atr * 2)
-            sl = sell_price + (atr * 1.5)
+            tp = buy_price - (atr * self.params["sl_atr"])
+            sl = sell_price + (atr * self.params["tp_atr"])
         return sl, tp
 
+    def __openOrder__(self, order_type, sl, tp, margin=0.0, **kwargs):
+        try:
+            order = OrderManager(self.symbol, order_type, sl, tp, broker=self.broker, live=False, gateway=self.gateway,
+                                 **kwargs)
+        except Exception:
+            if self.account is not None:
+                self.account.cancel(margin)
+            raise
+        if order.future is None:
+            self.__settleOrder__(order, margin)
+        else:
+            # The callback runs after OrderManager.__placed__, so order_id is known by then.
+            order.future.add_done_callback(lambda future: self.__settleOrder__(order, margin))
+
+    def __settleOrder__(self, order, margin):
+        if self.account is not None:
+            if order.order_id:
+                self.account.commit(margin)
+            else:
+                self.account.cancel(margin)
+        self.monitor.register(order)
+
     def run(self):
         print("Market watch")
         while True:
-            self.dataFetcher()
-            self.__findBlockOrders__()
-            self.__placePendingOrders__()
-            # block = self.__checkBlockRegion__()
-            if self.buy_order_open and self.sell_order_open:
-                print("Max orders open")
-                positions = mt5.positions_get(symbol=self.symbol)
-                print(positions)
-                self.buy_order_open = False
-                self.sell_order_open = False
-                for pos in positions:
-                    if pos.type == 0:
+            self.step()
+            time.sleep(30)
+
+    def __zones__(self):
+        return ("BUY", self.buyEntryRegions), ("SELL", self.sellEntryRegions)
+
+    def runOnEvents(self, poll_interval=0.5):
+        """
+            Runs a decision cycle whenever the tick stream reports a new M1/M5 bar or a block zone crossing.
+            :param poll_interval: Seconds between tick polls
+            :return: None
+        """
+        print("Market watch (events)")
+        while True:
+            if self.trigger.poll():
+                self.step()
+            time.sleep(poll_interval)
+
+    def step(self):
+        """
+            Runs one decision cycle: refresh data and block zones, re-place pending orders and open a market
+            order when the votes agree. Every time frame is read from one candle snapshot.
+            :return: None
+        """
+        self.broker.invalidate(self.symbol, kinds=(TICK,))
+        with self.tracer.stage(self.symbol, "cycle"), self.candles.snapshot(self.symbol):
+            self.__step__()
+
+    def __step__(self):
+        self.dataFetcher()
+        self.__findBlockOrders__()
+        self.__placePendingOrders__()
+        # block = self.__checkBlockRegion__()
+        if self.buy_order_open and self.sell_order_open:
+            print("Max orders open")
+            positions = self.broker.positions_get(symbol=self.symbol)
+            print(positions)
+            self.buy_order_open = False
+            self.sell_order_open = False
+            for pos in positions:
+                if pos.type == 0:
+                    self.buy_order_open = True
+                elif pos.type == 1:
+                    self.sell_order_open = True
+        else:
+            if self.__volumeTrend__():
+                votes = []
+                votes.extend([self.__stochRSICalculator__()] * 10)
+                buy = votes.count("BUY")
+                sell = votes.count("SELL")
+                if buy >= 7 and not self.buy_order_open:
+                    min_vol = self.broker.symbol_info(self.symbol).volume_min
+                    margin = self.__getMargin__("BUY", min_vol)
+                    if self.__reserveMargin__(margin):
+                        atr = self.__ATRCalculator__()
+                        sl, tp = self.__SlTpCalculator__(atr, "BUY", min_vol)
+                        self.__openOrder__("BUY", sl, tp, margin=margin, volume=min_vol)
                         self.buy_order_open = True
-                    elif pos.type == 1:
+                    else:
+                        print("Not enough margin to place order")
+                    print("Control to main")
+                elif sell >= 7 and not self.sell_order_open:
+                    min_vol = self.broker.symbol_info(self.symbol).volume_min
+                    margin = self.__getMargin__("BUY", min_vol)
+                    if self.__reserveMargin__(margin):
+                        atr = self.__ATRCalculator__()
+                        sl, tp = self.__SlTpCalculator__(atr, "SELL", min_vol)
+                        self.__openOrder__("SELL", sl, tp, margin=margin)
                         self.sell_order_open = True
-            else:
-                if self.__volumeTrend__():
-                    votes = []
-                    votes.extend([self.__stochRSICalculator__()] * 10)
-                    buy = votes.count("BUY")
-                    sell = votes.count("SELL")
-                    if buy >= 7 and not self.buy_order_open:
-                        min_vol = mt5.symbol_info(self.symbol).volume_min
-                        if self.__getMargin__("BUY", min_vol) <= self.__getAccountFreeMargin__():
-                            atr = self.__ATRCalculator__()
-                            sl, tp = self.__SlTpCalculator__(atr, "BUY", min_vol)
-                            new_order = threading.Thread(target=OrderManager, args=(self.symbol, "BUY", sl,  tp), kwargs={"volume": min_vol})
-                            new_order.start()
-                            self.buy_order_open = True
-                        else:
-                            print("Not enough margin to place order")
-                        print("Control to main")
-                    elif sell >= 7 and not self.sell_order_open:
-                        min_vol = mt5.symbol_info(self.symbol).volume_min
-                        if self.__getMargin__("BUY", min_vol) <= self.__getAccountFreeMargin__():
-                            atr = self.__ATRCalculator__()
-                            sl, tp = self.__SlTpCalculator__(atr, "SELL", min_vol)
-                            new_order = threading.Thread(target=OrderManager, args=(self.symbol, "SELL", sl, tp))
-                            new_order.start()
-                            self.sell_order_open = True
-                        else:
-                            print("Not enough margin to place order")
-                        print("Control to main")
                     else:
-                        print("market not good")
+                        print("Not enough margin to place order")
+                    print("Control to main")
                 else:
-                    print("market not ideal")
-            time.sleep(30)
\ No newline at end of file
+                    print("market not good")
+            else:
+                print("market not ideal")
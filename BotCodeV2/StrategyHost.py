@@ -0,0 +1,251 @@
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.PositionMonitor import getPositionMonitor
+
+# Strategy name to class, or to "module:Class" so the module is only imported when a symbol uses it.
+STRATEGIES = {
+    "scalper": "BotCodeV2.Strategies.scalping:Scalper",
+}
+
+DEFAULT_STRATEGY = "scalper"
+
+
+def registerStrategy(name, strategy):
+    """
+        Makes a strategy available by name to StrategyHost and MarketManager.
+        :param name: Name used in configs
+        :param strategy: Strategy class, or "module:Class"
+        :return: None
+    """
+    STRATEGIES[name] = strategy
+
+
+def getStrategy(name):
+    """
+        :param name: Registered strategy name
+        :return: The strategy class
+    """
+    strategy = STRATEGIES.get(name)
+    if strategy is None:
+        raise KeyError(f"Unknown strategy {name!r}, registered: {sorted(STRATEGIES)}")
+    if isinstance(strategy, str):
+        module, attribute = strategy.split(":")
+        strategy = getattr(importlib.import_module(module), attribute)
+    return strategy
+
+
+def loadStrategyConfig(path):
+    """
+        Reads a strategy config: a JSON object of symbol to {"strategy": name, "params": {...}}, where the
+        entry "*" applies to every symbol not listed.
+        :param path: JSON file
+        :return: The config dict
+    """
+    with open(path) as f:
+        return json.load(f)
+
+
+class StrategyHost:
+    """
+        Runs one strategy instance per symbol and swaps strategies or their parameters at runtime.
+        A swap builds the new instance between two cycles of the symbol and hands it the state of the old one
+        (block zones, open order flags, pending order reconciler and tick trigger, as listed in the strategy's
+        STATE), so it trades from its very next cycle. Candles stay in the shared CandleStore, indicator state in
+        the shared IndicatorGraphs and open tickets in the shared PositionMonitor, so nothing is fetched or
+        recomputed again.
+        checkReload() reloads the strategy modules whose source changed and applies changes to the config
+        file; call it periodically to hot-reload.
+        With a SnapshotStore, a strategy that implements snapshot()/restore() is snapshotted after every cycle
+        and restored from its last snapshot when the symbol is added again after a restart.
+    """
+
+    def __init__(self, broker=None, monitor=None, account=None, gateway=None, config=None, snapshots=None):
+        """
+            :param broker: Broker to trade through, None for the MT5 terminal
+            :param monitor: PositionMonitor trailing the opened orders, None for the shared one of the broker
+            :param account: AccountState passed to the strategies
+            :param gateway: OrderGateway passed to the strategies, None to send orders inline
+            :param config: Strategy config dict or path of a JSON config file (see loadStrategyConfig), None to
+            run DEFAULT_STRATEGY everywhere
+            :param snapshots: SnapshotStore to save the strategies' state to and restore it from, None to keep it
+            in memory only
+        """
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.monitor = monitor if monitor is not None else getPositionMonitor(self.broker)
+        self.account = account
+        self.gateway = gateway
+        self.snapshots = snapshots
+        self.config_path = config if isinstance(config, str) else None
+        self.config = loadStrategyConfig(config) if self.config_path else dict(config or {})
+        self.config_mtime = os.path.getmtime(self.config_path) if self.config_path else None
+        self.strategies = {}
+        self.specs = {}
+        self.locks = {}
+        self.mtimes = {}
+        self.lock = threading.Lock()
+
+    def __spec__(self, symbol):
+        spec = dict(self.config.get("*", {}), **self.config.get(symbol, {}))
+        return spec.get("strategy", DEFAULT_STRATEGY), spec.get("params") or {}
+
+    def __build__(self, symbol, strategy, params, previous=None):
+        instance = strategy(symbol, [], [], broker=self.broker, live=False, monitor=self.monitor, params=params,
+                            account=self.account, gateway=self.gateway)
+        if previous is not None and hasattr(previous, "exportState") and hasattr(instance, "importState"):
+            instance.importState(previous.exportState())
+        module = sys.modules.get(strategy.__module__)
+        path = getattr(module, "__file__", None)
+        if path is not None and path not in self.mtimes:
+            self.mtimes[path] = os.path.getmtime(path)
+        return instance
+
+    def add(self, symbol, strategy=None, params=None):
+        """
+            Starts hosting a symbol.
+            :param symbol: Symbol to trade
+            :param strategy: Registered strategy name, None to take it from the config
+            :param params: Strategy parameters, None to take them from the config
+            :return: The strategy instance
+        """
+        name, configured = self.__spec__(symbol)
+        name = strategy if strategy is not None else name
+        params = params if params is not None else configured
+        instance = self.__build__(symbol, getStrategy(name), params)
+        self.__restore__(symbol, instance)
+        with self.lock:
+            self.locks.setdefault(symbol, threading.Lock())
+            self.strategies[symbol] = instance
+            self.specs[symbol] = (name, params)
+        return instance
+
+    def __restore__(self, symbol, instance):
+        if self.snapshots is None or not hasattr(instance, "restore"):
+            return
+        loaded = self.snapshots.load(symbol)
+        if loaded is None:
+            return
+        state, saved = loaded
+        try:
+            restored = instance.restore(state)
+        except Exception as e:
+            # A snapshot that no longer fits the strategy is not worth failing the start for.
+            print(f"[-] {symbol}: restoring snapshot {e!r}")
+            return
+        print(f"[+] {symbol}: restored snapshot taken {time.time() - saved:.0f}s ago, {restored} positions taken over")
+
+    def __save__(self, symbol):
+        instance = self.strategies.get(symbol)
+        if self.snapshots is not None and hasattr(instance, "snapshot"):
+            self.snapshots.save(symbol, instance.snapshot())
+
+    def saveSnapshots(self):
+        """
+            Snapshots every hosted symbol whose state changed since its last snapshot. Orders placed through an
+            OrderGateway get their ticket after the cycle that placed them, so call this periodically too.
+            :return: None
+        """
+        for symbol in list(self.strategies):
+            with self.locks[symbol]:
+                self.__save__(symbol)
+
+    def remove(self, symbol):
+        with self.lock:
+            self.specs.pop(symbol, None)
+            return self.strategies.pop(symbol, None)
+
+    def get(self, symbol):
+        return self.strategies[symbol]
+
+    def swap(self, symbol, strategy=None, params=None):
+        """
+            Replaces the strategy or the parameters of a symbol, keeping its state. Waits for a running cycle
+            of the symbol to finish first.
+            :param symbol: Hosted symbol
+            :param strategy: Registered strategy name, None to keep the current one
+            :param params: New strategy parameters, None to keep the current ones
+            :return: The new strategy instance
+        """
+        name, current = self.specs[symbol]
+        name = strategy if strategy is not None else name
+        params = params if params is not None else current
+        with self.locks[symbol]:
+            instance = self.__build__(symbol, getStrategy(name), params, previous=self.strategies[symbol])
+            with self.lock:
+                self.strategies[symbol] = instance
+                self.specs[symbol] = (name, params)
+        print(f"[+] {symbol}: running {name} with {params}")
+        return instance
+
+    def step(self, symbol):
+        """
+            Runs one cycle of a symbol's strategy.
+            :return: None
+        """
+        with self.locks[symbol]:
+            try:
+                self.strategies[symbol].step()
+            finally:
+                self.__save__(symbol)
+
+    def prewarm(self, symbol):
+        """
+            Warms the caches of a symbol's strategy ahead of its market opening, if the strategy supports it.
+            :return: None
+        """
+        instance = self.strategies[symbol]
+        if hasattr(instance, "prewarm"):
+            with self.locks[symbol]:
+                instance.prewarm()
+
+    def reload(self, paths=None):
+        """
+            Re-imports strategy modules and moves every symbol using them onto the new code.
+            :param paths: Source files to reload, None for every module a hosted strategy comes from
+            :return: List of reloaded module names
+        """
+        modules = {type(instance).__module__ for instance in list(self.strategies.values())}
+        reloaded = []
+        for name in sorted(modules):
+            module = sys.modules.get(name)
+            if module is None or (paths is not None and getattr(module, "__file__", None) not in paths):
+                continue
+            try:
+                importlib.reload(module)
+            except Exception as e:
+                # Keep trading on the code that is loaded rather than stopping on a broken edit.
+                print(f"[-] Reloading {name}: {e!r}")
+                continue
+            self.mtimes[module.__file__] = os.path.getmtime(module.__file__)
+            reloaded.append(name)
+        for symbol, instance in list(self.strategies.items()):
+            if type(instance).__module__ in reloaded:
+                self.swap(symbol)
+        return reloaded
+
+    def checkReload(self):
+        """
+            Reloads changed strategy source files and applies a changed config file.
+            :return: True if anything was reloaded or swapped
+        """
+        changed = [path for path, mtime in list(self.mtimes.items())
+                   if os.path.exists(path) and os.path.getmtime(path) != mtime]
+        reloaded = self.reload(changed) if changed else []
+        swapped = False
+        if self.config_path is not None and os.path.getmtime(self.config_path) != self.config_mtime:
+            self.config_mtime = os.path.getmtime(self.config_path)
+            try:
+                self.config = loadStrategyConfig(self.config_path)
+            except (OSError, ValueError) as e:
+                print(f"[-] Reading {self.config_path}: {e!r}")
+                return bool(reloaded)
+            for symbol in list(self.strategies):
+                spec = self.__spec__(symbol)
+                if spec != self.specs.get(symbol):
+                    self.swap(symbol, *spec)
+                    swapped = True
+        return bool(reloaded) or swapped
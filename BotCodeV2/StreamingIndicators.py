@@ -0,0 +1,339 @@
+from collections import deque
+
+
+class EMA:
+    """
+        Exponential moving average over a stream of values, seeded with the simple average of the first
+        period values the same way TA-Lib does.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.k = 2.0 / (period + 1)
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def step(self, x, commit=True):
+        """
+            Feeds one value to the average.
+            :param x: The new value
+            :param commit: False to only preview the result without changing the state
+            :return: The average after x, or None while warming up
+        """
+        if self.value is not None:
+            value = self.value + self.k * (x - self.value)
+        elif self.count + 1 == self.period:
+            value = (self.total + x) / self.period
+        else:
+            value = None
+        if commit:
+            self.count += 1
+            if self.value is None:
+                self.total += x
+            self.value = value
+        return value
+
+
+class SMA:
+    """
+        Simple moving average over a stream of values.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.total = 0.0
+
+    def step(self, x, commit=True):
+        total = self.total + x
+        if len(self.window) == self.period:
+            total -= self.window[0]
+        value = total / self.period if len(self.window) + 1 >= self.period else None
+        if commit:
+            self.window.append(x)
+            self.total = total
+        return value
+
+
+class Wilder:
+    """
+        Wilder smoothing (as used by ATR and RSI): a simple average of the first period values followed by
+        avg = (avg * (period - 1) + x) / period.
+    """
+
+    def __init__(self, period):
+        self.period = period
+        self.count = 0
+        self.total = 0.0
+        self.value = None
+
+    def step(self, x, commit=True):
+        if self.value is not None:
+            value = (self.value * (self.period - 1) + x) / self.period
+        elif self.count + 1 == self.period:
+            value = (self.total + x) / self.period
+        else:
+            value = None
+        if commit:
+            self.count += 1
+            if self.value is None:
+                self.total += x
+            self.value = value
+        return value
+
+
+class StreamingIndicator:
+    """
+        Base class for indicators that update in constant time per bar.
+
+        update() with closed=True commits a finished bar to the state; closed=False evaluates the
+        still-forming bar without touching the committed state, so the live bar can change any number of
+        times before it closes. Committed outputs are kept in a short history for the voting logic.
+    """
+    last_time = None
+    live = None
+
+    def __init__(self, history=100):
+        self.values = deque(maxlen=history)
+        self.last_time = None
+        self.live = None
+
+    def __step__(self, bar, commit):
+        raise NotImplementedError
+
+    def update(self, bar, closed=True):
+        """
+            Feeds one bar to the indicator.
+            :param bar: A candle exposing "time", "high", "low" and "close" (a row of a rates array or a dict)
+            :param closed: True when the bar has closed, False when it is still forming
+            :return: The indicator value for this bar, or None while warming up
+        """
+        value = self.__step__(bar, closed)
+        if closed:
+            if value is not None:
+                self.values.append(value)
+            self.last_time = bar["time"]
+            self.live = None
+        else:
+            self.live = value
+        return value
+
+    def reset(self):
+        self.__init__(self.values.maxlen)
+
+    def seed(self, rates, last_closed=True):
+        """
+            Fast-forwards the indicator through a block of history.
+            :param rates: Structured array of candles or a BarSeries, oldest first
+            :param last_closed: False to treat the last candle as the still-forming bar
+            :return: None
+        """
+        count = len(rates)
+        for i in range(count):
+            self.update(rates[i], closed=last_closed or i < count - 1)
+
+    def sync(self, rates):
+        """
+            Brings the indicator up to date with a window of candles whose last candle is the forming bar.
+            Only the candles newer than the last committed bar are processed, so a call costs O(new bars).
+            If the window does not overlap the committed bars the indicator is reseeded from it.
+            :param rates: Structured array of candles or a BarSeries, oldest first
+            :return: None
+        """
+        if len(rates) == 0:
+            return
+        if self.last_time is None or rates[0]["time"] > self.last_time:
+            self.reset()
+            self.seed(rates, last_closed=False)
+            return
+        times = rates["time"]
+        start = len(rates) - 1
+        while start > 0 and times[start - 1] > self.last_time:
+            start -= 1
+        self.seed(rates[start:], last_closed=False)
+
+    def last(self, count):
+        """
+            Returns the newest indicator values, oldest first, including the forming bar if there is one.
+            :param count: Number of values to return
+            :return: A list of at most count values
+        """
+        values = list(self.values)
+        if self.live is not None:
+            values.append(self.live)
+        return values[-count:]
+
+
+class MACD(StreamingIndicator):
+    """
+        Streaming MACD, returns (macd, signal, hist) per bar like talib.MACD.
+    """
+
+    def __init__(self, history=100, fastperiod=12, slowperiod=26, signalperiod=9):
+        super().__init__(history)
+        self.fastperiod = fastperiod
+        self.slowperiod = slowperiod
+        self.signalperiod = signalperiod
+        self.count = 0
+        self.fast = EMA(fastperiod)
+        self.slow = EMA(slowperiod)
+        self.signal = EMA(signalperiod)
+
+    def reset(self):
+        self.__init__(self.values.maxlen, self.fastperiod, self.slowperiod, self.signalperiod)
+
+    def __step__(self, bar, commit):
+        close = float(bar["close"])
+        # TA-Lib seeds the fast EMA so that both averages produce their first value on the same bar.
+        fast = None
+        if self.count >= self.slowperiod - self.fastperiod:
+            fast = self.fast.step(close, commit)
+        slow = self.slow.step(close, commit)
+        if commit:
+            self.count += 1
+        if fast is None or slow is None:
+            return None
+        macd = fast - slow
+        signal = self.signal.step(macd, commit)
+        if signal is None:
+            return None
+        return macd, signal, macd - signal
+
+
+class ATR(StreamingIndicator):
+    """
+        Streaming average true range, matches talib.ATR.
+    """
+    prev_close = None
+
+    def __init__(self, history=100, timeperiod=14):
+        super().__init__(history)
+        self.timeperiod = timeperiod
+        self.average = Wilder(timeperiod)
+        self.prev_close = None
+
+    def reset(self):
+        self.__init__(self.values.maxlen, self.timeperiod)
+
+    def __step__(self, bar, commit):
+        high, low, close = float(bar["high"]), float(bar["low"]), float(bar["close"])
+        prev_close = self.prev_close
+        if commit:
+            self.prev_close = close
+        if prev_close is None:
+            return None
+        true_range = max(high - low, abs(high - prev_close), abs(low - prev_close))
+        return self.average.step(true_range, commit)
+
+
+class NATR(ATR):
+    """
+        Streaming normalized average true range (ATR as a percentage of close), matches talib.NATR.
+    """
+
+    def __step__(self, bar, commit):
+        atr = super().__step__(bar, commit)
+        if atr is None:
+            return None
+        close = float(bar["close"])
+        return atr / close * 100 if close != 0 else 0.0
+
+
+class RSI(StreamingIndicator):
+    """
+        Streaming relative strength index, matches talib.RSI.
+    """
+    prev_close = None
+
+    def __init__(self, history=100, timeperiod=14):
+        super().__init__(history)
+        self.timeperiod = timeperiod
+        self.prev_close = None
+        self.gain = Wilder(timeperiod)
+        self.loss = Wilder(timeperiod)
+
+    def reset(self):
+        self.__init__(self.values.maxlen, self.timeperiod)
+
+    def __step__(self, bar, commit):
+        close = float(bar["close"])
+        prev_close = self.prev_close
+        if commit:
+            self.prev_close = close
+        if prev_close is None:
+            return None
+        change = close - prev_close
+        gain = self.gain.step(max(change, 0.0), commit)
+        loss = self.loss.step(max(-change, 0.0), commit)
+        if gain is None:
+            return None
+        return 100 * gain / (gain + loss) if gain + loss != 0 else 0.0
+
+
+class STOCHRSI(StreamingIndicator):
+    """
+        Streaming stochastic RSI, returns (fastk, fastd) per bar like talib.STOCHRSI with fastd_matype=0.
+    """
+
+    def __init__(self, history=100, timeperiod=14, fastk_period=5, fastd_period=3):
+        super().__init__(history)
+        self.timeperiod = timeperiod
+        self.fastk_period = fastk_period
+        self.fastd_period = fastd_period
+        self.rsi = RSI(1, timeperiod)
+        self.window = deque(maxlen=fastk_period)
+        self.fastd = SMA(fastd_period)
+
+    def reset(self):
+        self.__init__(self.values.maxlen, self.timeperiod, self.fastk_period, self.fastd_period)
+
+    def __step__(self, bar, commit):
+        rsi = self.rsi.__step__(bar, commit)
+        if rsi is None:
+            return None
+        window = list(self.window)[1:] if len(self.window) == self.fastk_period else list(self.window)
+        window.append(rsi)
+        if commit:
+            self.window.append(rsi)
+        if len(window) < self.fastk_period:
+            return None
+        lowest, highest = min(window), max(window)
+        fastk = (rsi - lowest) / (highest - lowest) * 100 if highest != lowest else 0.0
+        fastd = self.fastd.step(fastk, commit)
+        if fastd is None:
+            return None
+        return fastk, fastd
+
+
+class AROON(StreamingIndicator):
+    """
+        Streaming Aroon oscillator lines, returns (aroondown, aroonup) per bar like talib.AROON.
+    """
+
+    def __init__(self, history=100, timeperiod=14):
+        super().__init__(history)
+        self.timeperiod = timeperiod
+        self.highs = deque(maxlen=timeperiod)
+        self.lows = deque(maxlen=timeperiod)
+
+    def reset(self):
+        self.__init__(self.values.maxlen, self.timeperiod)
+
+    def __step__(self, bar, commit):
+        high, low = float(bar["high"]), float(bar["low"])
+        ready = len(self.highs) == self.timeperiod
+        highs = list(self.highs) + [high]
+        lows = list(self.lows) + [low]
+        if commit:
+            self.highs.append(high)
+            self.lows.append(low)
+        if not ready:
+            return None
+        # Ties go to the most recent bar, as in TA-Lib.
+        highest = max(range(len(highs)), key=lambda i: (highs[i], i))
+        lowest = max(range(len(lows)), key=lambda i: (-lows[i], i))
+        factor = 100.0 / self.timeperiod
+        aroonup = factor * (self.timeperiod - (len(highs) - 1 - highest))
+        aroondown = factor * (self.timeperiod - (len(lows) - 1 - lowest))
+        return aroondown, aroonup
@@ -0,0 +1,244 @@
+import contextlib
+import functools
+import json
+import math
+import sys
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Histogram:
+    """
+        Latency histogram with a fixed number of log-spaced buckets (about 5% wide, 1us to 1000s), so memory
+        does not grow with the number of samples. Percentiles are accurate to the bucket width.
+    """
+    GROWTH = 1.05
+    FLOOR = 1e-6
+    BUCKETS = int(math.log(1e9) / math.log(GROWTH)) + 2
+
+    def __init__(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, seconds):
+        if seconds <= self.FLOOR:
+            bucket = 0
+        else:
+            bucket = min(int(math.log(seconds / self.FLOOR) / math.log(self.GROWTH)) + 1, self.BUCKETS - 1)
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """
+            :param percent: Percentile between 0 and 100
+            :return: Upper edge of the bucket holding the percentile, in seconds, capped at the maximum seen
+        """
+        if self.count == 0:
+            return 0.0
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= max(rank, 1):
+                return min(self.FLOOR * self.GROWTH ** bucket, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count * 1000 if self.count else 0.0,
+            "p50_ms": self.percentile(50) * 1000,
+            "p99_ms": self.percentile(99) * 1000,
+            "max_ms": self.max * 1000,
+        }
+
+
+class Stage:
+    """
+        Context manager timing one stage into a histogram.
+    """
+    __slots__ = ("histogram", "started")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.record(time.perf_counter() - self.started)
+        return False
+
+
+class Tracer:
+    """
+        Records how long each stage of the trading hot path takes, per symbol and stage, into fixed-memory
+        histograms. Stats can be dumped to a JSON file or served as JSON on a local HTTP endpoint, and a
+        sampling profiler can be switched on and off while the bot runs.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.histograms = {}
+        self.lock = threading.Lock()
+        self.null = contextlib.nullcontext()
+        self.server = None
+        self.profiler = None
+        self.samples = Counter()
+
+    def __histogram__(self, symbol, stage):
+        histogram = self.histograms.get((symbol, stage))
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault((symbol, stage), Histogram())
+        return histogram
+
+    def stage(self, symbol, stage):
+        """
+            :param symbol: Symbol the work is for
+            :param stage: Stage name, e.g. "fetch", "macd", "order_send"
+            :return: Context manager timing the block, a no-op when tracing is off
+        """
+        if not self.enabled:
+            return self.null
+        return Stage(self.__histogram__(symbol, stage))
+
+    def record(self, symbol, stage, seconds):
+        if self.enabled:
+            self.__histogram__(symbol, stage).record(seconds)
+
+    def summary(self):
+        """
+            :return: Dict of symbol to dict of stage to count, mean, p50, p99 and max in milliseconds
+        """
+        with self.lock:
+            items = list(self.histograms.items())
+        stats = {}
+        for (symbol, stage), histogram in items:
+            stats.setdefault(symbol, {})[stage] = histogram.summary()
+        return stats
+
+    def reset(self):
+        with self.lock:
+            self.histograms = {}
+            self.samples = Counter()
+
+    def dump(self, path):
+        """
+            Writes the summary and the profiler samples to a JSON file.
+            :param path: Output file
+            :return: None
+        """
+        with open(path, "w") as f:
+            json.dump({"stages": self.summary(), "profile": self.profile()}, f, indent=2)
+
+    #### Sampling profiler ####
+
+    def __sample__(self, interval, stop):
+        own = threading.get_ident()
+        while not stop.wait(interval):
+            for thread, frame in sys._current_frames().items():
+                if thread == own:
+                    continue
+                code = frame.f_code
+                self.samples[f"{code.co_name} ({code.co_filename}:{frame.f_lineno})"] += 1
+
+    def startProfiler(self, interval=0.005):
+        """
+            Starts sampling the innermost frame of every thread.
+            :param interval: Seconds between samples
+            :return: None
+        """
+        with self.lock:
+            if self.profiler is None:
+                stop = threading.Event()
+                thread = threading.Thread(target=self.__sample__, args=(interval, stop), daemon=True)
+                self.profiler = (thread, stop)
+                thread.start()
+
+    def stopProfiler(self):
+        with self.lock:
+            profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler[1].set()
+            profiler[0].join()
+
+    def profile(self, limit=30):
+        """
+            :param limit: Number of entries to return
+            :return: The most sampled code locations as (location, samples) pairs
+        """
+        return self.samples.most_common(limit)
+
+    #### Local endpoint ####
+
+    def serve(self, port=8765, host="127.0.0.1"):
+        """
+            Serves GET /stats, /profile, /profile/start, /profile/stop, /enable and /disable as JSON on a
+            background thread.
+            :param port: TCP port to listen on
+            :param host: Interface to bind, local only by default
+            :return: None
+        """
+        tracer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                routes = {
+                    "/stats": tracer.summary,
+                    "/profile": tracer.profile,
+                    "/profile/start": lambda: tracer.startProfiler() or "started",
+                    "/profile/stop": lambda: tracer.stopProfiler() or "stopped",
+                    "/enable": lambda: setattr(tracer, "enabled", True) or "enabled",
+                    "/disable": lambda: setattr(tracer, "enabled", False) or "disabled",
+                }
+                route = routes.get(self.path)
+                if route is None:
+                    self.send_error(404)
+                    return
+                body = json.dumps(route()).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        if self.server is None:
+            self.server = ThreadingHTTPServer((host, port), Handler)
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+default_tracer = Tracer()
+
+
+def getTracer():
+    """
+        :return: The tracer shared by everything in this process
+    """
+    return default_tracer
+
+
+def traced(stage):
+    """
+        Decorator timing a method of an object with a symbol attribute as one stage of the default tracer.
+        :param stage: Stage name
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(self, *args, **kwargs):
+            with default_tracer.stage(self.symbol, stage):
+                return function(self, *args, **kwargs)
+        return wrapper
+    return decorator
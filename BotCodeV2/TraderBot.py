@@ -1,7 +1,9 @@
-import MetaTrader5 as mt5
 import pickle
-from BotCodeV2.MarketManager import MarketManager
-import multiprocessing
+from BotCodeV2.Broker import getDefaultBroker
+from BotCodeV2.AsyncRuntime import runSharded
+from BotCodeV2.HistoryStore import DEFAULT_ROOT
+from BotCodeV2.SnapshotStore import DEFAULT_SNAPSHOT_ROOT
+from BotCodeV2.TradingSessions import DEFAULT_SESSIONS
 
 
 class TraderBot:
@@ -9,8 +11,24 @@ class TraderBot:
     login_code = None
     password = None
     server = None
+    broker = None
 
-    def __init__(self):
+    def __init__(self, processes=1, workers=4, event_driven=False, history_root=DEFAULT_ROOT, trace_port=None,
+                 journal_dir=None, strategies=None, sessions=DEFAULT_SESSIONS, snapshot_root=DEFAULT_SNAPSHOT_ROOT):
+        """
+            :param processes: Number of worker processes to shard the symbols across
+            :param workers: Maximum blocking terminal calls in flight per process
+            :param event_driven: Run strategy cycles on tick events instead of every 30 seconds
+            :param history_root: Directory of the on-disk bar history used to warm start, None to disable
+            :param trace_port: Local port to serve per-stage latency stats on (one port per process from there)
+            :param journal_dir: Directory to record every terminal call to for offline replay, None to not record
+            :param strategies: Path of a JSON strategy config (see StrategyHost), edited while running to swap
+            strategies or parameters, None to run the default strategy on every symbol
+            :param sessions: Trading session schedule file; symbols idle while their market is closed. None to
+            trade every symbol around the clock
+            :param snapshot_root: Directory of the crash-recovery snapshots; a restarted bot picks up its block
+            zones and trailed positions from there. None to not snapshot
+        """
         print("Starting Trader Bot!")
         with open("BotCodeV2/Data/symbols.txt", "r") as f:
             self.symbols = f.readlines()
@@ -21,12 +39,15 @@ class TraderBot:
             self.password = data[1]
             self.server = data[2]
 
-        mt5.initialize()
-        if mt5.account_info() is None:
-            if not mt5.login(self.login_code, self.password, self.server):
+        self.broker = getDefaultBroker()
+        self.broker.initialize()
+        if self.broker.account_info() is None:
+            if not self.broker.login(self.login_code, self.password, self.server):
                 print("[-] Login error. Recheck credentials.")
                 exit()
 
-        for symbol in self.symbols:
-            p = multiprocessing.Process(target=MarketManager, args=(symbol.strip(),))
-            p.start()
\ No newline at end of file
+        symbols = [symbol.strip() for symbol in self.symbols if symbol.strip()]
+        runSharded(symbols, processes=processes, workers=workers, event_driven=event_driven,
+                   history_root=history_root, trace_port=trace_port,
+                   journal_dir=journal_dir, strategies=strategies, sessions=sessions,
+                   snapshot_root=snapshot_root)
@@ -0,0 +1,196 @@
+import bisect
+import json
+import threading
+from datetime import date, datetime, time as clock, timedelta
+from zoneinfo import ZoneInfo
+
+DEFAULT_SESSIONS = "BotCodeV2/Data/sessions.json"
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+
+def parseDays(days):
+    """
+        :param days: "Mon-Fri", "Sat,Sun", "Sun" or "*"
+        :return: Set of weekday numbers, Monday being 0
+    """
+    if days == "*":
+        return set(range(7))
+    weekdays = set()
+    for part in days.split(","):
+        first, _, last = part.strip().partition("-")
+        start = DAYS.index(first)
+        end = DAYS.index(last) if last else start
+        weekdays.update((start + i) % 7 for i in range((end - start) % 7 + 1))
+    return weekdays
+
+
+def parseMinutes(text):
+    hours, minutes = text.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+class SessionCalendar:
+    """
+        Weekly trading sessions of a market in its own time zone, minus its holidays. Sessions are given as
+        {"days": "Mon-Fri", "open": "09:30", "close": "16:00"}; a close at or before the open ends on the next
+        day, "24:00" is midnight. Sessions that touch are merged, so a market trading around the clock from
+        Sunday to Friday has one open and one close per week. A session is skipped when the local date it opens
+        on is a holiday.
+        All times are Unix timestamps in seconds.
+    """
+
+    def __init__(self, sessions, timezone="UTC", holidays=()):
+        """
+            :param sessions: List of session dicts (see above); ["24/7"] for a market that never closes
+            :param timezone: IANA time zone name the session times are in
+            :param holidays: Local dates ("YYYY-MM-DD") with no session
+        """
+        self.always_open = sessions == ["24/7"]
+        self.sessions = [] if self.always_open else [(parseDays(s.get("days", "*")), parseMinutes(s["open"]),
+                                                      parseMinutes(s["close"])) for s in sessions]
+        self.zone = ZoneInfo(timezone)
+        self.holidays = {date.fromisoformat(day) for day in holidays}
+        self.first_day = None
+        self.opens = []
+        self.closes = []
+        self.lock = threading.Lock()
+
+    def __timestamp__(self, day, minutes):
+        # Aware datetime arithmetic is in wall time, so the offset is resolved for the session's own moment.
+        return int((datetime.combine(day, clock(), tzinfo=self.zone) + timedelta(minutes=minutes)).timestamp())
+
+    def __build__(self, first_day, days=21):
+        intervals = []
+        for i in range(-1, days):
+            day = first_day + timedelta(days=i)
+            if day in self.holidays:
+                continue
+            for weekdays, start, end in self.sessions:
+                if day.weekday() in weekdays:
+                    if end <= start:
+                        end += 24 * 60
+                    intervals.append((self.__timestamp__(day, start), self.__timestamp__(day, end)))
+        intervals.sort()
+        opens, closes = [], []
+        for start, end in intervals:
+            if closes and start <= closes[-1]:
+                closes[-1] = max(closes[-1], end)
+            else:
+                opens.append(start)
+                closes.append(end)
+        self.first_day, self.opens, self.closes = first_day, opens, closes
+
+    def __interval__(self, now):
+        # Index of the first session that has not closed yet; the table covers three weeks from the week of now.
+        today = datetime.fromtimestamp(now, self.zone).date()
+        with self.lock:
+            if self.first_day is None or not self.first_day <= today < self.first_day + timedelta(days=7):
+                self.__build__(today - timedelta(days=today.weekday()))
+            i = bisect.bisect_right(self.closes, now)
+            return self.opens, self.closes, i
+
+    def isOpen(self, now):
+        if self.always_open:
+            return True
+        opens, closes, i = self.__interval__(now)
+        return i < len(opens) and opens[i] <= now
+
+    def nextOpen(self, now):
+        """
+            :return: now if the market is open, else the time it opens next; None if it has no session in the
+            next two weeks
+        """
+        if self.always_open:
+            return now
+        opens, closes, i = self.__interval__(now)
+        if i == len(opens):
+            return None
+        return max(now, opens[i])
+
+    def nextClose(self, now):
+        """
+            :return: Time the current or next session closes, None if the market never closes
+        """
+        if self.always_open:
+            return None
+        opens, closes, i = self.__interval__(now)
+        # A close at the end of the table may be the week boundary of a market that keeps trading.
+        return closes[i] if i < len(closes) - 1 else None
+
+
+class TerminalCalendar:
+    """
+        Calendar of a symbol the schedule file does not list, read from the terminal. The MT5 API exposes no
+        session times, only whether trading is enabled (trade_mode), so a disabled symbol is treated as closed
+        and checked again every recheck seconds; anything else is treated as open.
+    """
+    SYMBOL_TRADE_MODE_DISABLED = 0
+
+    def __init__(self, broker, symbol, recheck=900):
+        self.broker = broker
+        self.symbol = symbol
+        self.recheck = recheck
+
+    def isOpen(self, now):
+        info = self.broker.symbol_info(self.symbol)
+        return info is not None and getattr(info, "trade_mode", None) != self.SYMBOL_TRADE_MODE_DISABLED
+
+    def nextOpen(self, now):
+        return now if self.isOpen(now) else now + self.recheck
+
+    def nextClose(self, now):
+        return None
+
+
+class SessionSchedule:
+    """
+        Trading session calendar of every symbol, from a local schedule file with the terminal's symbol data as
+        the fallback. The file is a JSON object:
+            {"markets": {"us_stocks": {"timezone": "America/New_York", "holidays": ["2026-12-25"],
+                                       "sessions": [{"days": "Mon-Fri", "open": "09:30", "close": "16:00"}]}},
+             "symbols": {"NVDAm": "us_stocks", "*": "forex"}}
+        where "*" is the market of every symbol not listed.
+    """
+
+    def __init__(self, path=None, broker=None, recheck=900):
+        """
+            :param path: Schedule file, None to read every symbol's state from the terminal
+            :param broker: Broker to read unlisted symbols from; None treats them as always open
+            :param recheck: Seconds between terminal checks of a disabled unlisted symbol
+        """
+        self.broker = broker
+        self.recheck = recheck
+        self.markets = {}
+        self.symbols = {}
+        if path is not None:
+            with open(path) as f:
+                schedule = json.load(f)
+            self.markets = {name: SessionCalendar(market["sessions"], market.get("timezone", "UTC"),
+                                                  market.get("holidays", ()))
+                            for name, market in schedule.get("markets", {}).items()}
+            self.symbols = dict(schedule.get("symbols", {}))
+        self.calendars = {}
+
+    def calendar(self, symbol):
+        """
+            :param symbol: Symbol
+            :return: The SessionCalendar of the symbol's market, or a TerminalCalendar if the file has none
+        """
+        calendar = self.calendars.get(symbol)
+        if calendar is None:
+            market = self.symbols.get(symbol, self.symbols.get("*"))
+            if market is not None:
+                calendar = self.markets[market]
+            elif self.broker is not None:
+                calendar = TerminalCalendar(self.broker, symbol, self.recheck)
+            else:
+                calendar = SessionCalendar(["24/7"])
+            self.calendars[symbol] = calendar
+        return calendar
+
+    def isOpen(self, symbol, now):
+        return self.calendar(symbol).isOpen(now)
+
+    def nextOpen(self, symbol, now):
+        return self.calendar(symbol).nextOpen(now)
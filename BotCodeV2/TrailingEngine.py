@@ -0,0 +1,143 @@
+import threading
+import numpy as np
+from BotCodeV2.Broker import getDefaultBroker
+
+
+class TrailingEngine:
+    """
+        Trails the SL/TP of many positions in one vectorized pass. The symbol spec, tick and margin are read once
+        per symbol (margin once per side and volume) instead of once per position, and the trailing rule of
+        OrderManager is evaluated for every position at once.
+        A modify is only sent when the new SL is at least min_change points away from the position's current
+        SL, when the new levels respect the symbol's stops level (trade_stops_level) and when the position is
+        not frozen by the freeze level (trade_freeze_level), so the modify traffic follows price movement
+        instead of the poll rate and requests the terminal would reject are never sent. The SL goes past the
+        entry by the price move that earns the margin back plus 1.5 ATR, and the TP is pushed out by 2 ATR on
+        every modify, so its move alone does not justify one. The SL is compared with the position as the
+        terminal reports it, so a modify that was rejected or never sent is sent again on the next pass; one still
+        queued in the OrderGateway is replaced there by the new one. Levels that break the stops level are logged
+        once per position and counted as invalid.
+    """
+
+    def __init__(self, broker=None, min_change=10):
+        """
+            :param broker: Broker of the account, None for the MT5 terminal
+            :param min_change: Points the SL has to move by before a modify is sent
+        """
+        self.broker = broker if broker is not None else getDefaultBroker()
+        self.min_change = min_change
+        self.lock = threading.Lock()
+        self.counts = {"evaluated": 0, "triggered": 0, "sent": 0, "unchanged": 0, "invalid": 0, "frozen": 0}
+        # Positions whose levels were logged as invalid, so each is reported once until they become valid.
+        self.invalid = set()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def forget(self, tickets):
+        """
+            Drops what is kept about closed positions.
+            :param tickets: Tickets of the closed positions
+            :return: None
+        """
+        with self.lock:
+            self.invalid.difference_update(tickets)
+
+    def __margins__(self, pairs, ticks):
+        margins = {}
+        for position, manager in pairs:
+            key = (position.symbol, manager.order_type, manager.volume)
+            if key not in margins:
+                order = self.broker.ORDER_TYPE_BUY if manager.order_type == "BUY" else self.broker.ORDER_TYPE_SELL
+                margins[key] = self.broker.order_calc_margin(order, position.symbol, manager.volume,
+                                                             ticks[position.symbol].ask)
+        return margins
+
+    def trail(self, pairs, atr):
+        """
+            Runs one trailing pass.
+            :param pairs: List of (position, manager): a position as returned by positions_get and the
+            OrderManager that opened it
+            :param atr: Function of a symbol returning its current M5 ATR; only called for symbols with a
+            position that triggered
+            :return: Number of modifies sent
+        """
+        if not pairs:
+            return 0
+        rows = np.array([(manager.order_type == "BUY", position.profit, position.price_current, position.tp)
+                         for position, manager in pairs], dtype=float)
+        # OrderManager's rule: once enough profit is locked in, SL moves past the entry by the price move that
+        # earns the margin back plus 1.5 ATR, and TP out by 2 ATR, on the profit side of each direction.
+        buy_order, profit, price, tp = rows.T
+        triggered = np.where(buy_order.astype(bool), profit >= 0.8 * (tp - price), profit >= 0.6 * (price - tp))
+        with self.lock:
+            self.counts["evaluated"] += len(pairs)
+            self.counts["triggered"] += int(triggered.sum())
+        # Only the triggered positions need the symbol spec, tick, margin and ATR.
+        pairs = [pairs[i] for i in np.flatnonzero(triggered)]
+        if not pairs:
+            return 0
+        symbols = {position.symbol for position, manager in pairs}
+        specs = {symbol: self.broker.symbol_info(symbol) for symbol in symbols}
+        ticks = {symbol: self.broker.symbol_info_tick(symbol) for symbol in symbols}
+        atr = {symbol: atr(symbol) for symbol in symbols}
+        margins = self.__margins__(pairs, ticks)
+        rows = []
+        for position, manager in pairs:
+            spec = specs[position.symbol]
+            rows.append((position.type == self.broker.POSITION_TYPE_BUY, position.price_open, position.price_current,
+                         position.sl, position.tp, atr[position.symbol], spec.point, spec.trade_stops_level,
+                         spec.trade_freeze_level, margins[(position.symbol, manager.order_type, manager.volume)],
+                         position.volume * spec.trade_contract_size))
+        (buy, price_open, price, sl, tp, atrs, point, stops_level, freeze_level, margin,
+         units) = np.array(rows, dtype=float).T
+        buy = buy.astype(bool)
+        stops = stops_level * point
+        freeze = freeze_level * point
+        # The margin is in account currency; divided by the position size it is a price distance.
+        direction = np.where(buy, 1.0, -1.0)
+        new_sl = price_open + direction * (margin / units + 1.5 * atrs)
+        new_tp = tp + direction * 2 * atrs
+
+        changed = np.abs(new_sl - sl) >= self.min_change * point
+        # The terminal rejects stops closer to the price than the stops level ...
+        valid = np.where(buy, (new_sl <= price - stops) & (new_tp >= price + stops),
+                         (new_sl >= price + stops) & (new_tp <= price - stops))
+        # ... and any change to a position whose current SL or TP is within the freeze level of the price.
+        sl_gap = np.where(buy, price - sl, sl - price)
+        tp_gap = np.where(buy, tp - price, price - tp)
+        frozen = (freeze > 0) & (((sl > 0) & (sl_gap <= freeze)) | ((tp > 0) & (tp_gap <= freeze)))
+        send = changed & valid & ~frozen
+
+        with self.lock:
+            self.counts["unchanged"] += int((~changed).sum())
+            self.counts["invalid"] += int((changed & ~valid).sum())
+            self.counts["frozen"] += int((changed & valid & frozen).sum())
+            self.counts["sent"] += int(send.sum())
+            report = []
+            for i in range(len(pairs)):
+                ticket = pairs[i][0].ticket
+                if changed[i] and not valid[i]:
+                    if ticket not in self.invalid:
+                        self.invalid.add(ticket)
+                        report.append(i)
+                else:
+                    self.invalid.discard(ticket)
+        for i in report:
+            position = pairs[i][0]
+            print(f"[-] {position.symbol}: trailing SL {new_sl[i]:.5f} / TP {new_tp[i]:.5f} of position "
+                  f"{position.ticket} is within the stops level of price {price[i]:.5f}, not sent")
+        for i in np.flatnonzero(send):
+            pairs[i][1].setStopLossTakeProfit(float(new_sl[i]), float(new_tp[i]))
+        return int(send.sum())
+
+
+def getTrailingEngine(broker=None):
+    """
+        Returns the trailing engine shared by everything in this process that trades through broker.
+        :param broker: A Broker, or None for the default MT5 terminal
+        :return: A TrailingEngine
+    """
+    broker = broker if broker is not None else getDefaultBroker()
+    return broker.shared("trailing", lambda: TrailingEngine(broker))
@@ -1,6 +1,6 @@
 from BotCodeV2.TraderBot import TraderBot
-import MetaTrader5 as mt5
+from BotCodeV2.Broker import getDefaultBroker
 
 if __name__ == '__main__':
-    mt5.initialize()
+    getDefaultBroker().initialize()
     tb = TraderBot()
\ No newline at end of file
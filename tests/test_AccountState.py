@@ -0,0 +1,44 @@
+from collections import namedtuple
+import pytest
+from BotCodeV2.AccountState import AccountState
+
+Info = namedtuple("Info", ["balance", "equity", "margin", "margin_free"])
+
+
+@pytest.fixture
+def state():
+    state = AccountState(create=True)
+    yield state
+    state.unlink()
+
+
+def test_nothing_is_reserved_before_the_first_publish(state):
+    assert not state.reserve(1.0)
+
+
+def test_reserve_commit_cancel(state):
+    state.publish(Info(1000.0, 1000.0, 0.0, 1000.0), exposure=0.0)
+    assert state.available() == pytest.approx(800.0)
+    assert state.reserve(500.0)
+    assert not state.reserve(400.0)
+    state.commit(500.0)
+    snapshot = state.read()
+    assert (snapshot.reserved, snapshot.settling) == (0.0, 500.0)
+    assert state.reserve(300.0)
+    state.cancel(300.0)
+    assert state.read().reserved == 0.0
+    state.publish(Info(1000.0, 1000.0, 500.0, 500.0), exposure=0.0, settled=500.0)
+    snapshot = state.read()
+    assert snapshot.settling == 0.0 and snapshot.generation == 2
+    assert state.values[0] % 2 == 0
+
+
+def test_other_processes_attach_by_name(state):
+    state.publish(Info(1000.0, 900.0, 0.0, 900.0), exposure=5.0)
+    attached = AccountState(state.name, state.lock)
+    try:
+        assert attached.read().equity == 900.0
+        assert attached.reserve(100.0)
+        assert state.read().reserved == 100.0
+    finally:
+        attached.close()
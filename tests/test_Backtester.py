@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from BotCodeV2.Backtester import Backtester, loadRates
+from BotCodeV2.SimulatedBroker import syntheticRates
+
+
+def data():
+    return {"A": syntheticRates(8000, seed=3), "B": syntheticRates(8000, seed=4)}
+
+
+def test_a_backtest_is_deterministic():
+    first, second = Backtester(data()).run(), Backtester(data()).run()
+    assert first["fills"]
+    assert first["fills"] == second["fills"]
+    assert first["pnl"] == second["pnl"]
+    # Every position is closed by the end, so the balance holds the whole result.
+    assert first["pnl"] == pytest.approx(sum(fill.profit for fill in first["fills"]))
+
+
+def test_candidates_trade_as_if_run_alone():
+    candidates = [None, {"sl_atr": 1.0, "tp_atr": 3.0}, {"block_threshold": 8}]
+    together = Backtester(data()).runCandidates(candidates)
+    for params, report in zip(candidates, together):
+        alone = Backtester(data(), params=params).run()
+        assert report["fills"] == alone["fills"]
+        assert report["pnl"] == alone["pnl"]
+
+
+def test_rates_load_from_csv_and_npy(tmp_path):
+    rates = syntheticRates(50)
+    np.save(tmp_path / "A.npy", rates[::-1])
+    with open(tmp_path / "A.csv", "w") as f:
+        f.write("Time,Open,High,Low,Close\n")
+        for bar in rates:
+            prices = ",".join(repr(float(bar[name])) for name in ("open", "high", "low", "close"))
+            f.write(f"{bar['time']},{prices}\n")
+    assert np.array_equal(loadRates(str(tmp_path / "A.npy")), rates)
+    loaded = loadRates(str(tmp_path / "A.csv"))
+    assert np.array_equal(loaded["time"], rates["time"])
+    for name in ("open", "high", "low", "close"):
+        assert loaded[name] == pytest.approx(rates[name], abs=1e-12)
@@ -0,0 +1,71 @@
+import warnings
+import numpy as np
+from BotCodeV2.BlockOrders import ZoneCache, ZoneIndex, findBlockOrders, findBlockOrdersBatch
+from BotCodeV2.CandleStore import RATES_DTYPE
+
+
+def candles(bodies):
+    rates = np.zeros(len(bodies), dtype=RATES_DTYPE)
+    rates["time"] = np.arange(len(bodies)) * 300
+    rates["open"] = 100.0
+    rates["close"] = 100.0 + np.asarray(bodies, dtype=float)
+    rates["high"] = np.maximum(rates["open"], rates["close"]) + 0.1
+    rates["low"] = np.minimum(rates["open"], rates["close"]) - 0.1
+    return rates
+
+
+def test_empty_window_has_no_zones():
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        buy_zones, sell_zones = findBlockOrders(np.zeros(0, dtype=RATES_DTYPE))
+    assert buy_zones.shape == (0, 2)
+    assert sell_zones.shape == (0, 2)
+
+
+def test_empty_batch_has_no_zones():
+    zones = findBlockOrdersBatch(np.zeros((3, 0), dtype=RATES_DTYPE))
+    assert len(zones) == 3
+    assert all(buy.shape == (0, 2) and sell.shape == (0, 2) for buy, sell in zones)
+
+
+def test_single_candle_has_no_zones():
+    buy_zones, sell_zones = findBlockOrders(candles([5.0]))
+    assert len(buy_zones) == 0 and len(sell_zones) == 0
+
+
+def test_block_candle_forms_a_buy_zone():
+    rates = candles([0.1] * 20 + [10.0])
+    buy_zones, sell_zones = findBlockOrders(rates, threshold=10)
+    assert buy_zones.tolist() == [[rates["low"][-2], rates["high"][-1]]]
+    assert len(sell_zones) == 0
+
+
+def test_zone_index_lookups():
+    index = ZoneIndex([(5.0, 6.0), (1.0, 2.0), (3.0, 4.0)])
+    assert index.contains(3.5)
+    assert not index.contains(2.5)
+    assert index.above(2.5).tolist() == [[3.0, 4.0], [5.0, 6.0]]
+    assert index.below(4.5).tolist() == [[3.0, 4.0], [1.0, 2.0]]
+    assert index.nearestAbove(2.5) == (3.0, 4.0)
+    assert index.nearestBelow(2.5) == (1.0, 2.0)
+
+
+def test_zone_cache_empty_and_single_candle_windows():
+    cache = ZoneCache()
+    buy_zones, sell_zones = cache.find("EURUSD", np.zeros(0, dtype=RATES_DTYPE))
+    assert buy_zones.shape == (0, 2) and sell_zones.shape == (0, 2)
+    buy_zones, sell_zones = cache.find("EURUSD", candles([5.0]))
+    assert buy_zones.shape == (0, 2) and sell_zones.shape == (0, 2)
+
+
+def test_zone_cache_reuses_an_unchanged_window():
+    cache = ZoneCache()
+    rates = candles([0.1] * 20 + [10.0])
+    zones = cache.find("EURUSD", rates, threshold=10)
+    assert cache.find("EURUSD", rates.copy(), threshold=10) is zones
+    assert cache.find("EURUSD", rates, threshold=12) is not zones
+    forming = rates.copy()
+    forming["close"][-1] += 1.0
+    assert cache.find("EURUSD", forming, threshold=10) is not zones
+    expected = findBlockOrders(forming, threshold=10)
+    assert all(np.array_equal(a, b) for a, b in zip(cache.find("EURUSD", forming, threshold=10), expected))
@@ -0,0 +1,36 @@
+import gc
+import weakref
+from BotCodeV2.BlockOrders import getZoneCache
+from BotCodeV2.CandleStore import getCandleStore
+from BotCodeV2.IndicatorGraph import getIndicatorGraph
+from BotCodeV2.PositionMonitor import getPositionMonitor
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+from BotCodeV2.TrailingEngine import getTrailingEngine
+
+
+def test_shared_objects_are_per_broker():
+    first, second = SimulatedBroker(), SimulatedBroker()
+    assert getCandleStore(first) is getCandleStore(first)
+    assert getCandleStore(first) is not getCandleStore(second)
+    assert getPositionMonitor(first) is not getPositionMonitor(second)
+    assert getTrailingEngine(first) is getPositionMonitor(first).trailing
+
+
+def test_accounts_on_one_market_share_candles_and_zones_only():
+    market = SimulatedBroker()
+    account = SimulatedBroker(market=market)
+    assert getCandleStore(account) is getCandleStore(market)
+    assert getZoneCache(account) is getZoneCache(market)
+    assert getIndicatorGraph("A", market.TIMEFRAME_M5, account) is not getIndicatorGraph("A", market.TIMEFRAME_M5, market)
+
+
+def test_shared_objects_are_freed_with_their_broker():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 100)
+    getCandleStore(broker).get("A", broker.TIMEFRAME_M1, 50)
+    getPositionMonitor(broker)
+    getIndicatorGraph("A", broker.TIMEFRAME_M5, broker)
+    reference = weakref.ref(broker)
+    del broker
+    gc.collect()
+    assert reference() is None
@@ -0,0 +1,84 @@
+import numpy as np
+from BotCodeV2.CandleStore import RATES_DTYPE, CandleBuffer, CandleStore, resampleRates
+from BotCodeV2.SimulatedBroker import SimulatedBroker, syntheticRates
+
+
+def candles(times, close=1.0):
+    rates = np.zeros(len(times), dtype=RATES_DTYPE)
+    rates["time"] = times
+    rates["close"] = close
+    return rates
+
+
+def test_append_patches_the_forming_bar():
+    buffer = CandleBuffer(5)
+    buffer.append(candles([60, 120]))
+    buffer.append(candles([120, 180], close=2.0))
+    assert list(buffer.last(5)["time"]) == [60, 120, 180]
+    assert list(buffer.last(5)["close"]) == [1.0, 2.0, 2.0]
+    # Bars older than the newest stored one are ignored.
+    buffer.append(candles([60], close=3.0))
+    assert list(buffer.last(5)["close"]) == [1.0, 2.0, 2.0]
+
+
+def test_rollover_keeps_the_newest_capacity_bars_and_old_views():
+    buffer = CandleBuffer(4, slack=2)
+    buffer.append(candles([60, 120, 180, 240]))
+    view = buffer.last(4)
+    for minute in range(5, 12):
+        buffer.append(candles([minute * 60]))
+    assert buffer.size == 4
+    assert list(buffer.last(10)["time"]) == [480, 540, 600, 660]
+    assert list(view["time"]) == [60, 120, 180, 240]
+    assert not buffer.last(1).flags.writeable
+
+
+def test_resample_matches_the_bars_it_aggregates():
+    rates = syntheticRates(30, start=1700000040)
+    starts, bars = resampleRates(rates, 300)
+    assert list(bars["time"] % 300) == [0] * len(bars)
+    assert bars["high"][1] == rates["high"][starts[1]:starts[2]].max()
+    assert bars["close"][1] == rates["close"][starts[2] - 1]
+    assert bars["tick_volume"].sum() == rates["tick_volume"].sum()
+
+
+def test_updates_fetch_only_newer_bars():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 3000)
+    rates = broker.symbols["A"].rates
+    broker.advance(int(rates["time"][1000]))
+    store = CandleStore(capacity=500, broker=broker)
+    first = store.get("A", broker.TIMEFRAME_M1, 500)
+    assert first["time"][-1] == rates["time"][1000]
+    for bar in range(1001, 1300):
+        broker.advance(int(rates["time"][bar]))
+    latest = store.get("A", broker.TIMEFRAME_M1, 500)
+    assert np.array_equal(latest, rates[800:1300])
+
+
+def test_resampled_time_frames_agree_with_the_terminal():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 6000)
+    times = broker.symbols["A"].rates["time"]
+    broker.advance(int(times[3000]))
+    store = CandleStore(capacity=300, broker=broker)
+    store.get("A", broker.TIMEFRAME_M5, 200)
+    for bar in range(3001, 3500, 7):
+        broker.advance(int(times[bar]))
+        derived = store.get("A", broker.TIMEFRAME_M5, 200)
+        fetched = broker.copy_rates_from_pos("A", broker.TIMEFRAME_M5, 0, 200)
+        assert np.array_equal(derived[["time", "open", "high", "low", "close"]],
+                              fetched[["time", "open", "high", "low", "close"]])
+
+
+def test_snapshot_serves_one_moment():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 2000)
+    times = broker.symbols["A"].rates["time"]
+    broker.advance(int(times[1000]))
+    store = CandleStore(capacity=200, broker=broker)
+    store.get("A", broker.TIMEFRAME_M1, 100)
+    with store.snapshot("A"):
+        broker.advance(int(times[1001]))
+        assert store.get("A", broker.TIMEFRAME_M1, 1)["time"][0] == times[1000]
+    assert store.get("A", broker.TIMEFRAME_M1, 1)["time"][0] == times[1001]
@@ -0,0 +1,36 @@
+import os
+import numpy as np
+from BotCodeV2.HistoryStore import ColumnSeries, HistoryStore
+from BotCodeV2.SimulatedBroker import SimulatedBroker, syntheticRates
+
+
+def test_columns_round_trip(tmp_path):
+    rates = syntheticRates(100)
+    series = ColumnSeries(str(tmp_path))
+    assert series.append(rates[:60]) == 60
+    assert series.append(rates[40:]) == 40
+    assert np.array_equal(ColumnSeries(str(tmp_path)).rates(), rates)
+    assert np.array_equal(series.rates(count=10, until=int(rates["time"][49])), rates[40:50])
+
+
+def test_an_interrupted_append_is_cut_back(tmp_path):
+    series = ColumnSeries(str(tmp_path))
+    series.append(syntheticRates(10))
+    with open(os.path.join(str(tmp_path), "close.col"), "ab") as f:
+        f.write(np.zeros(3).tobytes())
+    assert len(ColumnSeries(str(tmp_path))) == 10
+
+
+def test_sync_fetches_only_the_gap(tmp_path):
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 500)
+    rates = broker.symbols["A"].rates
+    broker.advance(int(rates["time"][200]))
+    store = HistoryStore(str(tmp_path), broker)
+    assert len(store.sync("A", broker.TIMEFRAME_M1, 100)) == 100
+    broker.advance(int(rates["time"][250]))
+    fetched = HistoryStore(str(tmp_path), broker).sync("A", broker.TIMEFRAME_M1)
+    # The forming bar is fetched but never stored.
+    assert fetched["time"][0] == rates["time"][200] and len(fetched) == 51
+    stored = HistoryStore(str(tmp_path)).series("A", broker.TIMEFRAME_M1).rates()
+    assert np.array_equal(stored, rates[101:250])
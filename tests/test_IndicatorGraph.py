@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from BotCodeV2.IndicatorGraph import IndicatorGraph
+from tests.test_StreamingIndicators import RATES, REFERENCES, reference
+
+
+@pytest.mark.parametrize("indicator, name, function", REFERENCES)
+def test_output_matches_talib(indicator, name, function):
+    graph = IndicatorGraph()
+    output = graph.output(name, history=len(RATES))
+    graph.sync(RATES)
+    # The last candle is the forming bar, so its value is the live one.
+    assert np.array(output.last(len(RATES))) == pytest.approx(reference(function), rel=1e-9, abs=1e-9)
+
+
+def test_outputs_share_their_nodes():
+    graph = IndicatorGraph()
+    assert graph.output("macd") is graph.output("macd")
+    graph.output("atr")
+    declared = len(graph.order)
+    graph.output("natr")
+    # NATR only adds the percentage of close on top of the true range and average ATR declared.
+    assert len(graph.order) == declared + 1
+
+
+def test_forming_bar_recomputes_only_what_changed():
+    graph = IndicatorGraph()
+    rsi, atr = graph.output("rsi"), graph.output("atr")
+    graph.sync(RATES)
+    committed = rsi.last(100)[:-1]
+    forming = RATES[-1].copy()
+    forming["high"] += 0.001
+    computed = graph.computed
+    graph.update(forming, closed=False)
+    # The high only reaches the true range and its average, RSI keeps its value.
+    assert graph.computed - computed == 2
+    assert rsi.last(100)[:-1] == committed
+    alone = IndicatorGraph()
+    expected = alone.output("atr")
+    alone.sync(np.concatenate((RATES[:-1], forming[None])))
+    assert atr.last(1) == pytest.approx(expected.last(1))
+
+
+def test_late_output_rebuilds_the_graph():
+    graph = IndicatorGraph()
+    graph.output("rsi", history=len(RATES))
+    graph.sync(RATES[:-1])
+    macd = graph.output("macd", history=len(RATES))
+    graph.sync(RATES)
+    alone = IndicatorGraph()
+    expected = alone.output("macd", history=len(RATES))
+    alone.sync(RATES)
+    assert macd.last(len(RATES)) == pytest.approx(expected.last(len(RATES)))
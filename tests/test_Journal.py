@@ -0,0 +1,58 @@
+import contextlib
+import os
+from BotCodeV2.BrokerCache import CachedBroker
+from BotCodeV2.Journal import RecordingBroker, ReplayBroker, readJournal
+from BotCodeV2.PositionMonitor import PositionMonitor
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+from BotCodeV2.Strategies.scalping import Scalper
+
+SYMBOLS = ("A", "B")
+
+
+class CapturingReplayBroker(ReplayBroker):
+
+    def __init__(self, path):
+        super().__init__(path)
+        self.requests = []
+
+    def order_send(self, request):
+        self.requests.append(request)
+        return super().order_send(request)
+
+
+def scalpers(broker):
+    return [Scalper(symbol, [], [], broker=broker, live=False, monitor=PositionMonitor(broker)) for symbol in SYMBOLS]
+
+
+def record(path, cycles):
+    simulated = SimulatedBroker()
+    for seed, symbol in enumerate(SYMBOLS):
+        simulated.addSyntheticSymbol(symbol, 8000, seed=seed + 2)
+    times = simulated.symbols[SYMBOLS[0]].times
+    simulated.advance(int(times[6000]))
+    # Recorded above the cache, as AsyncRuntime.runShard does.
+    recording = RecordingBroker(CachedBroker(simulated, clock=lambda: simulated.now), path)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        strategies = scalpers(recording)
+        for cycle in range(cycles):
+            simulated.advance(int(times[6000 + 5 * cycle]))
+            for scalper in strategies:
+                scalper.step()
+    recording.close()
+
+
+def test_replay_reproduces_the_recorded_order_stream(tmp_path):
+    path = str(tmp_path / "session.jrnl")
+    cycles = 300
+    record(path, cycles)
+    recorded = [entry.args[0] for entry in readJournal(path) if entry.method == "order_send"]
+    assert recorded
+
+    replay = CapturingReplayBroker(path)
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        strategies = scalpers(replay)
+        for cycle in range(cycles):
+            for scalper in strategies:
+                scalper.step()
+    assert replay.requests == recorded
+    assert replay.remaining() == 0
@@ -0,0 +1,86 @@
+from collections import namedtuple
+import numpy as np
+from BotCodeV2.Broker import Broker
+from BotCodeV2.CandleStore import RATES_DTYPE
+from BotCodeV2.MarketEvents import BAR_CLOSE, SPREAD_ABOVE, SPREAD_BELOW, VOLUME, TickTrigger
+
+Tick = namedtuple("Tick", ["time", "bid", "ask", "time_msc"])
+Spec = namedtuple("Spec", ["point"])
+
+
+class ScriptedBroker(Broker):
+    """
+        Answers with the tick and the forming M1 bar the test sets.
+    """
+
+    def __init__(self):
+        self.tick = None
+        self.bar_time = 0
+        self.tick_volume = 0
+
+    def symbol_info(self, symbol):
+        return Spec(0.0001)
+
+    def symbol_info_tick(self, symbol):
+        return self.tick
+
+    def copy_rates_from_pos(self, symbol, time_frame, start_pos, count):
+        bar = np.zeros(1, dtype=RATES_DTYPE)
+        bar["time"] = self.bar_time
+        bar["tick_volume"] = self.tick_volume
+        return bar
+
+    def move(self, time, bid=1.1, ask=1.1001, tick_volume=None):
+        self.tick = Tick(time, bid, ask, time * 1000)
+        self.bar_time = time // 60 * 60
+        if tick_volume is not None:
+            self.tick_volume = tick_volume
+
+
+def kinds(events):
+    return [event.kind for event in events]
+
+
+def test_volume_follows_the_bar_tick_volume_not_the_polls():
+    broker = ScriptedBroker()
+    trigger = TickTrigger("A", broker=broker, time_frames=(), volume_threshold=500)
+    broker.move(60, tick_volume=10)
+    assert trigger.poll() == []
+    # One poll can cover hundreds of ticks.
+    broker.move(61, tick_volume=650)
+    events = trigger.poll()
+    assert kinds(events) == [VOLUME] and events[0].detail == 650
+    broker.move(62, tick_volume=900)
+    assert trigger.poll() == []
+    broker.move(120, tick_volume=700)
+    assert kinds(trigger.poll()) == [VOLUME]
+
+
+def test_volume_ignores_the_previous_bar():
+    broker = ScriptedBroker()
+    trigger = TickTrigger("A", broker=broker, time_frames=(), volume_threshold=500)
+    broker.move(60, tick_volume=800)
+    broker.tick = Tick(120, 1.1, 1.1001, 120000)
+    assert trigger.poll() == []
+
+
+def test_spread_crossings_and_bar_closes():
+    broker = ScriptedBroker()
+    trigger = TickTrigger("A", broker=broker, time_frames=(broker.TIMEFRAME_M1,), spread_threshold=5)
+    broker.move(60)
+    assert trigger.poll() == []
+    broker.move(61, ask=1.1010)
+    assert kinds(trigger.poll()) == [SPREAD_ABOVE]
+    broker.move(121)
+    assert kinds(trigger.poll()) == [BAR_CLOSE, SPREAD_BELOW]
+
+
+def test_scalper_params_set_the_thresholds():
+    from BotCodeV2.SimulatedBroker import SimulatedBroker
+    from BotCodeV2.Strategies.scalping import Scalper
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 2000)
+    broker.advance(int(broker.symbols["A"].times[1500]))
+    scalper = Scalper("A", [], [], broker=broker, live=False, params={"spread_trigger": 30, "volume_trigger": 200})
+    assert scalper.trigger.spread_threshold == 30
+    assert scalper.trigger.volume_threshold == 200
@@ -0,0 +1,118 @@
+import queue
+from collections import namedtuple
+import pytest
+from BotCodeV2.Broker import Broker
+from BotCodeV2.OrderGateway import OrderGateway
+
+Result = namedtuple("Result", ["retcode"])
+Tick = namedtuple("Tick", ["bid", "ask"])
+
+
+class ScriptedBroker(Broker):
+    """
+        Answers order_send with the retcodes the test lists, then with TRADE_RETCODE_DONE.
+    """
+
+    def __init__(self, *retcodes):
+        self.retcodes = list(retcodes)
+        self.sent = []
+        self.ask = 1.1
+        self.on_send = None
+
+    def symbol_info_tick(self, symbol):
+        self.ask += 0.0001
+        return Tick(self.ask - 0.0001, self.ask)
+
+    def order_send(self, request):
+        self.sent.append(request)
+        if self.on_send is not None:
+            self.on_send()
+        return Result(self.retcodes.pop(0) if self.retcodes else self.TRADE_RETCODE_DONE)
+
+
+def drain(gateway):
+    # Sends everything queued, retries included, on the calling thread.
+    gateway.stopped = True
+    gateway.run()
+
+
+def gateway(broker, **kwargs):
+    return OrderGateway(broker, rate=1000.0, burst=1000, backoff=0.0, **kwargs)
+
+
+def stops(ticket, sl):
+    return {"action": Broker.TRADE_ACTION_SLTP, "position": ticket, "sl": sl, "tp": 0.0}
+
+
+def deal(price=1.1):
+    return {"action": Broker.TRADE_ACTION_DEAL, "symbol": "EURUSD", "type": Broker.ORDER_TYPE_BUY, "price": price}
+
+
+def test_queued_stop_changes_of_a_ticket_are_coalesced():
+    broker = ScriptedBroker()
+    sender = gateway(broker)
+    first, second, other = sender.submit(stops(1, 1.0)), sender.submit(stops(1, 1.1)), sender.submit(stops(2, 1.0))
+    drain(sender)
+    assert broker.sent == [stops(1, 1.1), stops(2, 1.0)]
+    assert first.result() is second.result()
+    assert other.result().retcode == Broker.TRADE_RETCODE_DONE
+    assert sender.stats()["coalesced"] == 1
+
+
+def test_requotes_are_retried_at_a_fresh_price():
+    broker = ScriptedBroker(Broker.TRADE_RETCODE_REQUOTE, Broker.TRADE_RETCODE_PRICE_CHANGED)
+    sender = gateway(broker)
+    future = sender.submit(deal())
+    drain(sender)
+    assert future.result().retcode == Broker.TRADE_RETCODE_DONE
+    assert [request["price"] for request in broker.sent] == pytest.approx([1.1, 1.1001, 1.1002])
+    assert sender.stats()["retried"] == 2
+
+
+def test_retries_give_up_with_the_last_answer():
+    broker = ScriptedBroker(*[Broker.TRADE_RETCODE_TIMEOUT] * 5)
+    sender = gateway(broker, retries=2)
+    future = sender.submit(stops(1, 1.0))
+    drain(sender)
+    assert len(broker.sent) == 3
+    assert future.result().retcode == Broker.TRADE_RETCODE_TIMEOUT
+    assert sender.stats()["failed"] == 1
+
+
+def test_rejections_are_not_retried():
+    broker = ScriptedBroker(Broker.TRADE_RETCODE_INVALID_STOPS)
+    sender = gateway(broker)
+    future = sender.submit(stops(1, 1.0))
+    drain(sender)
+    assert len(broker.sent) == 1
+    assert future.result().retcode == Broker.TRADE_RETCODE_INVALID_STOPS
+
+
+def test_a_retry_is_answered_by_a_newer_change():
+    broker = ScriptedBroker(Broker.TRADE_RETCODE_REQUOTE)
+    sender = gateway(broker)
+    newer = []
+    # The newer change arrives while the first one is being sent.
+    broker.on_send = lambda: newer or newer.append(sender.submit(stops(1, 1.1)))
+    first = sender.submit(stops(1, 1.0))
+    drain(sender)
+    assert broker.sent == [stops(1, 1.0), stops(1, 1.1)]
+    assert first.result() is newer[0].result()
+
+
+def test_a_full_queue_fails_the_future():
+    sender = gateway(ScriptedBroker(), max_queue=1)
+    sender.submit(deal())
+    with pytest.raises(queue.Full):
+        sender.submit(deal()).result()
+    assert sender.stats()["rejected"] == 1
+
+
+def test_the_thread_sends_and_stops():
+    broker = ScriptedBroker()
+    sender = gateway(broker)
+    sender.start()
+    futures = [sender.submit(deal()) for _ in range(10)]
+    sender.stop()
+    assert all(future.result(timeout=5).retcode == Broker.TRADE_RETCODE_DONE for future in futures)
+    assert len(broker.sent) == 10
@@ -0,0 +1,41 @@
+from BotCodeV2.OrderReconciler import OrderReconciler
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+
+
+def pending(broker, price, order_type=None, volume=0.1):
+    return {"action": broker.TRADE_ACTION_PENDING, "symbol": "A", "volume": volume, "price": price,
+            "type": order_type if order_type is not None else broker.ORDER_TYPE_BUY_LIMIT, "sl": price - 0.001,
+            "tp": price + 0.001}
+
+
+def market():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 100)
+    broker.advance(int(broker.symbols["A"].rates["time"][50]))
+    return broker, OrderReconciler("A", broker)
+
+
+def test_matching_orders_are_left_alone():
+    broker, reconciler = market()
+    desired = [pending(broker, 1.05), pending(broker, 1.06)]
+    assert reconciler.reconcile(desired) == (2, 0, 0)
+    # Within the tolerance of 5 points.
+    assert reconciler.reconcile([dict(request, price=request["price"] + 0.00003) for request in desired]) == (0, 0, 0)
+
+
+def test_moved_orders_are_modified_in_place():
+    broker, reconciler = market()
+    reconciler.reconcile([pending(broker, 1.05), pending(broker, 1.06)])
+    tickets = set(broker.orders)
+    assert reconciler.reconcile([pending(broker, 1.05), pending(broker, 1.07)]) == (0, 1, 0)
+    assert set(broker.orders) == tickets
+    assert sorted(order["price_open"] for order in broker.orders.values()) == [1.05, 1.07]
+
+
+def test_other_types_and_volumes_are_replaced():
+    broker, reconciler = market()
+    reconciler.reconcile([pending(broker, 1.05), pending(broker, 1.06)])
+    desired = [pending(broker, 1.05, volume=0.2), pending(broker, 1.2, broker.ORDER_TYPE_SELL_LIMIT)]
+    assert reconciler.reconcile(desired) == (2, 0, 2)
+    assert reconciler.reconcile([]) == (0, 0, 2)
+    assert not broker.orders
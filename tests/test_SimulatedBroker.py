@@ -0,0 +1,44 @@
+import numpy as np
+import pytest
+from BotCodeV2.SimulatedBroker import SimulatedBroker
+
+
+def test_stops_fill_when_a_bar_trades_through_them():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 200)
+    rates = broker.symbols["A"].rates
+    broker.advance(int(rates["time"][10]))
+    price = broker.symbol_info_tick("A").ask
+    result = broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": "A", "type": broker.ORDER_TYPE_BUY,
+                                "volume": 0.1, "price": price, "sl": price - 0.0005, "tp": price + 0.0005})
+    assert result.retcode == broker.TRADE_RETCODE_DONE
+    bar = 11
+    while broker.positions:
+        broker.advance(int(rates["time"][bar]))
+        bar += 1
+    fill = broker.fills[-1]
+    assert fill.reason in ("sl", "tp")
+    assert fill.price == pytest.approx(price - 0.0005 if fill.reason == "sl" else price + 0.0005, abs=0.0003)
+    assert broker.balance == pytest.approx(10000.0 + fill.profit)
+
+
+def test_stops_inside_the_stops_level_are_rejected():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 20, stops_level=50)
+    broker.advance(int(broker.symbols["A"].rates["time"][5]))
+    price = broker.symbol_info_tick("A").ask
+    result = broker.order_send({"action": broker.TRADE_ACTION_DEAL, "symbol": "A", "type": broker.ORDER_TYPE_BUY,
+                                "volume": 0.1, "price": price, "sl": price - 0.0001})
+    assert result.retcode == broker.TRADE_RETCODE_INVALID_STOPS
+    assert not broker.positions
+
+
+def test_resampled_bars_cover_the_forming_minute():
+    broker = SimulatedBroker()
+    broker.addSyntheticSymbol("A", 100)
+    rates = broker.symbols["A"].rates
+    broker.advance(int(rates["time"][62]))
+    bars = broker.copy_rates_from_pos("A", broker.TIMEFRAME_M5, 0, 3)
+    minutes = rates[np.searchsorted(rates["time"], bars["time"][-1]):63]
+    assert bars["close"][-1] == rates["close"][62]
+    assert bars["high"][-1] == minutes["high"].max()
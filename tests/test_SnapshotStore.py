@@ -0,0 +1,34 @@
+import os
+from BotCodeV2.SnapshotStore import SnapshotStore
+
+
+def test_snapshot_round_trip(tmp_path):
+    store = SnapshotStore(str(tmp_path), durable=False)
+    state = {"pending_orders": [1, 2], "trigger": None}
+    assert store.save("EURUSD", state)
+    loaded, saved = SnapshotStore(str(tmp_path)).load("EURUSD")
+    assert loaded == state
+    assert saved > 0
+    assert SnapshotStore(str(tmp_path)).load("GBPUSD") is None
+
+
+def test_an_unchanged_state_is_not_written_again(tmp_path):
+    store = SnapshotStore(str(tmp_path), durable=False)
+    assert store.save("EURUSD", {"a": 1})
+    assert not store.save("EURUSD", {"a": 1})
+    assert store.save("EURUSD", {"a": 2})
+    assert os.listdir(str(tmp_path)) == ["EURUSD.snap"]
+
+
+def test_an_unreadable_snapshot_is_ignored(tmp_path):
+    with open(os.path.join(str(tmp_path), "EURUSD.snap"), "wb") as f:
+        f.write(b"torn")
+    assert SnapshotStore(str(tmp_path)).load("EURUSD") is None
+
+
+def test_remove(tmp_path):
+    store = SnapshotStore(str(tmp_path), durable=False)
+    store.save("EURUSD", {"a": 1})
+    store.remove("EURUSD")
+    assert store.load("EURUSD") is None
+    assert store.save("EURUSD", {"a": 1})
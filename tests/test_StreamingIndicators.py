@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+import talib
+from BotCodeV2.SimulatedBroker import syntheticRates
+from BotCodeV2.StreamingIndicators import AROON, ATR, MACD, NATR, RSI, STOCHRSI
+
+RATES = syntheticRates(400, seed=7)
+HIGH, LOW, CLOSE = RATES["high"], RATES["low"], RATES["close"]
+
+# Indicator, graph output and TA-Lib reference of each streaming indicator, with default parameters.
+REFERENCES = [
+    (MACD, "macd", lambda: talib.MACD(CLOSE)),
+    (ATR, "atr", lambda: talib.ATR(HIGH, LOW, CLOSE)),
+    (NATR, "natr", lambda: talib.NATR(HIGH, LOW, CLOSE)),
+    (RSI, "rsi", lambda: talib.RSI(CLOSE)),
+    (STOCHRSI, "stochrsi", lambda: talib.STOCHRSI(CLOSE)),
+    (AROON, "aroon", lambda: talib.AROON(HIGH, LOW)),
+]
+
+
+def reference(function):
+    # The values TA-Lib computes for the whole series, warm-up dropped, as rows like the indicators return.
+    columns = function()
+    columns = columns if isinstance(columns, tuple) else (columns,)
+    rows = np.column_stack(columns)
+    rows = rows[~np.isnan(rows).any(axis=1)]
+    return rows if len(columns) > 1 else rows[:, 0]
+
+
+@pytest.mark.parametrize("indicator, name, function", REFERENCES)
+def test_streaming_indicator_matches_talib(indicator, name, function):
+    streaming = indicator(history=len(RATES))
+    streaming.seed(RATES)
+    expected = reference(function)
+    assert np.array(streaming.last(len(RATES))) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+
+def test_forming_bar_does_not_change_the_committed_state():
+    streaming, fresh = RSI(), RSI()
+    streaming.seed(RATES[:-1])
+    fresh.seed(RATES[:-1])
+    bar = dict(zip(RATES.dtype.names, RATES[-1]))
+    for close in (bar["close"] - 0.001, bar["close"] + 0.001, bar["close"]):
+        streaming.update(dict(bar, close=close), closed=False)
+    assert streaming.update(RATES[-1]) == fresh.update(RATES[-1])
+
+
+def test_sync_only_processes_new_bars():
+    streaming = MACD(history=len(RATES))
+    streaming.sync(RATES[:300])
+    streaming.sync(RATES[100:350])
+    streaming.sync(RATES[200:])
+    whole = MACD(history=len(RATES))
+    whole.sync(RATES)
+    assert streaming.last(len(RATES)) == pytest.approx(whole.last(len(RATES)))
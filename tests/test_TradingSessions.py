@@ -0,0 +1,45 @@
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from BotCodeV2.TradingSessions import SessionCalendar, parseDays
+
+NEW_YORK = ZoneInfo("America/New_York")
+
+
+def at(*args, zone=NEW_YORK):
+    return int(datetime(*args, tzinfo=zone).timestamp())
+
+
+def test_parse_days():
+    assert parseDays("Mon-Fri") == {0, 1, 2, 3, 4}
+    assert parseDays("Sat,Sun") == {5, 6}
+    assert parseDays("Fri-Mon") == {4, 5, 6, 0}
+    assert parseDays("*") == set(range(7))
+
+
+def test_session_in_local_time_across_daylight_saving():
+    calendar = SessionCalendar([{"days": "Mon-Fri", "open": "09:30", "close": "16:00"}], "America/New_York")
+    # Friday 6 March and Monday 9 March 2026 straddle the switch to daylight saving time.
+    assert calendar.isOpen(at(2026, 3, 6, 9, 30))
+    assert not calendar.isOpen(at(2026, 3, 6, 16, 0))
+    assert calendar.nextOpen(at(2026, 3, 6, 17, 0)) == at(2026, 3, 9, 9, 30)
+    assert calendar.nextClose(at(2026, 3, 9, 10, 0)) == at(2026, 3, 9, 16, 0)
+    assert calendar.nextOpen(at(2026, 3, 9, 10, 0)) == at(2026, 3, 9, 10, 0)
+
+
+def test_overnight_sessions_merge_into_one_week():
+    calendar = SessionCalendar([{"days": "Sun", "open": "17:00", "close": "24:00"},
+                                {"days": "Mon-Thu", "open": "00:00", "close": "24:00"},
+                                {"days": "Fri", "open": "00:00", "close": "17:00"}], "America/New_York")
+    assert calendar.isOpen(at(2026, 3, 11, 3, 0))
+    assert not calendar.isOpen(at(2026, 3, 14, 12, 0))
+    assert calendar.nextClose(at(2026, 3, 9, 12, 0)) == at(2026, 3, 13, 17, 0)
+    assert calendar.nextOpen(at(2026, 3, 14, 12, 0)) == at(2026, 3, 15, 17, 0)
+
+
+def test_holidays_and_markets_that_never_close():
+    calendar = SessionCalendar([{"days": "Mon-Fri", "open": "09:30", "close": "16:00"}], "America/New_York",
+                               holidays=["2026-12-25"])
+    assert not calendar.isOpen(at(2026, 12, 25, 12, 0))
+    assert calendar.nextOpen(at(2026, 12, 25, 12, 0)) == at(2026, 12, 28, 9, 30)
+    always = SessionCalendar(["24/7"])
+    assert always.isOpen(0) and always.nextOpen(5) == 5 and always.nextClose(5) is None
@@ -0,0 +1,85 @@
+from collections import namedtuple
+import pytest
+from BotCodeV2.Broker import Broker
+from BotCodeV2.TrailingEngine import TrailingEngine
+
+Spec = namedtuple("Spec", ["point", "trade_contract_size", "trade_stops_level", "trade_freeze_level"])
+Tick = namedtuple("Tick", ["bid", "ask"])
+Position = namedtuple("Position", ["ticket", "symbol", "type", "volume", "price_open", "price_current", "sl", "tp",
+                                   "profit"])
+
+
+class SpecBroker(Broker):
+
+    def __init__(self, stops_level=0):
+        self.stops_level = stops_level
+
+    def symbol_info(self, symbol):
+        return Spec(0.0001, 100000, self.stops_level, 0)
+
+    def symbol_info_tick(self, symbol):
+        return Tick(1.13, 1.13)
+
+    def order_calc_margin(self, action, symbol, volume, price):
+        return 11.0
+
+
+class Manager:
+    order_type = "BUY"
+    volume = 0.01
+
+    def __init__(self):
+        self.sent = []
+
+    def setStopLossTakeProfit(self, sl, tp):
+        # Rejected by the terminal: the position keeps its levels.
+        self.sent.append((sl, tp))
+
+
+def buy(sl=1.09, ticket=1):
+    # 0.01 lots of 100000 units: 30 in profit, 0.002 from the take profit.
+    return Position(ticket, "EURUSD", Broker.POSITION_TYPE_BUY, 0.01, 1.10, 1.13, sl, 1.132, 30.0)
+
+
+def atr(symbol):
+    return 0.001
+
+
+def test_stop_loss_locks_in_the_margin_as_a_price_distance():
+    engine, manager = TrailingEngine(SpecBroker()), Manager()
+    assert engine.trail([(buy(), manager)], atr) == 1
+    # Entry + 11.0 margin / 1000 units + 1.5 ATR; TP out by 2 ATR.
+    assert manager.sent[0] == pytest.approx((1.1125, 1.134))
+
+
+def test_a_take_profit_move_alone_sends_nothing():
+    engine, manager = TrailingEngine(SpecBroker()), Manager()
+    assert engine.trail([(buy(sl=1.1124), manager)], atr) == 0
+    assert manager.sent == []
+    assert engine.stats()["unchanged"] == 1
+
+
+def test_a_rejected_modify_is_sent_again():
+    engine, manager = TrailingEngine(SpecBroker()), Manager()
+    for _ in range(3):
+        engine.trail([(buy(), manager)], atr)
+    assert len(manager.sent) == 3
+
+
+def test_invalid_levels_are_counted_and_logged_once(capsys):
+    engine, manager = TrailingEngine(SpecBroker(stops_level=500)), Manager()
+    for _ in range(2):
+        assert engine.trail([(buy(), manager)], atr) == 0
+    assert engine.stats()["invalid"] == 2
+    assert capsys.readouterr().out.count("position 1 is within the stops level") == 1
+    engine.forget([1])
+    engine.trail([(buy(), manager)], atr)
+    assert capsys.readouterr().out.count("position 1 is within the stops level") == 1
+
+
+def test_a_sell_trails_below_the_entry():
+    engine, manager = TrailingEngine(SpecBroker()), Manager()
+    manager.order_type = "SELL"
+    sell = Position(2, "EURUSD", Broker.POSITION_TYPE_SELL, 0.01, 1.16, 1.13, 1.17, 1.128, 30.0)
+    assert engine.trail([(sell, manager)], atr) == 1
+    assert manager.sent[0] == pytest.approx((1.1475, 1.126))